@@ -1,14 +1,15 @@
 import os
+import json
 import logging
 from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Any
 from enum import Enum
 import asyncio
 
-from fastapi import FastAPI, Depends, HTTPException, status, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, status, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 from motor.motor_asyncio import AsyncIOMotorClient
 import redis.asyncio as redis
@@ -22,8 +23,11 @@ import uvicorn
 from src.ml import (
     SemanticSaturationController,
     SemanticAnalysisRequest,
+    EmbeddingConfig,
     get_model_manager
 )
+from src.ml.embedding_codec import EmbeddingCodec, MEDIA_TYPE as EMBEDDING_MEDIA_TYPE
+from src.ml.threejs_binary import MEDIA_TYPE as THREEJS_MEDIA_TYPE
 
 # Configure logging
 logHandler = logging.StreamHandler()
@@ -141,6 +145,7 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     if semantic_controller:
+        await semantic_controller.save_indices()
         semantic_controller.cleanup()
     if mongo_client:
         mongo_client.close()
@@ -264,10 +269,24 @@ async def readiness_check():
         await app.state.db.command("ping")
         # Check Redis
         await app.state.redis.ping()
-        # Check models
-        if not models:
-            raise Exception("No models loaded")
-        return {"status": "ready"}
+        # Check models: preloaded ones must be resident, the rest load on demand
+        if not semantic_controller:
+            raise Exception("Semantic controller not initialized")
+        model_status = semantic_controller.model_manager.get_model_status()
+        missing = [
+            key for key, info in model_status.items()
+            if info["preloaded"] and info["state"] != "loaded"
+        ]
+        if missing:
+            return JSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={
+                    "status": "not ready",
+                    "error": f"Models not loaded: {', '.join(missing)}",
+                    "models": model_status
+                }
+            )
+        return {"status": "ready", "models": model_status}
     except Exception as e:
         logger.error(f"Readiness check failed: {e}")
         return JSONResponse(
@@ -503,7 +522,8 @@ async def perform_semantic_analysis(
         reference_topics=request.reference_topics,
         competitor_content=request.competitor_content,
         optimization_goals=request.optimization_goals,
-        analysis_config=request.analysis_config
+        analysis_config=request.analysis_config,
+        tenant_id=str(current_user["id"])
     )
     
     try:
@@ -534,9 +554,62 @@ async def perform_semantic_analysis(
             detail=f"Analysis failed: {str(e)}"
         )
 
+def _json_default(value):
+    """Serialize numpy values and datetimes in streamed events"""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+@app.post("/semantic-analysis/stream")
+async def stream_semantic_analysis(
+    request: SemanticAnalysisRequestModel,
+    http_request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """Perform semantic analysis, streaming each stage's result when ready
+    
+    Sends Server-Sent Events when the client accepts ``text/event-stream``,
+    otherwise newline-delimited JSON.
+    """
+    if not semantic_controller:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Semantic analysis service not initialized"
+        )
+    
+    analysis_request = SemanticAnalysisRequest(
+        content_items=request.content_items,
+        target_keywords=request.target_keywords,
+        reference_topics=request.reference_topics,
+        competitor_content=request.competitor_content,
+        optimization_goals=request.optimization_goals,
+        analysis_config=request.analysis_config,
+        tenant_id=str(current_user["id"])
+    )
+    use_sse = "text/event-stream" in http_request.headers.get("accept", "")
+    
+    async def events():
+        async for event in semantic_controller.analyze_content_stream(analysis_request):
+            payload = json.dumps(event, default=_json_default)
+            if use_sse:
+                yield f"event: {event.get('stage', event['event'])}\ndata: {payload}\n\n"
+            else:
+                yield payload + "\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if use_sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/semantic-analysis/{request_id}")
 async def get_semantic_analysis_result(
     request_id: str,
+    include_embeddings: bool = False,
     current_user: dict = Depends(get_current_user)
 ):
     """Get semantic analysis result by request ID"""
@@ -546,7 +619,14 @@ async def get_semantic_analysis_result(
             detail="Semantic analysis service not initialized"
         )
     
-    result = await semantic_controller.get_analysis_result(request_id)
+    try:
+        result = await semantic_controller.get_analysis_result(request_id, include_embeddings)
+    except ValueError as e:
+        logger.error(f"Stored embeddings could not be decoded: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Stored embeddings could not be decoded: {str(e)}"
+        )
     
     if not result:
         raise HTTPException(
@@ -556,26 +636,137 @@ async def get_semantic_analysis_result(
     
     return result
 
+def parse_byte_range(range_header: Optional[str], size: int) -> Optional[tuple]:
+    """Inclusive (start, end) for a single ``Range: bytes=...`` header
+    
+    Returns None when the whole body should be sent (no header, another
+    unit, or several ranges) and raises ValueError if the range cannot be
+    satisfied.
+    """
+    if not range_header:
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffix range: the final N bytes
+            start = max(size - int(last), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    
+    if start >= size or end < start:
+        raise ValueError(f"Unsatisfiable range: {range_header}")
+    return start, min(end, size - 1)
+
+@app.get("/semantic-analysis/{request_id}/network")
+async def get_semantic_network_binary(
+    request_id: str,
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """Binary Three.js payload of an analysis, with HTTP range support
+    
+    Clients can fetch the header and section table first and then load
+    geometry, colours and labels progressively with ``Range`` requests.
+    """
+    if not semantic_controller:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Semantic analysis service not initialized"
+        )
+    
+    size = await semantic_controller.network_binary_size(request_id)
+    if not size:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Network payload not found"
+        )
+    
+    headers = {"Accept-Ranges": "bytes", "Cache-Control": "private, max-age=86400"}
+    try:
+        byte_range = parse_byte_range(request.headers.get("range"), size)
+    except ValueError:
+        return Response(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={**headers, "Content-Range": f"bytes */{size}"}
+        )
+    
+    start, end = byte_range or (0, size - 1)
+    content = await semantic_controller.read_network_binary(request_id, start, end)
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    
+    return Response(
+        content=content,
+        status_code=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK,
+        media_type=THREEJS_MEDIA_TYPE,
+        headers=headers
+    )
+
+def negotiate_embedding_codec(accept: Optional[str]) -> Optional[str]:
+    """Binary codec requested via Accept, or None for JSON
+    
+    Clients opt in with ``Accept: application/vnd.embeddings+binary``,
+    optionally choosing ``; codec=float32|float16|int8`` (default float16).
+    """
+    for media_range in (accept or "").split(","):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        if media_type != EMBEDDING_MEDIA_TYPE:
+            continue
+        codec = "float16"
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "codec":
+                codec = value.strip().strip('"')
+        return codec
+    return None
+
 @app.post("/embeddings/generate")
 async def generate_embeddings(
+    request: Request,
     texts: List[str] = Field(..., min_items=1, max_items=100),
     model_type: str = "default",
     current_user: dict = Depends(get_current_user)
 ):
-    """Generate embeddings for given texts"""
+    """Generate embeddings for given texts
+    
+    Returns JSON float lists by default, or an encoded binary payload when
+    the client accepts ``application/vnd.embeddings+binary``.
+    """
     if not semantic_controller:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Embedding service not initialized"
         )
     
+    codec = negotiate_embedding_codec(request.headers.get("accept"))
+    if codec is not None and codec not in ("float32", "float16", "int8"):
+        raise HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail=f"Unsupported embedding codec: {codec}"
+        )
+    
     try:
         # Generate embeddings
         embeddings = await semantic_controller.embedding_pipeline.generate_embeddings(
             texts,
-            config={"model_type": model_type}
+            config=EmbeddingConfig(model_type=model_type)
         )
         
+        if codec is not None:
+            return Response(
+                content=EmbeddingCodec(codec).encode(np.array(embeddings)),
+                media_type=f"{EMBEDDING_MEDIA_TYPE}; codec={codec}",
+                headers={"Vary": "Accept"}
+            )
+        
         # Convert to list format
         embedding_list = [emb.tolist() for emb in embeddings]
         
@@ -613,27 +804,21 @@ async def similarity_search(
         # Generate query embedding
         query_embedding = (await semantic_controller.embedding_pipeline.generate_embeddings([query]))[0]
         
-        # Build index
-        await semantic_controller.similarity_engine.build_index(
-            np.array(corpus_embeddings),
-            "temp_search",
-            metadata=[{"text": text, "index": i} for i, text in enumerate(corpus)]
-        )
-        
-        # Search
-        results = await semantic_controller.similarity_engine.search(
-            query_embedding,
-            "temp_search",
-            k=top_k
-        )
+        # One-shot query over the client's corpus: score it directly instead
+        # of building (and holding on to) an index
+        corpus_matrix = np.asarray(corpus_embeddings, dtype=np.float32)
+        corpus_matrix = corpus_matrix / (np.linalg.norm(corpus_matrix, axis=1, keepdims=True) + 1e-8)
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        query_vector = query_vector / (np.linalg.norm(query_vector) + 1e-8)
+        scores = corpus_matrix @ query_vector
         
         # Format results
         search_results = []
-        for result in results:
+        for i in np.argsort(-scores, kind="stable")[:top_k].tolist():
             search_results.append({
-                "text": corpus[result.index],
-                "score": result.score,
-                "index": result.index
+                "text": corpus[i],
+                "score": float(scores[i]),
+                "index": i
             })
         
         return {
@@ -651,6 +836,12 @@ async def similarity_search(
 
 @app.get("/metrics")
 async def metrics():
+    if semantic_controller and semantic_controller.similarity_engine:
+        try:
+            # Resident index sizes live in the engine (or its shards)
+            await semantic_controller.similarity_engine.update_memory_metrics()
+        except Exception as e:
+            logger.warning(f"Failed to update index memory metrics: {e}")
     return generate_latest()
 
 if __name__ == "__main__":
@@ -4,11 +4,18 @@ ML Package - Core optimization engine with semantic saturation
 
 from .model_manager import ModelManager, get_model_manager
 from .embedding_pipeline import EmbeddingPipeline, EmbeddingConfig, TextChunk
+from .embedding_codec import EmbeddingCodec, ProductQuantizer, decode_embeddings
+from .near_duplicates import NearDuplicateIndex
 from .similarity_engine import SimilarityEngine, SimilarityConfig, SearchResult
+from .sharded_search import ShardedSearchPool
+from .projection import FittedReducer
 from .content_mesh import ContentMesh, ContentNode, ContentEdge, MeshConfig
 from .gap_analysis import GapAnalysisEngine, GapAnalysisConfig, SemanticGap
 from .visualization import VisualizationEngine, VisualizationConfig
+from .threejs_binary import encode_threejs_buffers, decode_threejs_buffers
 from .optimization_engine import OptimizationEngine, OptimizationConfig, OptimizationSuggestion
+from .analysis_context import AnalysisContext
+from .term_statistics import TermStatistics
 from .semantic_saturation import (
     SemanticSaturationController,
     SemanticAnalysisRequest,
@@ -24,11 +31,17 @@ __all__ = [
     "EmbeddingPipeline",
     "EmbeddingConfig",
     "TextChunk",
+    "EmbeddingCodec",
+    "ProductQuantizer",
+    "decode_embeddings",
+    "NearDuplicateIndex",
     
     # Similarity Engine
     "SimilarityEngine",
     "SimilarityConfig",
     "SearchResult",
+    "ShardedSearchPool",
+    "FittedReducer",
     
     # Content Mesh
     "ContentMesh",
@@ -44,11 +57,15 @@ __all__ = [
     # Visualization
     "VisualizationEngine",
     "VisualizationConfig",
+    "encode_threejs_buffers",
+    "decode_threejs_buffers",
     
     # Optimization
     "OptimizationEngine",
     "OptimizationConfig",
     "OptimizationSuggestion",
+    "AnalysisContext",
+    "TermStatistics",
     
     # Main Controller
     "SemanticSaturationController",
@@ -0,0 +1,155 @@
+"""
+Analysis Context
+Per-document parse results shared by the optimization analyzers
+"""
+
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from typing import List, Dict, Any, Callable, Awaitable
+import numpy as np
+from nltk.tokenize import sent_tokenize, word_tokenize
+from textstat import flesch_reading_ease, flesch_kincaid_grade
+
+logger = logging.getLogger(__name__)
+
+
+def _to_numpy(embeddings) -> np.ndarray:
+    if hasattr(embeddings, "cpu"):
+        embeddings = embeddings.cpu()
+    if hasattr(embeddings, "numpy"):
+        return embeddings.numpy()
+    return np.asarray(embeddings)
+
+
+class AnalysisContext:
+    """Tokenisation, sentences, paragraphs and embeddings of one document
+    
+    Every artefact is computed on first access and then shared, so the
+    analyzers of one ``generate_optimizations`` call sentence-split,
+    tokenise and embed the content once between them. Synchronous
+    artefacts may be read from worker threads (each is computed under its
+    own lock); embeddings are awaited on the event loop and shared as one
+    task per artefact.
+    """
+    
+    def __init__(self, content: str, model_manager=None):
+        self.content = content
+        self.model_manager = model_manager
+        self._values: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+        self._locks_guard = threading.Lock()
+        self._tasks: Dict[str, asyncio.Future] = {}
+    
+    @classmethod
+    def of(cls, content, model_manager=None) -> "AnalysisContext":
+        """Wrap raw content, or return an existing context unchanged"""
+        if isinstance(content, cls):
+            return content
+        return cls(content, model_manager)
+    
+    def _cached(self, name: str, compute: Callable[[], Any]) -> Any:
+        if name in self._values:
+            return self._values[name]
+        with self._locks_guard:
+            lock = self._locks[name]
+        with lock:
+            if name not in self._values:
+                self._values[name] = compute()
+        return self._values[name]
+    
+    async def _cached_async(self, name: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._tasks.get(name)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._tasks[name] = task
+        return await asyncio.shield(task)
+    
+    @property
+    def content_lower(self) -> str:
+        return self._cached("content_lower", self.content.lower)
+    
+    @property
+    def sentences(self) -> List[str]:
+        return self._cached("sentences", lambda: sent_tokenize(self.content))
+    
+    @property
+    def sentence_tokens(self) -> List[List[str]]:
+        return self._cached(
+            "sentence_tokens",
+            lambda: [word_tokenize(sentence) for sentence in self.sentences]
+        )
+    
+    @property
+    def sentence_lengths(self) -> List[int]:
+        return [len(tokens) for tokens in self.sentence_tokens]
+    
+    @property
+    def words(self) -> List[str]:
+        """Word tokens of the whole document
+        
+        ``word_tokenize`` sentence-splits before tokenising, so joining the
+        per-sentence tokens gives the same result without a second pass.
+        """
+        return self._cached(
+            "words",
+            lambda: [token for tokens in self.sentence_tokens for token in tokens]
+        )
+    
+    @property
+    def word_count(self) -> int:
+        return len(self.words)
+    
+    @property
+    def word_frequencies(self) -> Dict[str, int]:
+        """Frequencies of lower-cased alphabetic words longer than three letters"""
+        def count():
+            frequencies = defaultdict(int)
+            for word in self.words:
+                word = word.lower()
+                if len(word) > 3 and word.isalpha():
+                    frequencies[word] += 1
+            return dict(frequencies)
+        return self._cached("word_frequencies", count)
+    
+    @property
+    def raw_paragraphs(self) -> List[str]:
+        return self._cached("raw_paragraphs", lambda: self.content.split('\n\n'))
+    
+    @property
+    def paragraphs(self) -> List[str]:
+        """Non-empty, stripped paragraphs"""
+        return self._cached(
+            "paragraphs",
+            lambda: [p.strip() for p in self.raw_paragraphs if p.strip()]
+        )
+    
+    @property
+    def paragraph_lengths(self) -> List[int]:
+        return self._cached(
+            "paragraph_lengths",
+            lambda: [len(word_tokenize(paragraph)) for paragraph in self.paragraphs]
+        )
+    
+    @property
+    def reading_ease(self) -> float:
+        return self._cached("reading_ease", lambda: flesch_reading_ease(self.content))
+    
+    @property
+    def grade_level(self) -> float:
+        return self._cached("grade_level", lambda: flesch_kincaid_grade(self.content))
+    
+    async def paragraph_embeddings(self) -> np.ndarray:
+        """Embeddings of ``paragraphs``, one row each"""
+        async def embed():
+            if not self.paragraphs:
+                return np.zeros((0, 0))
+            return _to_numpy(await self.model_manager.get_embeddings_batch(self.paragraphs))
+        return await self._cached_async("paragraph_embeddings", embed)
+    
+    async def document_embedding(self) -> np.ndarray:
+        """Embedding of the whole content"""
+        async def embed():
+            return _to_numpy(await self.model_manager.get_embeddings_batch([self.content]))[0]
+        return await self._cached_async("document_embedding", embed)
\ No newline at end of file
@@ -1,6 +1,6 @@
 """
 Content Mesh Algorithm
-Builds and optimizes semantic content graphs using NetworkX
+Builds and optimizes semantic content graphs using NetworkX or a sparse CSR backend
 """
 
 import networkx as nx
@@ -11,10 +11,14 @@ from dataclasses import dataclass
 import community as community_louvain
 from collections import defaultdict
 import json
+import uuid
 from datetime import datetime
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 
+from .similarity_engine import SimilarityConfig
+from .sparse_graph import SparseGraph
+
 logger = logging.getLogger(__name__)
 
 
@@ -48,22 +52,86 @@ class MeshConfig:
     use_community_detection: bool = True
     edge_types: List[str] = None
     
+    # kNN edge construction
+    knn_backend: str = "blocked"  # blocked (tiled matmul), index (similarity engine)
+    knn_chunk_size: int = 1024  # Rows/columns per similarity tile
+    knn_threads: int = 4  # Row blocks processed concurrently
+    index_config: Optional[SimilarityConfig] = None  # Mesh index config (e.g. hnsw)
+    
+    # Graph storage
+    graph_backend: str = "networkx"  # networkx, sparse (CSR; NetworkX built only on demand)
+    
     def __post_init__(self):
         if self.edge_types is None:
             self.edge_types = ["semantic", "reference", "topic"]
 
 
 class ContentMesh:
-    """Manages semantic content mesh/graph"""
+    """Manages semantic content mesh/graph
+    
+    Node embeddings are indexed in ``index_name`` of the similarity engine,
+    e.g. a tenant-scoped name from ``SimilarityEngine.tenant_index_name``.
+    """
     
-    def __init__(self, similarity_engine):
+    def __init__(self, similarity_engine, index_name: str = "content_mesh"):
         self.similarity_engine = similarity_engine
-        self.graph = nx.Graph()
+        self.index_name = index_name
+        self._graph: Optional[nx.Graph] = nx.Graph()
+        self.sparse_graph: Optional[SparseGraph] = None  # CSR snapshot used for analytics
         self.nodes = {}
         self.embeddings = {}
         self.communities = {}
+        self.partition = {}  # Raw Louvain assignment, incl. small communities
+        self.config = None
+        self._vector_ids = {}  # Node id -> id in the mesh index
+        self.mesh_id = uuid.uuid4().hex
+        self.version = 0  # Bumped on every structural change, e.g. for layout caching
         self.executor = ThreadPoolExecutor(max_workers=4)
-        
+    
+    @property
+    def graph(self) -> nx.Graph:
+        """NetworkX view of the mesh
+        
+        With the sparse backend the graph is only materialized from the CSR
+        snapshot when first accessed (export, visualization, edits); from
+        then on it is the source of truth again.
+        """
+        if self._graph is None:
+            self._graph = self.sparse_graph.to_networkx({
+                node_id: {
+                    "title": node.title,
+                    "node_type": node.node_type,
+                    "metadata": node.metadata
+                }
+                for node_id, node in self.nodes.items()
+            })
+        return self._graph
+    
+    @graph.setter
+    def graph(self, graph: nx.Graph):
+        self._graph = graph
+        self.sparse_graph = None
+        self.version += 1
+    
+    def _analytics_graph(self) -> SparseGraph:
+        """CSR snapshot of the mesh, rebuilt after the NetworkX graph changes"""
+        if self.sparse_graph is None:
+            self.sparse_graph = SparseGraph.from_networkx(self._graph)
+        return self.sparse_graph
+    
+    def _set_node_values(self, name: str, values: np.ndarray):
+        """Store a per-node value array on the snapshot or the NetworkX graph"""
+        sparse = self._analytics_graph()
+        if self._graph is None:
+            sparse.node_values[name] = values
+            return
+        
+        for node_id, value in zip(sparse.node_ids, values.tolist()):
+            if name == "community" and value < 0:
+                self._graph.nodes[node_id].pop(name, None)
+            else:
+                self._graph.nodes[node_id][name] = value
+    
     def add_node(self, node: ContentNode):
         """Add a node to the content mesh"""
         self.nodes[node.id] = node
@@ -76,6 +144,8 @@ class ContentMesh:
             node_type=node.node_type,
             metadata=node.metadata
         )
+        self.sparse_graph = None
+        self.version += 1
     
     def add_edge(self, edge: ContentEdge):
         """Add an edge to the content mesh"""
@@ -86,29 +156,49 @@ class ContentMesh:
                 weight=edge.weight,
                 edge_type=edge.edge_type
             )
+            self.sparse_graph = None
+            self.version += 1
     
     async def build_mesh(
         self,
         nodes: List[ContentNode],
         config: Optional[MeshConfig] = None
     ):
-        """Build content mesh from nodes"""
+        """Build content mesh from nodes
+        
+        With ``graph_backend="sparse"`` the mesh is built straight into a
+        CSR matrix and no NetworkX graph is created.
+        """
         if config is None:
             config = MeshConfig()
+        if config.graph_backend not in ("networkx", "sparse"):
+            raise ValueError(f"Unsupported graph backend: {config.graph_backend}")
         
         logger.info(f"Building content mesh with {len(nodes)} nodes")
+        self.config = config
         
         # Add all nodes
-        for node in nodes:
-            self.add_node(node)
+        self.version += 1
+        if config.graph_backend == "sparse":
+            self._graph = None
+            self.nodes = {node.id: node for node in nodes}
+            self.embeddings = {node.id: node.embedding for node in nodes}
+            self.sparse_graph = SparseGraph.from_edges(
+                [node.id for node in nodes], [], [], []
+            )
+        else:
+            for node in nodes:
+                self.add_node(node)
         
         # Build similarity index
         embeddings = np.array([node.embedding for node in nodes])
         await self.similarity_engine.build_index(
             embeddings,
-            "content_mesh",
+            self.index_name,
+            config.index_config,
             metadata=[{"id": node.id} for node in nodes]
         )
+        self._vector_ids = {node.id: i for i, node in enumerate(nodes)}
         
         # Create edges based on similarity
         await self._create_similarity_edges(nodes, config)
@@ -121,7 +211,8 @@ class ContentMesh:
         if config.use_pagerank:
             await self._calculate_pagerank()
         
-        logger.info(f"Content mesh built with {self.graph.number_of_nodes()} nodes and {self.graph.number_of_edges()} edges")
+        sparse = self._analytics_graph()
+        logger.info(f"Content mesh built with {sparse.number_of_nodes()} nodes and {sparse.number_of_edges()} edges")
     
     async def _create_similarity_edges(
         self,
@@ -129,60 +220,148 @@ class ContentMesh:
         config: MeshConfig
     ):
         """Create edges based on content similarity"""
-        loop = asyncio.get_event_loop()
+        if len(nodes) < 2 or config.max_edges_per_node <= 0:
+            return
         
-        def create_edges():
-            edges = []
+        k = min(config.max_edges_per_node, len(nodes) - 1)
+        embeddings = np.array([node.embedding for node in nodes])
+        
+        if config.knn_backend == "index":
+            rows, cols, scores = await self._index_knn(embeddings, k, config)
+        else:
+            loop = asyncio.get_event_loop()
+            rows, cols, scores = await loop.run_in_executor(
+                self.executor, self._blocked_knn, embeddings, k, config
+            )
+        
+        if self._graph is None:
+            self.sparse_graph = SparseGraph.from_edges(
+                [node.id for node in nodes], rows, cols, scores
+            )
+            self.version += 1
+            return
+        
+        # Add edges to graph
+        for row, col, score in zip(rows.tolist(), cols.tolist(), scores.tolist()):
+            self.add_edge(ContentEdge(
+                source=nodes[row].id,
+                target=nodes[col].id,
+                weight=score,
+                edge_type="semantic"
+            ))
+    
+    def _blocked_knn(
+        self,
+        embeddings: np.ndarray,
+        k: int,
+        config: MeshConfig,
+        rows: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Cosine kNN graph from tiled matrix multiplies
+        
+        Each row block is multiplied against column tiles of at most
+        ``knn_chunk_size`` vectors and merged into a running per-row top-k,
+        so memory stays O(chunk_size^2) regardless of corpus size. When
+        ``rows`` is given only those rows are queried against all vectors.
+        """
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        vectors = np.ascontiguousarray(embeddings / (norms + 1e-8), dtype=np.float32)
+        n = len(vectors)
+        if rows is None:
+            rows = np.arange(n)
+        chunk = max(1, config.knn_chunk_size)
+        threshold = np.float32(config.similarity_threshold)
+        
+        def topk_block(start: int) -> Tuple[np.ndarray, np.ndarray]:
+            query_rows = rows[start:start + chunk]
+            block = vectors[query_rows]
+            block_rows = np.arange(len(block))
+            best_scores = np.full((len(block), k), -np.inf, dtype=np.float32)
+            best_cols = np.full((len(block), k), -1, dtype=np.int64)
             
-            # For each node, find similar nodes
-            for i, node in enumerate(nodes):
-                # Search for similar content
-                similarities = self.similarity_engine.compute_pairwise_similarities(
-                    np.array([node.embedding, *[n.embedding for n in nodes if n.id != node.id]])
-                )[0, 1:]  # Get similarities to other nodes
+            for col_start in range(0, n, chunk):
+                tile = block @ vectors[col_start:col_start + chunk].T
                 
-                # Get top k similar nodes above threshold
-                similar_indices = np.where(similarities >= config.similarity_threshold)[0]
-                similar_scores = similarities[similar_indices]
+                # Exclude self-similarity and anything below threshold
+                self_cols = query_rows - col_start
+                on_tile = (self_cols >= 0) & (self_cols < tile.shape[1])
+                tile[block_rows[on_tile], self_cols[on_tile]] = -np.inf
+                tile[tile < threshold] = -np.inf
                 
-                # Sort by similarity and limit edges
-                if len(similar_indices) > 0:
-                    sorted_indices = np.argsort(similar_scores)[::-1][:config.max_edges_per_node]
-                    
-                    for idx in sorted_indices:
-                        # Adjust index to account for skipped self
-                        actual_idx = similar_indices[idx]
-                        if actual_idx >= i:
-                            actual_idx += 1
-                        
-                        target_node = nodes[actual_idx]
-                        edge = ContentEdge(
-                            source=node.id,
-                            target=target_node.id,
-                            weight=float(similar_scores[idx]),
-                            edge_type="semantic"
-                        )
-                        edges.append(edge)
+                tile_cols = np.broadcast_to(
+                    np.arange(col_start, col_start + tile.shape[1]),
+                    tile.shape
+                )
+                cand_scores = np.concatenate([best_scores, tile], axis=1)
+                cand_cols = np.concatenate([best_cols, tile_cols], axis=1)
+                
+                top = np.argpartition(-cand_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(cand_scores, top, axis=1)
+                best_cols = np.take_along_axis(cand_cols, top, axis=1)
             
-            return edges
+            return best_scores, best_cols
         
-        edges = await loop.run_in_executor(self.executor, create_edges)
+        starts = list(range(0, len(rows), chunk))
+        with ThreadPoolExecutor(max_workers=max(1, config.knn_threads)) as pool:
+            blocks = list(pool.map(topk_block, starts))
         
-        # Add edges to graph
-        for edge in edges:
-            self.add_edge(edge)
+        scores = np.concatenate([block_scores for block_scores, _ in blocks])
+        cols = np.concatenate([block_cols for _, block_cols in blocks])
+        edge_rows = np.repeat(rows, k).reshape(len(rows), k)
+        
+        keep = np.isfinite(scores)
+        return edge_rows[keep], cols[keep], scores[keep].astype(np.float64)
+    
+    async def _index_knn(
+        self,
+        embeddings: np.ndarray,
+        k: int,
+        config: MeshConfig
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """kNN graph from a batch search of the mesh index"""
+        results = await self.similarity_engine.batch_search(
+            embeddings,
+            self.index_name,
+            k=k + 1  # Room for the node itself
+        )
+        
+        rows, cols, scores = [], [], []
+        for row, row_results in enumerate(results):
+            neighbours = [
+                r for r in row_results
+                if r.index != row and r.score >= config.similarity_threshold
+            ][:k]
+            for result in neighbours:
+                rows.append(row)
+                cols.append(result.index)
+                scores.append(result.score)
+        
+        return np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64), np.array(scores)
     
     async def _detect_communities(self, config: MeshConfig):
         """Detect communities in the content mesh"""
         loop = asyncio.get_event_loop()
         
+        sparse = self._analytics_graph()
+        
         def detect():
+            # Louvain needs NetworkX; the sparse backend uses a transient copy
+            graph = self._graph if self._graph is not None else sparse.to_networkx()
             # Use Louvain method for community detection
-            partition = community_louvain.best_partition(
-                self.graph,
+            return community_louvain.best_partition(
+                graph,
                 weight='weight'
             )
-            
+        
+        partition = await loop.run_in_executor(self.executor, detect)
+        await self._apply_partition(partition, config)
+    
+    async def _apply_partition(self, partition: Dict[str, int], config: MeshConfig):
+        """Store a partition, keeping communities above the minimum size"""
+        loop = asyncio.get_event_loop()
+        sparse = self._analytics_graph()
+        
+        def summarize():
             # Group nodes by community
             communities = defaultdict(list)
             for node_id, community_id in partition.items():
@@ -197,40 +376,299 @@ class ContentMesh:
                     community_idx += 1
             
             # Calculate modularity
-            modularity = community_louvain.modularity(partition, self.graph)
+            modularity = sparse.modularity(
+                np.array([
+                    partition.get(node_id, -1 - i)
+                    for i, node_id in enumerate(sparse.node_ids)
+                ])
+            )
             
             return filtered_communities, modularity
         
+        self.partition = partition
         self.communities, modularity = await loop.run_in_executor(
-            self.executor, detect
+            self.executor, summarize
         )
         
-        # Add community info to nodes
+        # Add community info to nodes (-1 for nodes in filtered communities)
+        labels = np.full(sparse.number_of_nodes(), -1, dtype=np.int64)
         for comm_id, members in self.communities.items():
-            for node_id in members:
-                self.graph.nodes[node_id]['community'] = comm_id
+            labels[[sparse.node_index[node_id] for node_id in members]] = comm_id
+        self._set_node_values('community', labels)
         
         logger.info(f"Detected {len(self.communities)} communities with modularity {modularity:.3f}")
     
-    async def _calculate_pagerank(self):
-        """Calculate PageRank scores for nodes"""
+    async def _refine_communities(self, affected: Set[str], config: MeshConfig):
+        """Re-run Louvain only on the communities containing affected nodes"""
+        if not self.partition:
+            await self._detect_communities(config)
+            return
+        
+        loop = asyncio.get_event_loop()
+        partition = {
+            node_id: comm_id for node_id, comm_id in self.partition.items()
+            if node_id in self.graph
+        }
+        
+        affected_communities = {partition[n] for n in affected if n in partition}
+        region = {n for n, comm_id in partition.items() if comm_id in affected_communities}
+        region.update(n for n in affected if n in self.graph)
+        
+        if region:
+            def detect():
+                return community_louvain.best_partition(
+                    self.graph.subgraph(region),
+                    weight='weight'
+                )
+            
+            local_partition = await loop.run_in_executor(self.executor, detect)
+            
+            # Fresh ids so refined communities never merge with untouched ones
+            next_id = max(partition.values(), default=-1) + 1
+            for node_id, comm_id in local_partition.items():
+                partition[node_id] = next_id + comm_id
+        
+        await self._apply_partition(partition, config)
+    
+    async def _calculate_pagerank(self, warm_start: bool = False):
+        """Calculate PageRank scores for nodes
+        
+        With ``warm_start`` the power iteration starts from the previous
+        scores, which converges in a few iterations after small changes.
+        """
         loop = asyncio.get_event_loop()
+        sparse = self._analytics_graph()
+        
+        nstart = None
+        if warm_start:
+            if self._graph is None:
+                nstart = sparse.node_values.get('pagerank')
+            else:
+                default = 1.0 / max(sparse.number_of_nodes(), 1)
+                nstart = {
+                    node_id: attrs.get('pagerank', default)
+                    for node_id, attrs in self._graph.nodes(data=True)
+                }
         
         def calculate():
-            return nx.pagerank(self.graph, weight='weight')
+            return sparse.pagerank(nstart=nstart)
         
         pagerank_scores = await loop.run_in_executor(self.executor, calculate)
         
         # Add PageRank scores to nodes
-        for node_id, score in pagerank_scores.items():
-            self.graph.nodes[node_id]['pagerank'] = score
+        self._set_node_values('pagerank', pagerank_scores)
+    
+    async def upsert_nodes(
+        self,
+        nodes: List[ContentNode],
+        config: Optional[MeshConfig] = None
+    ):
+        """Insert or update nodes without rebuilding the mesh
+        
+        Semantic edges are recomputed only for the upserted nodes and the
+        nodes whose top-k they enter, PageRank is warm-started and community
+        detection is re-run only on the communities those nodes (and their
+        neighbours) belong to.
+        """
+        if config is None:
+            config = self.config or MeshConfig()
+        
+        affected = set()
+        for node in nodes:
+            if node.id in self.graph:
+                affected.update(self.graph.neighbors(node.id))
+                self.graph.remove_edges_from([
+                    (u, v) for u, v, data in self.graph.edges(node.id, data=True)
+                    if data.get('edge_type') == 'semantic'
+                ])
+                self.sparse_graph = None
+                self.version += 1
+            self.add_node(node)
+        
+        touched = [node.id for node in nodes]
+        await self._sync_mesh_index(nodes, touched)
+        await self._create_edges_for(touched, config)
+        
+        for node_id in touched:
+            affected.update(self.graph.neighbors(node_id))
+        affected.update(touched)
+        
+        await self._refresh_analytics(affected, config)
+        
+        logger.info(f"Upserted {len(nodes)} nodes, {len(affected)} nodes affected")
+    
+    async def remove_nodes(
+        self,
+        node_ids: List[str],
+        config: Optional[MeshConfig] = None
+    ):
+        """Remove nodes and refresh analytics around them"""
+        if config is None:
+            config = self.config or MeshConfig()
+        
+        removed = [node_id for node_id in node_ids if node_id in self.graph]
+        affected = set()
+        for node_id in removed:
+            affected.update(self.graph.neighbors(node_id))
+            self.graph.remove_node(node_id)
+            self.sparse_graph = None
+            self.version += 1
+            self.nodes.pop(node_id, None)
+            self.embeddings.pop(node_id, None)
+        affected.difference_update(removed)
+        
+        await self._sync_mesh_index([], removed)
+        await self._refresh_analytics(affected, config)
+        
+        logger.info(f"Removed {len(removed)} nodes, {len(affected)} nodes affected")
+    
+    async def _create_edges_for(self, node_ids: List[str], config: MeshConfig):
+        """Create semantic edges between the given nodes and the rest of the mesh
+        
+        Each node gets edges to its own top-k (from the mesh index with the
+        ``index`` kNN backend, else the blocked kNN), and existing nodes get
+        an edge to it when it now ranks in their top-k. Edges it displaces
+        from their top-k are kept until the next full build.
+        """
+        if not node_ids or len(self.nodes) < 2 or config.max_edges_per_node <= 0:
+            return
+        
+        all_ids = list(self.nodes)
+        positions = {node_id: i for i, node_id in enumerate(all_ids)}
+        embeddings = np.array([self.embeddings[node_id] for node_id in all_ids])
+        rows = np.array([positions[node_id] for node_id in node_ids], dtype=np.int64)
+        k = min(config.max_edges_per_node, len(all_ids) - 1)
+        
+        loop = asyncio.get_event_loop()
+        if config.knn_backend == "index" and all(node_id in self._vector_ids for node_id in node_ids):
+            edges = await self._index_knn_for(node_ids, k, config)
+        else:
+            edge_rows, edge_cols, scores = await loop.run_in_executor(
+                self.executor, self._blocked_knn, embeddings, k, config, rows
+            )
+            edges = [
+                (all_ids[row], all_ids[col], score)
+                for row, col, score in zip(edge_rows.tolist(), edge_cols.tolist(), scores.tolist())
+            ]
+        
+        reverse_rows, reverse_cols, reverse_scores = await loop.run_in_executor(
+            self.executor, self._reverse_candidates, embeddings, rows, config
+        )
+        for row, col, score in zip(reverse_rows.tolist(), reverse_cols.tolist(), reverse_scores.tolist()):
+            source = all_ids[row]
+            weights = [
+                data['weight'] for _, _, data in self.graph.edges(source, data=True)
+                if data.get('edge_type') == 'semantic'
+            ]
+            if len(weights) < k or score > min(weights):
+                edges.append((source, all_ids[col], score))
+        
+        for source, target, score in edges:
+            self.add_edge(ContentEdge(
+                source=source,
+                target=target,
+                weight=score,
+                edge_type="semantic"
+            ))
+    
+    async def _index_knn_for(
+        self,
+        node_ids: List[str],
+        k: int,
+        config: MeshConfig
+    ) -> List[Tuple[str, str, float]]:
+        """Top-k neighbours of the given nodes from the mesh index"""
+        results = await self.similarity_engine.batch_search(
+            np.array([self.embeddings[node_id] for node_id in node_ids]),
+            self.index_name,
+            k=k + 1  # Room for the node itself
+        )
+        
+        edges = []
+        for node_id, row_results in zip(node_ids, results):
+            neighbours = [
+                r for r in row_results
+                if r.metadata.get("id") not in (None, node_id)
+                and r.metadata["id"] in self.nodes
+                and r.score >= config.similarity_threshold
+            ][:k]
+            edges.extend((node_id, r.metadata["id"], r.score) for r in neighbours)
+        return edges
+    
+    def _reverse_candidates(
+        self,
+        embeddings: np.ndarray,
+        rows: np.ndarray,
+        config: MeshConfig
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Pairs (existing node, given node) with similarity above the threshold
+        
+        One pass over all vectors in tiles of ``knn_chunk_size``, against
+        only the given rows, so it is linear in the mesh size.
+        """
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        vectors = np.ascontiguousarray(embeddings / (norms + 1e-8), dtype=np.float32)
+        targets = vectors[rows]
+        chunk = max(1, config.knn_chunk_size)
+        is_target = np.zeros(len(vectors), dtype=bool)
+        is_target[rows] = True
+        
+        sources, cols, scores = [], [], []
+        for start in range(0, len(vectors), chunk):
+            tile = vectors[start:start + chunk] @ targets.T
+            # Edges among the given nodes come from their own top-k
+            tile[is_target[start:start + chunk]] = -np.inf
+            tile_rows, tile_cols = np.nonzero(tile >= config.similarity_threshold)
+            sources.append(tile_rows + start)
+            cols.append(rows[tile_cols])
+            scores.append(tile[tile_rows, tile_cols].astype(np.float64))
+        
+        return np.concatenate(sources), np.concatenate(cols), np.concatenate(scores)
+    
+    async def _refresh_analytics(self, affected: Set[str], config: MeshConfig):
+        """Update communities and PageRank after an incremental change"""
+        if config.use_community_detection:
+            await self._refine_communities(affected, config)
+        
+        if config.use_pagerank and len(self.nodes) > 0:
+            await self._calculate_pagerank(warm_start=True)
+    
+    async def _sync_mesh_index(self, upserted: List[ContentNode], removed_ids: List[str]):
+        """Keep the mesh's similarity index in step with the graph"""
+        if not self.similarity_engine.has_index(self.index_name):
+            return
+        
+        stale = {
+            node_id: self._vector_ids[node_id]
+            for node_id in [*removed_ids, *(node.id for node in upserted)]
+            if node_id in self._vector_ids
+        }
+        try:
+            if stale:
+                await self.similarity_engine.remove_ids(
+                    np.array(list(stale.values())), self.index_name
+                )
+                for node_id in stale:
+                    del self._vector_ids[node_id]
+            
+            if upserted:
+                vector_ids = await self.similarity_engine.add_vectors(
+                    np.array([node.embedding for node in upserted]),
+                    self.index_name,
+                    metadata=[{"id": node.id} for node in upserted]
+                )
+                for node, vector_id in zip(upserted, vector_ids.tolist()):
+                    self._vector_ids[node.id] = vector_id
+        except ValueError as e:
+            logger.warning(f"Content mesh index not updated: {e}")
     
     def find_content_gaps(self, threshold: float = 0.5) -> List[Dict[str, Any]]:
         """Identify gaps in the content mesh"""
         gaps = []
+        sparse = self._analytics_graph()
         
         # Find disconnected components
-        components = list(nx.connected_components(self.graph))
+        components = sparse.connected_components()
         if len(components) > 1:
             # Multiple disconnected components indicate content gaps
             for i, comp1 in enumerate(components):
@@ -252,8 +690,7 @@ class ContentMesh:
                         })
         
         # Find nodes with low connectivity
-        for node in self.graph.nodes():
-            degree = self.graph.degree(node)
+        for node, degree in zip(sparse.node_ids, sparse.degrees().tolist()):
             if degree < 2:  # Poorly connected
                 gaps.append({
                     "type": "low_connectivity",
@@ -266,8 +703,7 @@ class ContentMesh:
         if self.communities:
             for comm_id, members in self.communities.items():
                 # Calculate internal density
-                subgraph = self.graph.subgraph(members)
-                density = nx.density(subgraph)
+                density = sparse.subgraph_density(members)
                 
                 if density < 0.3:  # Low internal density
                     gaps.append({
@@ -300,6 +736,9 @@ class ContentMesh:
         for edge in edges_to_remove:
             self.graph.remove_edge(*edge)
             optimizations["edges_removed"] += 1
+        if edges_to_remove:
+            self.sparse_graph = None
+            self.version += 1
         
         # Add edges to connect related but disconnected nodes
         for node in self.graph.nodes():
@@ -337,16 +776,14 @@ class ContentMesh:
         n_recommendations: int = 5
     ) -> List[Tuple[str, float]]:
         """Get content recommendations based on mesh structure"""
-        if node_id not in self.graph:
+        sparse = self._analytics_graph()
+        if node_id not in sparse.node_index:
             return []
         
         # Use personalized PageRank for recommendations
         try:
-            ppr = nx.pagerank(
-                self.graph,
-                personalization={node_id: 1.0},
-                weight='weight'
-            )
+            scores = sparse.pagerank(personalization={node_id: 1.0})
+            ppr = dict(zip(sparse.node_ids, scores.tolist()))
             
             # Remove the source node and sort by score
             ppr.pop(node_id, None)
@@ -414,13 +851,16 @@ class ContentMesh:
     
     def get_mesh_statistics(self) -> Dict[str, Any]:
         """Get statistics about the content mesh"""
+        sparse = self._analytics_graph()
+        num_nodes = sparse.number_of_nodes()
+        degrees = sparse.degrees()
         stats = {
-            "num_nodes": self.graph.number_of_nodes(),
-            "num_edges": self.graph.number_of_edges(),
-            "density": nx.density(self.graph),
+            "num_nodes": num_nodes,
+            "num_edges": sparse.number_of_edges(),
+            "density": sparse.density(),
             "num_communities": len(self.communities),
-            "avg_degree": sum(dict(self.graph.degree()).values()) / self.graph.number_of_nodes() if self.graph.number_of_nodes() > 0 else 0,
-            "connected_components": nx.number_connected_components(self.graph)
+            "avg_degree": float(degrees.mean()) if num_nodes > 0 else 0,
+            "connected_components": sparse.number_connected_components()
         }
         
         # Add community statistics
@@ -431,12 +871,13 @@ class ContentMesh:
             stats["min_community_size"] = min(community_sizes)
         
         # Add centrality measures
-        if self.graph.number_of_nodes() > 0:
-            degree_centrality = nx.degree_centrality(self.graph)
-            stats["avg_degree_centrality"] = np.mean(list(degree_centrality.values()))
+        if num_nodes > 0:
+            degree_centrality = degrees / (num_nodes - 1) if num_nodes > 1 else np.ones(1)
+            stats["avg_degree_centrality"] = float(np.mean(degree_centrality))
             
-            if nx.is_connected(self.graph):
-                stats["diameter"] = nx.diameter(self.graph)
-                stats["radius"] = nx.radius(self.graph)
+            if stats["connected_components"] == 1:
+                eccentricities = sparse.eccentricities()
+                stats["diameter"] = int(eccentricities.max())
+                stats["radius"] = int(eccentricities.min())
         
         return stats
\ No newline at end of file
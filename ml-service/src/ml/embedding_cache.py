@@ -0,0 +1,138 @@
+"""
+Embedding Cache
+Two-tier (in-process LRU + Redis) cache for text embeddings
+"""
+
+import logging
+from typing import List, Dict, Optional
+from collections import OrderedDict
+import numpy as np
+
+from .embedding_codec import EmbeddingCodec, decode_embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """Bounded in-process LRU in front of Redis
+    
+    Embeddings are stored as ``EmbeddingCodec`` payloads (float16 by
+    default) in both tiers, so entries written with any codec can be read
+    back. The local tier is bounded by the total size of cached payloads; the
+    Redis tier is read with a single ``MGET`` and written with one pipelined
+    batch of ``SET ... EX`` commands per call.
+    """
+    
+    def __init__(
+        self,
+        redis_client=None,
+        max_bytes: int = 256 * 1024 * 1024,
+        ttl: int = 3600 * 24,
+        codec: Optional[EmbeddingCodec] = None
+    ):
+        self.redis_client = redis_client
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.codec = codec or EmbeddingCodec("float16")
+        
+        self._local: "OrderedDict[str, bytes]" = OrderedDict()
+        self._local_bytes = 0
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "evictions": 0}
+    
+    def _encode(self, embedding: np.ndarray) -> bytes:
+        return self.codec.encode(embedding)
+    
+    def _decode(self, stored: bytes) -> np.ndarray:
+        return decode_embeddings(stored, self.codec.product_quantizer)[0]
+    
+    def _get_local(self, key: str) -> Optional[bytes]:
+        stored = self._local.get(key)
+        if stored is None:
+            return None
+        self._local.move_to_end(key)
+        return stored
+    
+    def _put_local(self, key: str, stored: bytes):
+        if len(stored) > self.max_bytes:
+            return
+        
+        previous = self._local.pop(key, None)
+        if previous is not None:
+            self._local_bytes -= len(previous)
+        
+        self._local[key] = stored
+        self._local_bytes += len(stored)
+        
+        # Evict least recently used entries until back under budget
+        while self._local_bytes > self.max_bytes:
+            _, evicted = self._local.popitem(last=False)
+            self._local_bytes -= len(evicted)
+            self.stats["evictions"] += 1
+    
+    async def get_many(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up keys locally, then fetch all local misses in one MGET"""
+        results: List[Optional[np.ndarray]] = [None] * len(keys)
+        remote_keys = []
+        remote_positions = []
+        
+        for i, key in enumerate(keys):
+            stored = self._get_local(key)
+            if stored is not None:
+                results[i] = self._decode(stored)
+                self.stats["local_hits"] += 1
+            else:
+                remote_keys.append(key)
+                remote_positions.append(i)
+        
+        if remote_keys and self.redis_client:
+            try:
+                values = await self.redis_client.mget(remote_keys)
+                for key, position, value in zip(remote_keys, remote_positions, values):
+                    if not value:
+                        continue
+                    try:
+                        embedding = self._decode(value)
+                    except ValueError as e:
+                        logger.warning(f"Ignoring undecodable cache entry {key}: {e}")
+                        continue
+                    self._put_local(key, value)
+                    results[position] = embedding
+                    self.stats["redis_hits"] += 1
+            except Exception as e:
+                logger.warning(f"Cache retrieval failed: {e}")
+        
+        self.stats["misses"] += sum(1 for result in results if result is None)
+        return results
+    
+    async def set_many(self, items: Dict[str, np.ndarray]):
+        """Store embeddings locally and in Redis with one pipelined round trip"""
+        if not items:
+            return
+        
+        encoded = {key: self._encode(embedding) for key, embedding in items.items()}
+        for key, stored in encoded.items():
+            self._put_local(key, stored)
+        
+        if self.redis_client:
+            try:
+                # MSET cannot set a TTL, so pipeline SET ... EX instead
+                pipe = self.redis_client.pipeline(transaction=False)
+                for key, stored in encoded.items():
+                    pipe.set(key, stored, ex=self.ttl)
+                await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Cache storage failed: {e}")
+    
+    def clear(self):
+        """Drop the in-process tier"""
+        self._local.clear()
+        self._local_bytes = 0
+    
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            **self.stats,
+            "local_entries": len(self._local),
+            "local_bytes": self._local_bytes,
+            "max_bytes": self.max_bytes,
+            "codec": self.codec.codec
+        }
\ No newline at end of file
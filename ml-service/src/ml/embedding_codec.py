@@ -0,0 +1,226 @@
+"""
+Embedding Codec
+Compact, self-describing binary storage format for embeddings
+"""
+
+import os
+import struct
+import zlib
+import logging
+from pathlib import Path
+from typing import Optional, Union
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+MAGIC = b"EMBC"
+FORMAT_VERSION = 1
+
+# Codec ids stored in the header
+FLOAT32 = 0
+FLOAT16 = 1
+INT8 = 2
+PQ = 3
+
+CODEC_IDS = {"float32": FLOAT32, "float16": FLOAT16, "int8": INT8, "pq": PQ}
+CODEC_NAMES = {codec_id: name for name, codec_id in CODEC_IDS.items()}
+
+# magic, version, codec, dimension, count, codebook fingerprint (PQ only)
+HEADER = struct.Struct("<4sBBHII")
+
+MEDIA_TYPE = "application/vnd.embeddings+binary"
+
+
+class ProductQuantizer:
+    """Product quantizer: one uint8 centroid code per sub-vector
+    
+    A fitted quantizer is identified by a CRC32 fingerprint of its
+    codebooks, which encoded payloads carry so that decoding with the
+    wrong codebook fails loudly instead of returning garbage.
+    """
+    
+    def __init__(self, n_subvectors: int = 8, n_centroids: int = 256):
+        if n_centroids > 256:
+            raise ValueError(f"n_centroids must be at most 256, got {n_centroids}")
+        self.n_subvectors = n_subvectors
+        self.n_centroids = n_centroids
+        self.codebooks: Optional[np.ndarray] = None  # (n_subvectors, n_centroids, sub_dim)
+    
+    @property
+    def dimension(self) -> int:
+        return self.codebooks.shape[0] * self.codebooks.shape[2]
+    
+    @property
+    def fingerprint(self) -> int:
+        return zlib.crc32(self.codebooks.tobytes())
+    
+    def fit(self, embeddings: np.ndarray, random_state: int = 42) -> "ProductQuantizer":
+        """Learn one k-means codebook per sub-vector"""
+        from sklearn.cluster import KMeans
+        
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        dim = embeddings.shape[1]
+        if dim % self.n_subvectors != 0:
+            raise ValueError(
+                f"Dimension {dim} is not divisible by {self.n_subvectors} sub-vectors"
+            )
+        n_centroids = min(self.n_centroids, len(embeddings))
+        sub_dim = dim // self.n_subvectors
+        
+        codebooks = np.zeros((self.n_subvectors, n_centroids, sub_dim), dtype=np.float32)
+        for m in range(self.n_subvectors):
+            kmeans = KMeans(n_clusters=n_centroids, n_init=1, random_state=random_state)
+            kmeans.fit(embeddings[:, m * sub_dim:(m + 1) * sub_dim])
+            codebooks[m] = kmeans.cluster_centers_
+        
+        self.codebooks = codebooks
+        return self
+    
+    def encode(self, embeddings: np.ndarray) -> np.ndarray:
+        """Nearest centroid id per sub-vector, shape (n, n_subvectors)"""
+        n_subvectors, _, sub_dim = self.codebooks.shape
+        subvectors = embeddings.reshape(len(embeddings), n_subvectors, sub_dim)
+        codes = np.empty((len(embeddings), n_subvectors), dtype=np.uint8)
+        for m in range(n_subvectors):
+            distances = (
+                (subvectors[:, m] ** 2).sum(axis=1, keepdims=True)
+                - 2 * subvectors[:, m] @ self.codebooks[m].T
+                + (self.codebooks[m] ** 2).sum(axis=1)
+            )
+            codes[:, m] = distances.argmin(axis=1)
+        return codes
+    
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        n_subvectors = self.codebooks.shape[0]
+        parts = [self.codebooks[m][codes[:, m]] for m in range(n_subvectors)]
+        return np.concatenate(parts, axis=1)
+    
+    def save(self, path: Union[str, Path]):
+        np.save(str(path), self.codebooks)
+    
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "ProductQuantizer":
+        codebooks = np.load(str(path))
+        quantizer = cls(n_subvectors=codebooks.shape[0], n_centroids=codebooks.shape[1])
+        quantizer.codebooks = codebooks.astype(np.float32)
+        return quantizer
+
+
+class EmbeddingCodec:
+    """Encode embedding matrices into a compact, versioned binary format
+    
+    Payload layouts after the 16-byte header:
+    
+    - ``float32`` / ``float16``: row-major values
+    - ``int8``: one float32 scale per vector, then int8 values
+      (``value = int8 * scale``, symmetric per-vector quantization)
+    - ``pq``: uint8 codes from a fitted ``ProductQuantizer``
+    
+    Any payload can be decoded by ``decode`` given only its bytes (plus the
+    quantizer for ``pq``), so readers need not know how it was written.
+    """
+    
+    def __init__(self, codec: str = "float16", product_quantizer: Optional[ProductQuantizer] = None):
+        if codec not in CODEC_IDS:
+            raise ValueError(f"Unknown embedding codec: {codec}")
+        if codec == "pq" and (product_quantizer is None or product_quantizer.codebooks is None):
+            raise ValueError("The pq codec requires a fitted ProductQuantizer")
+        self.codec = codec
+        self.product_quantizer = product_quantizer
+    
+    @classmethod
+    def from_env(cls, codec_var: str, default: str, quantizer_var: str) -> "EmbeddingCodec":
+        """Codec named by the ``codec_var`` environment variable
+        
+        The ``pq`` codec loads its quantizer from the path in
+        ``quantizer_var``, as written by ``ProductQuantizer.save``.
+        """
+        codec = os.getenv(codec_var, default)
+        if codec != "pq":
+            return cls(codec)
+        
+        quantizer_path = os.getenv(quantizer_var)
+        if not quantizer_path:
+            raise ValueError(
+                f"{codec_var}=pq requires {quantizer_var}, the path of a saved ProductQuantizer"
+            )
+        return cls(codec, ProductQuantizer.load(quantizer_path))
+    
+    def encode(self, embeddings: np.ndarray) -> bytes:
+        """Encode a vector or an (n, dim) matrix"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim == 1:
+            embeddings = embeddings[None, :]
+        count, dim = embeddings.shape
+        
+        fingerprint = 0
+        if self.codec == "float32":
+            payload = embeddings.tobytes()
+        elif self.codec == "float16":
+            payload = embeddings.astype(np.float16).tobytes()
+        elif self.codec == "int8":
+            scales = np.abs(embeddings).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            quantized = np.clip(np.rint(embeddings / scales[:, None]), -127, 127).astype(np.int8)
+            payload = scales.astype(np.float32).tobytes() + quantized.tobytes()
+        else:
+            if dim != self.product_quantizer.dimension:
+                raise ValueError(
+                    f"Embedding dimension {dim} does not match quantizer dimension "
+                    f"{self.product_quantizer.dimension}"
+                )
+            fingerprint = self.product_quantizer.fingerprint
+            payload = self.product_quantizer.encode(embeddings).tobytes()
+        
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, CODEC_IDS[self.codec], dim, count, fingerprint)
+        return header + payload
+    
+    def decode(self, data: bytes) -> np.ndarray:
+        return decode_embeddings(data, self.product_quantizer)
+
+
+def read_header(data: bytes) -> dict:
+    """Parse and validate the header of an encoded payload"""
+    if len(data) < HEADER.size:
+        raise ValueError("Embedding payload is shorter than its header")
+    magic, version, codec_id, dim, count, fingerprint = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not an encoded embedding payload")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Unsupported embedding format version {version}")
+    if codec_id not in CODEC_NAMES:
+        raise ValueError(f"Unknown embedding codec id {codec_id}")
+    return {
+        "version": version,
+        "codec": CODEC_NAMES[codec_id],
+        "dimension": dim,
+        "count": count,
+        "fingerprint": fingerprint
+    }
+
+
+def decode_embeddings(
+    data: bytes,
+    product_quantizer: Optional[ProductQuantizer] = None
+) -> np.ndarray:
+    """Decode any encoded payload to a float32 (count, dim) matrix"""
+    header = read_header(data)
+    count, dim, codec = header["count"], header["dimension"], header["codec"]
+    payload = memoryview(data)[HEADER.size:]
+    
+    if codec == "float32":
+        embeddings = np.frombuffer(payload, dtype=np.float32, count=count * dim)
+    elif codec == "float16":
+        embeddings = np.frombuffer(payload, dtype=np.float16, count=count * dim).astype(np.float32)
+    elif codec == "int8":
+        scales = np.frombuffer(payload, dtype=np.float32, count=count)
+        quantized = np.frombuffer(payload, dtype=np.int8, count=count * dim, offset=4 * count)
+        embeddings = quantized.reshape(count, dim).astype(np.float32) * scales[:, None]
+    else:
+        if product_quantizer is None or product_quantizer.fingerprint != header["fingerprint"]:
+            raise ValueError("Payload was encoded with a product quantizer that is not available")
+        codes = np.frombuffer(payload, dtype=np.uint8, count=count * product_quantizer.n_subvectors)
+        embeddings = product_quantizer.decode(codes.reshape(count, -1))
+    
+    return embeddings.reshape(count, dim)
\ No newline at end of file
@@ -3,25 +3,38 @@ Semantic Embedding Pipeline
 Handles text processing and embedding generation with multi-language support
 """
 
+import os
 import asyncio
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterator
 import numpy as np
 import torch
 from dataclasses import dataclass
-from functools import lru_cache
+from functools import lru_cache, partial
 import hashlib
 import json
+import re
+import threading
+from collections import OrderedDict
 from datetime import datetime
 import nltk
 from nltk.tokenize import sent_tokenize, word_tokenize
 from nltk.corpus import stopwords
 import spacy
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 import tiktoken
 
+from .embedding_cache import EmbeddingCache
+from .embedding_codec import EmbeddingCodec
+from .near_duplicates import NearDuplicateIndex
+
 logger = logging.getLogger(__name__)
 
+# Preferred chunk boundaries, strongest first
+CHUNK_SEPARATORS = ["\n\n", "\n", ". ", " "]
+
+# Word-level tokens used when no tiktoken encoding is available
+_FALLBACK_TOKEN_PATTERN = re.compile(r"\s*\S+")
+
 
 @dataclass
 class EmbeddingConfig:
@@ -32,6 +45,10 @@ class EmbeddingConfig:
     batch_size: int = 32
     normalize: bool = True
     cache_embeddings: bool = True
+    language: str = "en"  # spaCy model used for preprocessing (en, multi)
+    preprocess_batch_size: int = 256  # Texts per nlp.pipe batch
+    preprocess_n_process: int = 1  # spaCy worker processes for large batches
+    dedupe_chunks: bool = True  # Embed near-duplicate document chunks once
 
 
 @dataclass
@@ -48,22 +65,40 @@ class TextChunk:
 class EmbeddingPipeline:
     """Pipeline for generating semantic embeddings"""
     
-    def __init__(self, model_manager, redis_client=None):
+    def __init__(
+        self,
+        model_manager,
+        redis_client=None,
+        cache_max_bytes: int = 256 * 1024 * 1024,
+        cache_codec: Optional[EmbeddingCodec] = None
+    ):
         self.model_manager = model_manager
         self.redis_client = redis_client
         self.spacy_models = {}
         self._initialize_nlp_resources()
         
-        # Text splitter for chunking
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=512,
-            chunk_overlap=50,
-            length_function=self._tiktoken_len,
-            separators=["\n\n", "\n", ". ", " ", ""]
+        # Tokenizer for chunking, loaded once on first use
+        self._encoding = None
+        self._encoding_loaded = False
+        
+        # Bounded two-tier cache for embeddings (in-process LRU + Redis)
+        self.embedding_cache = EmbeddingCache(
+            redis_client,
+            max_bytes=cache_max_bytes,
+            codec=cache_codec or EmbeddingCodec.from_env(
+                "EMBEDDING_CACHE_CODEC", "float16", "EMBEDDING_CACHE_PQ_PATH"
+            )
         )
         
-        # Cache for embeddings
-        self._embedding_cache = {}
+        # Cache keys currently being embedded, shared by concurrent requests
+        self._inflight: Dict[str, asyncio.Future] = {}
+        
+        # Canonical chunks seen across a tenant's documents (boilerplate,
+        # repeated blurbs), for the most recently active tenants
+        self.chunk_indices: "OrderedDict[str, NearDuplicateIndex]" = OrderedDict()
+        self.chunk_index_entries = int(os.getenv("CHUNK_DEDUP_MAX_ENTRIES", "10000"))
+        self.chunk_index_tenants = int(os.getenv("CHUNK_DEDUP_MAX_TENANTS", "64"))
+        self._chunk_indices_lock = threading.Lock()
         
     def _initialize_nlp_resources(self):
         """Initialize NLP resources"""
@@ -89,163 +124,339 @@ class EmbeddingPipeline:
         except:
             logger.warning("Multilingual spaCy model not found. Install with: python -m spacy download xx_ent_wiki_sm")
     
+    def _get_encoding(self):
+        """tiktoken encoding, or None if it cannot be loaded"""
+        if not self._encoding_loaded:
+            self._encoding_loaded = True
+            try:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                logger.warning(f"tiktoken encoding unavailable, chunking by words: {e}")
+        return self._encoding
+    
     def _tiktoken_len(self, text: str) -> int:
         """Calculate token length using tiktoken"""
-        try:
-            encoding = tiktoken.get_encoding("cl100k_base")
-            return len(encoding.encode(text))
-        except:
+        encoding = self._get_encoding()
+        if encoding is None:
             # Fallback to simple word count
             return len(text.split())
+        return len(encoding.encode(text, disallowed_special=()))
+    
+    def _token_offsets(self, text: str) -> List[int]:
+        """Character offset at which each token of ``text`` starts"""
+        encoding = self._get_encoding()
+        if encoding is None:
+            return [match.start() for match in _FALLBACK_TOKEN_PATTERN.finditer(text)]
+        
+        tokens = encoding.encode(text, disallowed_special=())
+        _, offsets = encoding.decode_with_offsets(tokens)
+        return offsets
     
     def _get_cache_key(self, text: str, config: EmbeddingConfig) -> str:
         """Generate cache key for text embedding"""
         text_hash = hashlib.sha256(text.encode()).hexdigest()
-        config_str = f"{config.model_type}_{config.normalize}"
-        return f"embedding:{text_hash}:{config_str}"
-    
-    async def _get_cached_embedding(self, cache_key: str) -> Optional[np.ndarray]:
-        """Get embedding from cache"""
-        if self.redis_client:
-            try:
-                cached = await self.redis_client.get(cache_key)
-                if cached:
-                    return np.frombuffer(cached, dtype=np.float32)
-            except Exception as e:
-                logger.warning(f"Cache retrieval failed: {e}")
-        
-        return self._embedding_cache.get(cache_key)
-    
-    async def _cache_embedding(self, cache_key: str, embedding: np.ndarray):
-        """Cache embedding"""
-        self._embedding_cache[cache_key] = embedding
-        
-        if self.redis_client:
-            try:
-                await self.redis_client.setex(
-                    cache_key,
-                    3600 * 24,  # 24 hour cache
-                    embedding.tobytes()
-                )
-            except Exception as e:
-                logger.warning(f"Cache storage failed: {e}")
+        # The language picks the preprocessing pipeline, so it changes the result
+        config_str = f"{config.model_type}_{config.normalize}_{config.language}"
+        # v4: keyed by language (v3 was EmbeddingCodec payloads, v2 raw float16)
+        return f"embedding:v4:{text_hash}:{config_str}"
     
     def preprocess_text(self, text: str, language: str = "en") -> str:
         """Preprocess text for embedding generation"""
+        return self.preprocess_texts([text], language)[0]
+    
+    def preprocess_texts(
+        self,
+        texts: List[str],
+        language: str = "en",
+        batch_size: int = 256,
+        n_process: int = 1
+    ) -> List[str]:
+        """Preprocess a batch of texts with one spaCy ``nlp.pipe`` pass
+        
+        Stop words and punctuation are lexical attributes, so every pipeline
+        component is disabled and only the tokenizer runs. Worker processes
+        are only started when the batch is big enough to keep them busy.
+        """
         # Basic cleaning
-        text = text.strip()
-        text = " ".join(text.split())  # Normalize whitespace
+        texts = [" ".join(text.split()) for text in texts]  # Normalize whitespace
         
         # Use spaCy for advanced preprocessing if available
-        if language in self.spacy_models:
-            doc = self.spacy_models[language](text)
-            # Remove stop words and punctuation for embedding
-            tokens = [token.text.lower() for token in doc 
-                     if not token.is_stop and not token.is_punct and token.text.strip()]
-            return " ".join(tokens)
-        
-        return text
+        nlp = self.spacy_models.get(language)
+        if nlp is None:
+            return texts
+        
+        if len(texts) < batch_size * max(n_process, 2):
+            n_process = 1
+        
+        docs = nlp.pipe(
+            texts,
+            batch_size=batch_size,
+            n_process=n_process,
+            disable=nlp.pipe_names
+        )
+        
+        # Remove stop words and punctuation for embedding
+        return [
+            " ".join(
+                token.text.lower() for token in doc
+                if not token.is_stop and not token.is_punct and token.text.strip()
+            )
+            for doc in docs
+        ]
+    
+    @staticmethod
+    def _at_separator(text: str, offset: int, separator: str) -> bool:
+        """Whether an occurrence of ``separator`` touches position ``offset``
+        
+        Tokenisers attach whitespace to either side of a word, so the
+        separator may end before the boundary, straddle it, or sit in the
+        whitespace that starts the next token.
+        """
+        window = text[offset:offset + 16]
+        gap_end = offset + len(window) - len(window.lstrip())
+        return any(
+            text.startswith(separator, position)
+            for position in range(max(0, offset - len(separator)), gap_end + 1)
+        )
     
     def chunk_text(self, text: str, config: EmbeddingConfig) -> List[TextChunk]:
         """Split text into chunks for embedding"""
-        # Update text splitter config
-        self.text_splitter.chunk_size = config.chunk_size
-        self.text_splitter.chunk_overlap = config.chunk_overlap
-        
-        # Split text
-        chunks = self.text_splitter.split_text(text)
-        
-        # Create TextChunk objects
-        text_chunks = []
-        current_index = 0
-        
-        for i, chunk in enumerate(chunks):
-            start_index = text.find(chunk, current_index)
-            end_index = start_index + len(chunk)
+        return list(self.iter_chunks(text, config))
+    
+    def iter_chunks(self, text: str, config: EmbeddingConfig) -> Iterator[TextChunk]:
+        """Stream chunks of at most ``chunk_size`` tokens
+        
+        The document is tokenised once. Each chunk ends on the token boundary
+        closest to the window end that follows the strongest separator
+        (paragraph, line, sentence, word) found in the second half of the
+        window; consecutive chunks share ``chunk_overlap`` tokens. Offsets and
+        token counts come from that single pass, so repeated passages map to
+        their real positions.
+        """
+        offsets = self._token_offsets(text)
+        n_tokens = len(offsets)
+        chunk_size = max(1, config.chunk_size)
+        overlap = min(max(0, config.chunk_overlap), chunk_size - 1)
+        
+        def char_offset(token_index: int) -> int:
+            return offsets[token_index] if token_index < n_tokens else len(text)
+        
+        start = 0
+        chunk_index = 0
+        while start < n_tokens:
+            end = min(start + chunk_size, n_tokens)
             
-            text_chunk = TextChunk(
-                text=chunk,
-                start_index=start_index,
-                end_index=end_index,
-                chunk_index=i,
-                metadata={
-                    "chunk_size": len(chunk),
-                    "token_count": self._tiktoken_len(chunk)
-                }
-            )
+            if end < n_tokens:
+                # Latest boundary after the strongest separator in the window
+                earliest = start + max(1, chunk_size // 2)
+                for separator in CHUNK_SEPARATORS:
+                    boundary = next(
+                        (
+                            j for j in range(end, earliest - 1, -1)
+                            if self._at_separator(text, char_offset(j), separator)
+                        ),
+                        None
+                    )
+                    if boundary is not None:
+                        end = boundary
+                        break
             
-            text_chunks.append(text_chunk)
-            current_index = end_index
-        
-        return text_chunks
+            # Trim surrounding whitespace without losing exact offsets
+            raw_start, raw_end = char_offset(start), char_offset(end)
+            chunk = text[raw_start:raw_end]
+            start_index = raw_start + len(chunk) - len(chunk.lstrip())
+            end_index = raw_end - (len(chunk) - len(chunk.rstrip()))
+            
+            if end_index > start_index:
+                yield TextChunk(
+                    text=text[start_index:end_index],
+                    start_index=start_index,
+                    end_index=end_index,
+                    chunk_index=chunk_index,
+                    metadata={
+                        "chunk_size": end_index - start_index,
+                        "token_count": end - start
+                    }
+                )
+                chunk_index += 1
+            
+            if end >= n_tokens:
+                break
+            start = max(end - overlap, start + 1)
     
     async def generate_embeddings(
         self,
         texts: List[str],
-        config: Optional[EmbeddingConfig] = None
+        config: Optional[EmbeddingConfig] = None,
+        stats: Optional[Dict[str, int]] = None
     ) -> List[np.ndarray]:
-        """Generate embeddings for multiple texts"""
+        """Generate embeddings for multiple texts
+        
+        Identical texts are embedded once. With caching enabled, all cache
+        lookups for the batch take one local pass plus one Redis round trip,
+        and texts already being embedded by a concurrent call are awaited
+        instead of recomputed. If ``stats`` is given, the number of texts
+        requested and served from the cache is added to it.
+        """
         if config is None:
             config = EmbeddingConfig()
         
-        embeddings = []
-        uncached_texts = []
-        uncached_indices = []
-        
-        # Check cache first
-        for i, text in enumerate(texts):
-            if config.cache_embeddings:
-                cache_key = self._get_cache_key(text, config)
-                cached_embedding = await self._get_cached_embedding(cache_key)
-                
-                if cached_embedding is not None:
-                    embeddings.append(cached_embedding)
+        # De-duplicate identical texts (single-flight within the request)
+        keys = [self._get_cache_key(text, config) for text in texts]
+        unique = {}
+        for key, text in zip(keys, texts):
+            unique.setdefault(key, text)
+        
+        results: Dict[str, np.ndarray] = {}
+        if config.cache_embeddings:
+            cached = await self.embedding_cache.get_many(list(unique))
+            for key, embedding in zip(list(unique), cached):
+                if embedding is not None:
+                    results[key] = embedding
+        
+        if stats is not None:
+            stats["requested"] = stats.get("requested", 0) + len(texts)
+            stats["cache_hits"] = stats.get("cache_hits", 0) + sum(1 for key in keys if key in results)
+        
+        # Misses are split into ones we compute and ones another call is
+        # computing; if that call is cancelled its texts are retried here
+        pending = {key: text for key, text in unique.items() if key not in results}
+        while pending:
+            waiting = {}
+            owned = {}
+            for key, text in pending.items():
+                if config.cache_embeddings and key in self._inflight:
+                    waiting[key] = self._inflight[key]
                 else:
-                    embeddings.append(None)
-                    uncached_texts.append(text)
-                    uncached_indices.append(i)
-            else:
-                uncached_texts.append(text)
-                uncached_indices.append(i)
-                embeddings.append(None)
-        
-        # Generate embeddings for uncached texts
-        if uncached_texts:
-            # Preprocess texts
-            processed_texts = [self.preprocess_text(text) for text in uncached_texts]
+                    owned[key] = text
             
-            # Generate embeddings in batches
-            batch_embeddings = await self.model_manager.get_embeddings_batch(
-                processed_texts,
-                model_type=config.model_type,
-                batch_size=config.batch_size
-            )
+            if owned:
+                await self._embed_owned(owned, config, results)
             
-            # Convert to numpy and normalize if needed
-            batch_embeddings = batch_embeddings.cpu().numpy()
+            pending = {}
+            for key, future in waiting.items():
+                try:
+                    # Shielded, so cancelling this call leaves other waiters alone
+                    results[key] = await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    if not future.cancelled():
+                        raise
+                    pending[key] = unique[key]
+        
+        return [results[key] for key in keys]
+    
+    async def _embed_owned(
+        self,
+        owned: Dict[str, str],
+        config: EmbeddingConfig,
+        results: Dict[str, np.ndarray]
+    ):
+        """Embed texts by cache key, publishing them to concurrent callers"""
+        loop = asyncio.get_event_loop()
+        created: Dict[str, asyncio.Future] = {}
+        if config.cache_embeddings:
+            for key in owned:
+                created[key] = self._inflight[key] = loop.create_future()
+        
+        # Every owned future is settled and unregistered on the way out,
+        # including on cancellation (e.g. a failed sibling stage or a
+        # closed stream), so later callers never wait on it forever;
+        # waiters retry texts whose future was cancelled
+        error: Optional[BaseException] = None
+        try:
+            computed = await self._embed_texts(list(owned.values()), config)
+            new_embeddings = dict(zip(owned, computed))
+            results.update(new_embeddings)
             
-            if config.normalize:
-                # L2 normalization
-                norms = np.linalg.norm(batch_embeddings, axis=1, keepdims=True)
-                batch_embeddings = batch_embeddings / (norms + 1e-8)
+            for key, embedding in new_embeddings.items():
+                if key in created and not created[key].done():
+                    created[key].set_result(embedding)
             
-            # Cache and update results
-            for idx, (orig_idx, text) in enumerate(zip(uncached_indices, uncached_texts)):
-                embedding = batch_embeddings[idx]
-                embeddings[orig_idx] = embedding
-                
-                if config.cache_embeddings:
-                    cache_key = self._get_cache_key(text, config)
-                    await self._cache_embedding(cache_key, embedding)
-        
-        return embeddings
+            if config.cache_embeddings:
+                await self.embedding_cache.set_many(new_embeddings)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            for key, future in created.items():
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+                if future.done():
+                    continue
+                if error is None or isinstance(error, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(error)
+                    # Mark retrieved so unawaited futures don't log
+                    future.exception()
+    
+    async def _embed_texts(
+        self,
+        texts: List[str],
+        config: EmbeddingConfig
+    ) -> np.ndarray:
+        """Preprocess and embed texts with the model, normalizing if needed"""
+        # Preprocess texts (off the event loop, batched through spaCy)
+        loop = asyncio.get_event_loop()
+        processed_texts = await loop.run_in_executor(
+            None,
+            partial(
+                self.preprocess_texts,
+                texts,
+                language=config.language,
+                batch_size=config.preprocess_batch_size,
+                n_process=config.preprocess_n_process
+            )
+        )
+        
+        # Generate embeddings in batches
+        batch_embeddings = await self.model_manager.get_embeddings_batch(
+            processed_texts,
+            model_type=config.model_type,
+            batch_size=config.batch_size
+        )
+        
+        # Convert to numpy and normalize if needed
+        batch_embeddings = batch_embeddings.cpu().numpy()
+        
+        if config.normalize:
+            # L2 normalization
+            norms = np.linalg.norm(batch_embeddings, axis=1, keepdims=True)
+            batch_embeddings = batch_embeddings / (norms + 1e-8)
+        
+        return batch_embeddings
+    
+    def get_chunk_index(self, tenant_id: str) -> NearDuplicateIndex:
+        """Near-duplicate index of a tenant's chunks
+        
+        Tenants never share canonical chunks, so a document's embedding does
+        not depend on what other tenants processed before it.
+        """
+        with self._chunk_indices_lock:
+            index = self.chunk_indices.get(tenant_id)
+            if index is None:
+                index = NearDuplicateIndex(max_entries=self.chunk_index_entries)
+                self.chunk_indices[tenant_id] = index
+                while len(self.chunk_indices) > self.chunk_index_tenants:
+                    self.chunk_indices.popitem(last=False)
+            self.chunk_indices.move_to_end(tenant_id)
+            return index
     
     async def generate_document_embedding(
         self,
         text: str,
-        config: Optional[EmbeddingConfig] = None
+        config: Optional[EmbeddingConfig] = None,
+        tenant_id: str = "default"
     ) -> Tuple[np.ndarray, List[TextChunk]]:
-        """Generate embedding for a document with chunking"""
+        """Generate embedding for a document with chunking
+        
+        With ``dedupe_chunks`` each chunk is embedded as its canonical text:
+        the first chunk, in this or an earlier document of the same tenant,
+        that is a near duplicate of it. Repeated boilerplate is then one model call (or
+        cache hit) however many pages carry it. Chunks keep their own text
+        and offsets; ``metadata["canonical"]`` identifies the canonical text
+        and ``metadata["near_duplicate"]`` marks chunks embedded as another.
+        """
         if config is None:
             config = EmbeddingConfig()
         
@@ -254,6 +465,14 @@ class EmbeddingPipeline:
         
         # Generate embeddings for chunks
         chunk_texts = [chunk.text for chunk in chunks]
+        if config.dedupe_chunks:
+            loop = asyncio.get_event_loop()
+            chunk_texts = await loop.run_in_executor(
+                None, self.get_chunk_index(tenant_id).canonicalize, chunk_texts
+            )
+            for chunk, canonical_text in zip(chunks, chunk_texts):
+                chunk.metadata["canonical"] = hashlib.sha1(canonical_text.encode()).hexdigest()[:16]
+                chunk.metadata["near_duplicate"] = canonical_text != chunk.text
         chunk_embeddings = await self.generate_embeddings(chunk_texts, config)
         
         # Store embeddings in chunks
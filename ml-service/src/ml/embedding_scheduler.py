@@ -0,0 +1,181 @@
+"""
+Embedding Scheduler
+Coalesces concurrent embedding requests into length-bucketed micro-batches
+"""
+
+import asyncio
+import bisect
+import logging
+import time
+from typing import List, Dict, Any, Tuple, Callable, Optional
+from dataclasses import dataclass, field
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from prometheus_client import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+batch_size_histogram = Histogram(
+    'ml_embedding_batch_size',
+    'Texts per scheduled embedding batch',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+)
+queue_wait_histogram = Histogram(
+    'ml_embedding_queue_wait_seconds',
+    'Time texts wait in the embedding scheduler before inference',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+)
+
+
+@dataclass
+class SchedulerConfig:
+    """Configuration for embedding micro-batching"""
+    max_batch_size: int = 64  # Texts per model call
+    max_wait_ms: float = 5.0  # Deadline for a partially filled batch
+    length_buckets: List[int] = field(default_factory=lambda: [128, 512, 2048])  # Char length bucket edges
+
+
+@dataclass
+class _PendingText:
+    text: str
+    future: asyncio.Future
+    enqueued_at: float
+
+
+class EmbeddingScheduler:
+    """Dynamic micro-batcher in front of a single inference worker
+    
+    Texts from concurrent calls are queued per (model, length bucket). A
+    bucket is flushed when it holds ``max_batch_size`` texts or its oldest
+    text has waited ``max_wait_ms``; batches run one at a time on a
+    dedicated thread and results are scattered back to each caller.
+    """
+    
+    def __init__(
+        self,
+        encode_fn: Callable[[str, List[str]], Any],
+        config: Optional[SchedulerConfig] = None
+    ):
+        self.encode_fn = encode_fn
+        self.config = config or SchedulerConfig()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-inference")
+        
+        self._pending: Dict[Tuple[str, int], List[_PendingText]] = defaultdict(list)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop = None
+        
+        self.stats = {"batches": 0, "texts": 0, "total_wait_seconds": 0.0}
+    
+    def _ensure_worker(self):
+        loop = asyncio.get_event_loop()
+        if self._loop is not loop:
+            # First use, or the previous event loop is gone
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._worker = None
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+    
+    def _bucket(self, text: str) -> int:
+        return bisect.bisect_left(self.config.length_buckets, len(text))
+    
+    async def encode(self, model_key: str, texts: List[str]) -> List[Any]:
+        """Queue texts for embedding; returns one embedding per text"""
+        if not texts:
+            return []
+        
+        self._ensure_worker()
+        now = time.perf_counter()
+        futures = []
+        for text in texts:
+            future = self._loop.create_future()
+            self._pending[(model_key, self._bucket(text))].append(
+                _PendingText(text, future, now)
+            )
+            futures.append(future)
+        self._wakeup.set()
+        
+        return list(await asyncio.gather(*futures))
+    
+    async def _run(self):
+        max_wait = self.config.max_wait_ms / 1000.0
+        
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            
+            now = time.perf_counter()
+            ready = [
+                key for key, items in self._pending.items()
+                if len(items) >= self.config.max_batch_size
+                or now - items[0].enqueued_at >= max_wait
+            ]
+            
+            if not ready:
+                deadline = min(items[0].enqueued_at for items in self._pending.values()) + max_wait
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, deadline - now))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            
+            for key in ready:
+                items = self._pending[key][:self.config.max_batch_size]
+                remaining = self._pending[key][self.config.max_batch_size:]
+                if remaining:
+                    self._pending[key] = remaining
+                else:
+                    del self._pending[key]
+                
+                await self._run_batch(key[0], items)
+    
+    async def _run_batch(self, model_key: str, items: List[_PendingText]):
+        """Encode one batch on the inference thread and scatter the rows"""
+        items = [item for item in items if not item.future.done()]
+        if not items:
+            return
+        
+        started = time.perf_counter()
+        for item in items:
+            wait = started - item.enqueued_at
+            queue_wait_histogram.observe(wait)
+            self.stats["total_wait_seconds"] += wait
+        batch_size_histogram.observe(len(items))
+        self.stats["batches"] += 1
+        self.stats["texts"] += len(items)
+        
+        loop = asyncio.get_event_loop()
+        try:
+            embeddings = await loop.run_in_executor(
+                self.executor, self.encode_fn, model_key, [item.text for item in items]
+            )
+        except Exception as e:
+            logger.error(f"Embedding batch failed for {model_key}: {e}")
+            for item in items:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+        
+        for i, item in enumerate(items):
+            if not item.future.done():
+                item.future.set_result(embeddings[i])
+    
+    def get_stats(self) -> Dict[str, Any]:
+        batches = self.stats["batches"]
+        texts = self.stats["texts"]
+        return {
+            **self.stats,
+            "avg_batch_size": texts / batches if batches else 0.0,
+            "avg_queue_wait_ms": 1000.0 * self.stats["total_wait_seconds"] / texts if texts else 0.0,
+            "queued": sum(len(items) for items in self._pending.values())
+        }
+    
+    def shutdown(self):
+        if self._worker is not None and not self._worker.done():
+            self._worker.cancel()
+        self.executor.shutdown(wait=True)
\ No newline at end of file
@@ -0,0 +1,227 @@
+"""
+Force Layout
+Vectorised Barnes-Hut Fruchterman-Reingold layout in two or three dimensions
+"""
+
+import itertools
+import logging
+from typing import Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+MIN_DISTANCE = 0.01
+MAX_DENSE_CELLS = 2 ** 21  # Largest per-level cell lookup table
+
+
+def _interaction_offsets(dimensions: int):
+    """Cell offsets whose parents neighbour the node's parent, minus near cells
+    
+    Indexed by the parity of the node's cell per axis: an even cell sees
+    offsets -2..3, an odd one -3..2. Offsets within one cell on every axis
+    are the near field and are handled by the finer levels.
+    """
+    offsets = {}
+    for parity in itertools.product((0, 1), repeat=dimensions):
+        ranges = [range(-3 + (1 - p), 3 + (1 - p)) for p in parity]
+        block = np.array(list(itertools.product(*ranges)), dtype=np.int64)
+        offsets[parity] = block[np.abs(block).max(axis=1) > 1]
+    return offsets
+
+
+class _Level:
+    """Occupied cells of one octree level, with mass and centre of mass"""
+    
+    def __init__(self, cells: np.ndarray, resolution: int, dimensions: int):
+        self.resolution = resolution
+        self.strides = resolution ** np.arange(dimensions - 1, -1, -1)
+        linear = cells @ self.strides
+        occupied, inverse = np.unique(linear, return_inverse=True)
+        self.lookup = np.full(resolution ** dimensions, -1, dtype=np.int64)
+        self.lookup[occupied] = np.arange(len(occupied))
+        self.inverse = inverse
+        self.counts = np.bincount(inverse).astype(np.float64)
+
+
+def barnes_hut_layout(
+    n_nodes: int,
+    edges: np.ndarray,
+    weights: Optional[np.ndarray] = None,
+    dimensions: int = 3,
+    iterations: int = 50,
+    initial_positions: Optional[np.ndarray] = None,
+    mobility: Optional[np.ndarray] = None,
+    k: Optional[float] = None,
+    temperature: float = 0.1,
+    leaf_size: int = 4,
+    max_level: Optional[int] = None,
+    chunk_size: int = 4096,
+    seed: Optional[int] = None
+) -> np.ndarray:
+    """Fruchterman-Reingold layout with Barnes-Hut approximated repulsion
+    
+    Space is divided into a regular octree (quadtree in 2D). Each node is
+    repelled exactly by the nodes in its own and the adjacent leaf cells;
+    farther nodes are aggregated into cell centres of mass, level by level,
+    using the standard well-separated interaction lists. The far field is
+    evaluated once per occupied cell and expanded to first order around the
+    cell's centre of mass, so a step costs O(n log n) instead of O(n^2).
+    Every stage is a numpy array operation (chunked to bound memory).
+    
+    ``initial_positions`` warm-starts the layout, and ``mobility`` (0..1 per
+    node) scales how far each node may move, so incremental changes can be
+    laid out locally while settled regions stay put. Warm-started layouts
+    are returned in the coordinate frame of ``initial_positions``; others
+    are rescaled to [-1, 1].
+    """
+    if n_nodes == 0:
+        return np.zeros((0, dimensions))
+    if n_nodes == 1:
+        # Nothing to lay out; a warm-started node keeps its position
+        if initial_positions is not None:
+            return np.asarray(initial_positions, dtype=np.float64).reshape(1, dimensions).copy()
+        return np.zeros((1, dimensions))
+    
+    rng = np.random.default_rng(seed)
+    if initial_positions is None:
+        positions = rng.random((n_nodes, dimensions))
+    else:
+        positions = np.asarray(initial_positions, dtype=np.float64).copy()
+        origin = positions.min(axis=0)
+        span = np.ptp(positions, axis=0).max()
+        span = span if span > 0 else 1.0
+        positions = (positions - origin) / span
+    
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    if weights is None:
+        weights = np.ones(len(edges))
+    weights = np.asarray(weights, dtype=np.float64)
+    if mobility is None:
+        mobility = np.ones(n_nodes)
+    
+    if k is None:
+        k = n_nodes ** (-1.0 / dimensions)
+    if max_level is None:
+        max_level = int(np.ceil(np.log(max(n_nodes / leaf_size, 1)) / np.log(2 ** dimensions)))
+    dense_limit = int(np.log2(MAX_DENSE_CELLS) // dimensions)
+    max_level = int(np.clip(max_level, 1, dense_limit))
+    offsets = _interaction_offsets(dimensions)
+    
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        displacement = _repulsion(positions, k, max_level, offsets, chunk_size)
+        
+        if len(edges):
+            delta = positions[edges[:, 0]] - positions[edges[:, 1]]
+            distance = np.maximum(np.linalg.norm(delta, axis=1), MIN_DISTANCE)
+            attraction = delta * (weights * distance / k)[:, None]
+            for axis in range(dimensions):
+                displacement[:, axis] -= np.bincount(edges[:, 0], attraction[:, axis], n_nodes)
+                displacement[:, axis] += np.bincount(edges[:, 1], attraction[:, axis], n_nodes)
+        
+        length = np.maximum(np.linalg.norm(displacement, axis=1), MIN_DISTANCE)
+        step = np.minimum(length, temperature) * mobility / length
+        positions += displacement * step[:, None]
+        temperature -= cooling
+    
+    if initial_positions is not None:
+        return positions * span + origin
+    
+    positions -= positions.mean(axis=0)
+    scale = np.abs(positions).max()
+    return positions / scale if scale > 0 else positions
+
+
+def _repulsion(
+    positions: np.ndarray,
+    k: float,
+    max_level: int,
+    offsets,
+    chunk_size: int
+) -> np.ndarray:
+    n_nodes, dimensions = positions.shape
+    k2 = k * k
+    displacement = np.zeros_like(positions)
+    
+    lower = positions.min(axis=0)
+    span = np.ptp(positions, axis=0).max()
+    unit = (positions - lower) / (span if span > 0 else 1.0)
+    
+    # Far field: well-separated cells at every level from 2 down to the leaves
+    for level in range(2, max_level + 1):
+        resolution = 2 ** level
+        cells = np.minimum((unit * resolution).astype(np.int64), resolution - 1)
+        grid = _Level(cells, resolution, dimensions)
+        centres = np.stack([
+            np.bincount(grid.inverse, positions[:, axis]) for axis in range(dimensions)
+        ], axis=1) / grid.counts[:, None]
+        
+        # Interactions are computed once per occupied cell, then expanded to
+        # first order around its centre of mass for each member node
+        occupied_cells = np.zeros((len(grid.counts), dimensions), dtype=np.int64)
+        occupied_cells[grid.inverse] = cells
+        field = np.zeros((len(grid.counts), dimensions))
+        jacobian = np.zeros((len(grid.counts), dimensions, dimensions))
+        
+        parities = occupied_cells & 1
+        for parity, block in offsets.items():
+            selected = np.flatnonzero((parities == np.array(parity)).all(axis=1))
+            for start in range(0, len(selected), chunk_size):
+                targets = selected[start:start + chunk_size]
+                neighbours = occupied_cells[targets][:, None, :] + block[None, :, :]
+                inside = ((neighbours >= 0) & (neighbours < resolution)).all(axis=2)
+                linear = np.where(inside, neighbours @ grid.strides, 0)
+                cell_ids = np.where(inside, grid.lookup[linear], -1)
+                target_idx, slot = np.nonzero(cell_ids >= 0)
+                if not len(target_idx):
+                    continue
+                source = cell_ids[target_idx, slot]
+                target = targets[target_idx]
+                delta = centres[target] - centres[source]
+                distance2 = np.maximum((delta ** 2).sum(axis=1), MIN_DISTANCE ** 2)
+                strength = grid.counts[source] * k2 / distance2
+                for axis in range(dimensions):
+                    field[:, axis] += np.bincount(target, delta[:, axis] * strength, len(field))
+                    for other in range(dimensions):
+                        term = -2 * delta[:, axis] * delta[:, other] / distance2
+                        if axis == other:
+                            term += 1
+                        jacobian[:, axis, other] += np.bincount(target, term * strength, len(field))
+        
+        offset_from_centre = positions - centres[grid.inverse]
+        displacement += field[grid.inverse]
+        displacement += np.einsum('nij,nj->ni', jacobian[grid.inverse], offset_from_centre)
+    
+    # Near field: exact pairs within the same or adjacent leaf cells
+    resolution = 2 ** max_level
+    cells = np.minimum((unit * resolution).astype(np.int64), resolution - 1)
+    grid = _Level(cells, resolution, dimensions)
+    order = np.argsort(grid.inverse, kind='stable')
+    cell_start = np.concatenate([[0], np.cumsum(grid.counts.astype(np.int64))])
+    near = np.array(list(itertools.product((-1, 0, 1), repeat=dimensions)), dtype=np.int64)
+    
+    for start in range(0, n_nodes, chunk_size):
+        nodes = np.arange(start, min(start + chunk_size, n_nodes))
+        neighbours = cells[nodes][:, None, :] + near[None, :, :]
+        inside = ((neighbours >= 0) & (neighbours < resolution)).all(axis=2)
+        linear = np.where(inside, neighbours @ grid.strides, 0)
+        cell_ids = np.where(inside, grid.lookup[linear], -1)
+        node_idx, slot = np.nonzero(cell_ids >= 0)
+        cell_ids = cell_ids[node_idx, slot]
+        
+        # Expand each (node, cell) pair into (node, member) pairs
+        counts = cell_start[cell_ids + 1] - cell_start[cell_ids]
+        source = np.repeat(nodes[node_idx], counts)
+        first = np.repeat(cell_start[cell_ids] - np.cumsum(counts) + counts, counts)
+        target = order[first + np.arange(counts.sum())]
+        keep = source != target
+        source, target = source[keep], target[keep]
+        
+        delta = positions[source] - positions[target]
+        distance2 = np.maximum((delta ** 2).sum(axis=1), MIN_DISTANCE ** 2)
+        force = delta * (k2 / distance2)[:, None]
+        for axis in range(dimensions):
+            displacement[:, axis] += np.bincount(source, force[:, axis], n_nodes)
+    
+    return displacement
\ No newline at end of file
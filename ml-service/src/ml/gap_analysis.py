@@ -3,8 +3,12 @@ Gap Analysis Engine
 Identifies semantic gaps and missing content areas using topic modeling and analysis
 """
 
+import os
 import numpy as np
 import logging
+import hashlib
+import threading
+from pathlib import Path
 from typing import List, Dict, Any, Tuple, Optional, Set
 from dataclasses import dataclass
 from sklearn.feature_extraction.text import TfidfVectorizer
@@ -13,7 +17,9 @@ from bertopic import BERTopic
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 from collections import defaultdict
-import torch
+
+from .topic_model import IncrementalTopicModel
+from .incremental_state import DebouncedSaver
 
 logger = logging.getLogger(__name__)
 
@@ -39,24 +45,39 @@ class GapAnalysisConfig:
     competitor_analysis: bool = True
     coverage_threshold: float = 0.7
     use_embeddings: bool = True
+    incremental_topics: bool = True  # Reuse the tenant's online LDA/NMF model
 
 
 class GapAnalysisEngine:
     """Engine for analyzing semantic gaps in content"""
     
-    def __init__(self, model_manager, similarity_engine):
+    def __init__(self, model_manager, similarity_engine, topic_model_dir: Optional[str] = None):
         self.model_manager = model_manager
         self.similarity_engine = similarity_engine
         self.executor = ThreadPoolExecutor(max_workers=4)
         self.topic_models = {}
         self.gaps = []
         
+        # Incremental topic models per (tenant, method, n_topics), persisted
+        # to topic_model_dir when set so they survive restarts. A model is
+        # saved once it has had save_every updates or save_interval seconds
+        # have passed since its last save; flush_topic_models saves the rest.
+        self.topic_model_dir = Path(topic_model_dir) if topic_model_dir else None
+        self.tenant_topic_models: Dict[Tuple[str, str, int], IncrementalTopicModel] = {}
+        self._tenant_models_lock = threading.Lock()
+        self.topic_model_saver = DebouncedSaver(
+            self._save_topic_model,
+            save_every=int(os.getenv("TOPIC_MODEL_SAVE_EVERY", "20")),
+            save_interval=float(os.getenv("TOPIC_MODEL_SAVE_INTERVAL", "60"))
+        )
+    
     async def analyze_gaps(
         self,
         content_items: List[Dict[str, Any]],
         reference_topics: Optional[List[str]] = None,
         competitor_content: Optional[List[Dict[str, Any]]] = None,
-        config: Optional[GapAnalysisConfig] = None
+        config: Optional[GapAnalysisConfig] = None,
+        tenant_id: str = "default"
     ) -> List[SemanticGap]:
         """Perform comprehensive gap analysis"""
         if config is None:
@@ -68,7 +89,7 @@ class GapAnalysisEngine:
         texts = [item.get("content", "") for item in content_items]
         
         # Perform topic modeling
-        topics, topic_model = await self._perform_topic_modeling(texts, config)
+        topics, topic_model = await self._perform_topic_modeling(texts, config, tenant_id)
         
         # Analyze topic coverage
         coverage_gaps = await self._analyze_topic_coverage(
@@ -96,14 +117,123 @@ class GapAnalysisEngine:
         logger.info(f"Identified {len(self.gaps)} semantic gaps")
         return self.gaps
     
+    def _topic_model_path(self, key: Tuple[str, str, int]) -> Optional[Path]:
+        if self.topic_model_dir is None:
+            return None
+        tenant_id, method, n_topics = key
+        tenant_hash = hashlib.sha1(tenant_id.encode()).hexdigest()[:16]
+        return self.topic_model_dir / f"topics_{tenant_hash}_{method}_{n_topics}.joblib"
+    
+    def _get_tenant_topic_model(
+        self,
+        tenant_id: str,
+        config: GapAnalysisConfig
+    ) -> IncrementalTopicModel:
+        """Return the tenant's incremental topic model, loading or creating it"""
+        key = (tenant_id, config.topic_model, config.n_topics)
+        with self._tenant_models_lock:
+            topic_model = self.tenant_topic_models.get(key)
+            if topic_model is not None:
+                return topic_model
+            
+            path = self._topic_model_path(key)
+            if path is not None and path.exists():
+                try:
+                    topic_model = IncrementalTopicModel.load(path)
+                except Exception as e:
+                    logger.warning(f"Could not load topic model {path}: {e}")
+            if topic_model is None:
+                topic_model = IncrementalTopicModel(
+                    n_topics=config.n_topics,
+                    method=config.topic_model
+                )
+            
+            self.tenant_topic_models[key] = topic_model
+            return topic_model
+    
+    def _save_topic_model(self, key: Tuple[str, str, int]):
+        path = self._topic_model_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self.tenant_topic_models[key].save(path)
+        except Exception as e:
+            logger.warning(f"Could not save topic model {path}: {e}")
+    
+    def _topic_model_updated(self, tenant_id: str, config: GapAnalysisConfig):
+        """Count an update to a tenant's model, saving it when one is due"""
+        key = (tenant_id, config.topic_model, config.n_topics)
+        if self._topic_model_path(key) is not None:
+            self.topic_model_saver.updated(key)
+    
+    def flush_topic_models(self):
+        """Save every topic model with updates since its last save"""
+        self.topic_model_saver.flush()
+    
+    async def update_topic_model(
+        self,
+        tenant_id: str,
+        texts: List[str],
+        config: Optional[GapAnalysisConfig] = None
+    ) -> int:
+        """Feed newly crawled documents into a tenant's topic model
+        
+        Returns the number of documents the model had not seen before.
+        """
+        if config is None:
+            config = GapAnalysisConfig()
+        
+        def update():
+            new_docs = self._get_tenant_topic_model(tenant_id, config).update(texts)
+            if new_docs:
+                self._topic_model_updated(tenant_id, config)
+            return new_docs
+        
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, update)
+    
     async def _perform_topic_modeling(
         self,
         texts: List[str],
-        config: GapAnalysisConfig
+        config: GapAnalysisConfig,
+        tenant_id: str = "default"
     ) -> Tuple[Dict[int, Dict[str, Any]], Any]:
         """Perform topic modeling on texts"""
         loop = asyncio.get_event_loop()
         
+        def model_topics_incrementally():
+            topic_model = self._get_tenant_topic_model(tenant_id, config)
+            new_docs = topic_model.update(texts)
+            if new_docs:
+                self._topic_model_updated(tenant_id, config)
+            
+            # Topic sizes come from the cached doc-topic rows
+            doc_topics = topic_model.doc_topic_matrix(texts)
+            sizes = np.bincount(doc_topics.argmax(axis=1), minlength=config.n_topics)
+            
+            topics = topic_model.get_topics()
+            for topic_idx, topic_info in topics.items():
+                topic_info["coherence"] = self._calculate_topic_coherence(topic_info["words"], texts)
+                topic_info["size"] = int(sizes[topic_idx])
+            
+            logger.info(
+                f"Topic model for tenant {tenant_id}: {new_docs} new of {len(texts)} documents, "
+                f"{topic_model.documents_seen} seen in total"
+            )
+            return topics, topic_model
+        
+        if config.incremental_topics and config.topic_model in ("lda", "nmf"):
+            topics, model = await loop.run_in_executor(self.executor, model_topics_incrementally)
+            self.topic_models[config.topic_model] = model
+            return topics, model
+        
+        # BERTopic gets embeddings from the model manager, so its model is
+        # loaded lazily and counted against the memory budget
+        document_embeddings = None
+        if config.topic_model == "bertopic" and config.use_embeddings:
+            document_embeddings = (
+                await self.model_manager.get_embeddings_batch(texts)
+            ).cpu().numpy()
+        
         def model_topics():
             if config.topic_model == "lda":
                 # LDA topic modeling
@@ -174,19 +304,13 @@ class GapAnalysisEngine:
                 return topics, nmf
             
             else:  # bertopic
-                # BERTopic modeling
-                if config.use_embeddings and hasattr(self.model_manager, 'models'):
-                    embedding_model = self.model_manager.models.get('embeddings')
-                else:
-                    embedding_model = None
-                
+                # BERTopic modeling, on precomputed embeddings when enabled
                 topic_model = BERTopic(
-                    embedding_model=embedding_model,
                     nr_topics=config.n_topics,
                     min_topic_size=config.min_topic_size
                 )
                 
-                topics_list, probs = topic_model.fit_transform(texts)
+                topics_list, probs = topic_model.fit_transform(texts, document_embeddings)
                 
                 # Extract topic information
                 topics = {}
@@ -254,17 +378,11 @@ class GapAnalysisEngine:
             )
             
             # Generate embeddings for discovered topic words
-            discovered_embeddings = []
-            topic_labels = []
-            
-            for topic_id, topic_info in discovered_topics.items():
-                topic_text = " ".join(topic_info["words"][:5])
-                topic_labels.append(topic_id)
-                discovered_embeddings.append(
-                    self.model_manager.get_embeddings(topic_text)
-                )
-            
-            discovered_embeddings = torch.stack(discovered_embeddings).numpy()
+            topic_labels = list(discovered_topics)
+            discovered_embeddings = await self.model_manager.get_embeddings_batch([
+                " ".join(topic_info["words"][:5]) for topic_info in discovered_topics.values()
+            ])
+            discovered_embeddings = discovered_embeddings.cpu().numpy()
             
             # Calculate coverage matrix
             coverage_matrix = np.dot(ref_embeddings, discovered_embeddings.T)
@@ -0,0 +1,126 @@
+"""
+Incremental State
+Document deduplication and persistence shared by per-tenant corpus models
+"""
+
+import os
+import time
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Callable, Hashable, Union
+import numpy as np
+import joblib
+
+
+def doc_key(text: str) -> str:
+    """Content hash identifying a document"""
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+class SeenDigests:
+    """Compact record of every document a model has counted
+    
+    Keeps the first 8 bytes of each content hash in a sorted ``uint64``
+    array, independent of any bounded per-document cache, so documents are
+    recognised however long ago they were seen.
+    """
+    
+    def __init__(self):
+        self.digests = np.zeros(0, dtype=np.uint64)
+    
+    def __len__(self) -> int:
+        return len(self.digests)
+    
+    @staticmethod
+    def _digests(keys: List[str]) -> np.ndarray:
+        """64-bit prefixes of content hashes"""
+        return np.array([int(key[:16], 16) for key in keys], dtype=np.uint64)
+    
+    def unseen(self, keys: List[str]) -> List[str]:
+        """The keys not recorded yet, in order"""
+        if not keys or not len(self.digests):
+            return list(keys)
+        digests = self._digests(keys)
+        positions = np.minimum(np.searchsorted(self.digests, digests), len(self.digests) - 1)
+        seen = self.digests[positions] == digests
+        return [key for key, was_seen in zip(keys, seen) if not was_seen]
+    
+    def add(self, keys: List[str]):
+        if keys:
+            self.digests = np.union1d(self.digests, self._digests(keys))
+
+
+class JoblibState:
+    """Joblib persistence for models guarded by ``_lock``
+    
+    Subclasses hold a ``HashingVectorizer`` as ``vectorizer``; its analyzer
+    (``_analyzer``) and the lock are rebuilt on load instead of pickled.
+    """
+    
+    def save(self, path: Union[str, Path]):
+        """Write the state atomically, through a temporary file of its own"""
+        path = Path(path)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp")
+        os.close(fd)
+        try:
+            with self._lock:
+                joblib.dump(self, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    
+    @classmethod
+    def load(cls, path: Union[str, Path]):
+        return joblib.load(str(path))
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_lock", None)
+        state.pop("_analyzer", None)
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._analyzer = self.vectorizer.build_analyzer()
+        self._lock = threading.Lock()
+
+
+class DebouncedSaver:
+    """Saves per-key state every ``save_every`` updates or ``save_interval`` seconds
+    
+    ``updated`` counts an update to a key and saves it when one is due;
+    ``flush`` saves every key with updates since its last save. Saves run
+    on the calling thread, outside the saver's lock.
+    """
+    
+    def __init__(self, save: Callable[[Hashable], None], save_every: int, save_interval: float):
+        self.save = save
+        self.save_every = save_every
+        self.save_interval = save_interval
+        # Key -> (updates since its last save, time of its last save)
+        self._unsaved_updates: Dict[Hashable, Any] = {}
+        self._lock = threading.Lock()
+    
+    def updated(self, key: Hashable):
+        now = time.monotonic()
+        with self._lock:
+            updates, last_saved = self._unsaved_updates.get(key, (0, now))
+            updates += 1
+            due = updates >= self.save_every or now - last_saved >= self.save_interval
+            self._unsaved_updates[key] = (0, now) if due else (updates, last_saved)
+        
+        if due:
+            self.save(key)
+    
+    def flush(self):
+        with self._lock:
+            keys = [key for key, (updates, _) in self._unsaved_updates.items() if updates]
+            now = time.monotonic()
+            for key in keys:
+                self._unsaved_updates[key] = (0, now)
+        
+        for key in keys:
+            self.save(key)
@@ -0,0 +1,396 @@
+"""
+Similarity Index Store
+Persists FAISS/Annoy indices and their metadata to disk for fast warm starts
+"""
+
+import os
+import re
+import json
+import shutil
+import tempfile
+import logging
+from pathlib import Path
+from typing import List, Dict, Any, Tuple, Optional, Iterator
+from collections.abc import MutableMapping
+from datetime import datetime
+import numpy as np
+import faiss
+from annoy import AnnoyIndex
+
+logger = logging.getLogger(__name__)
+
+
+# Bump when the on-disk layout changes
+INDEX_FORMAT_VERSION = 2
+
+# Versions this reader understands (1: fixed-width string metadata columns)
+SUPPORTED_FORMAT_VERSIONS = (1, 2)
+
+# FAISS index types IO_FLAG_MMAP actually maps (faiss 1.7 reads Flat and
+# HNSW storage into memory regardless)
+MMAP_INDEX_TYPES = ("ivf_flat", "ivf_pq")
+
+# Older generations kept next to the current one (for readers still mapping them)
+KEEP_GENERATIONS = 2
+
+_INDEX_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_:\-][A-Za-z0-9_.:\-]*$")
+
+
+class ColumnarMetadata(MutableMapping):
+    """Read-mostly id -> metadata mapping backed by column arrays
+    
+    Rows are decoded on access, so loading millions of records costs a few
+    array reads instead of building millions of dicts. String and JSON
+    columns are one UTF-8 blob plus row offsets. Writes go to an overlay
+    dict and removals to a tombstone set.
+    """
+    
+    def __init__(self, ids: np.ndarray, columns: List[Dict[str, Any]]):
+        # Sorted ids for lookups; columns stay in stored row order
+        self._rows = np.argsort(ids, kind="stable")
+        self._ids = ids[self._rows]
+        self._columns = [
+            {
+                "name": column["name"],
+                "kind": column["kind"],
+                "values": column["values"],
+                "offsets": column.get("offsets"),
+                "mask": column.get("mask")
+            }
+            for column in columns
+        ]
+        self._overrides: Dict[int, Dict[str, Any]] = {}
+        self._removed = set()
+    
+    def _position(self, key: int) -> Optional[int]:
+        pos = int(np.searchsorted(self._ids, key))
+        if pos < len(self._ids) and self._ids[pos] == key:
+            return pos
+        return None
+    
+    def _decode_row(self, pos: int) -> Dict[str, Any]:
+        row_index = int(self._rows[pos])
+        row = {}
+        for column in self._columns:
+            if column["mask"] is not None and not column["mask"][row_index]:
+                continue
+            offsets = column["offsets"]
+            if offsets is not None:
+                start, end = int(offsets[row_index]), int(offsets[row_index + 1])
+                value = column["values"][start:end].tobytes().decode("utf-8")
+            else:
+                value = column["values"][row_index]
+            
+            if column["kind"] == "json":
+                row[column["name"]] = json.loads(str(value))
+            elif offsets is not None:
+                row[column["name"]] = value
+            else:
+                row[column["name"]] = value.item()
+        return row
+    
+    def __getitem__(self, key: int) -> Dict[str, Any]:
+        if key in self._overrides:
+            return self._overrides[key]
+        if key in self._removed:
+            raise KeyError(key)
+        pos = self._position(key)
+        if pos is None:
+            raise KeyError(key)
+        return self._decode_row(pos)
+    
+    def __setitem__(self, key: int, value: Dict[str, Any]):
+        self._overrides[key] = value
+    
+    def __delitem__(self, key: int):
+        if key in self._overrides:
+            del self._overrides[key]
+            if self._position(key) is not None:
+                self._removed.add(key)
+        elif key not in self._removed and self._position(key) is not None:
+            self._removed.add(key)
+        else:
+            raise KeyError(key)
+    
+    def __iter__(self) -> Iterator[int]:
+        for key in self._ids.tolist():
+            if key not in self._removed and key not in self._overrides:
+                yield key
+        yield from self._overrides
+    
+    def __len__(self) -> int:
+        base = len(self._ids) - len(self._removed)
+        overlay = sum(1 for key in self._overrides if key in self._removed or self._position(key) is None)
+        return base + overlay
+    
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the column arrays (the overlay dict is not counted)"""
+        total = self._ids.nbytes + self._rows.nbytes
+        for column in self._columns:
+            total += column["values"].nbytes
+            for key in ("offsets", "mask"):
+                if column[key] is not None:
+                    total += column[key].nbytes
+        return total
+
+
+def _column_kind(values: List[Any]) -> str:
+    """Pick the narrowest storage kind for a metadata column"""
+    if all(isinstance(v, (bool, np.bool_)) for v in values):
+        return "bool"
+    if all(isinstance(v, (int, np.integer)) and not isinstance(v, (bool, np.bool_)) for v in values):
+        return "int"
+    if all(isinstance(v, (float, np.floating)) for v in values):
+        return "float"
+    if all(isinstance(v, str) for v in values):
+        return "str"
+    return "json"
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def _encode_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """UTF-8 blob of the strings plus (count + 1) offsets into it"""
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    if offsets[-1] < 2 ** 32:
+        offsets = offsets.astype(np.uint32)
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def encode_metadata(metadata: Dict[int, Dict[str, Any]]) -> Tuple[Dict[str, np.ndarray], List[Dict[str, Any]]]:
+    """Encode id -> metadata records as column arrays plus a column schema
+    
+    Numeric and bool columns are typed arrays; string and JSON columns are
+    a UTF-8 blob with offsets, so one long value does not widen every row.
+    Columns mixing ints and floats are stored as JSON to keep each type.
+    """
+    ids = np.fromiter(metadata.keys(), dtype=np.int64, count=len(metadata))
+    records = list(metadata.values())
+    names = sorted({name for record in records for name in record})
+    
+    arrays = {"ids": ids}
+    schema = []
+    defaults = {"bool": False, "int": 0, "float": 0.0, "str": "", "json": "null"}
+    dtypes = {"bool": np.bool_, "int": np.int64, "float": np.float64}
+    
+    for i, name in enumerate(names):
+        present = np.array([name in record for record in records], dtype=bool)
+        kind = _column_kind([record[name] for record in records if name in record])
+        
+        if kind == "json":
+            values = [
+                json.dumps(record[name], default=_json_default) if name in record else defaults[kind]
+                for record in records
+            ]
+        else:
+            values = [record.get(name, defaults[kind]) for record in records]
+        
+        has_offsets = kind in ("str", "json")
+        if has_offsets:
+            arrays[f"col_{i}"], arrays[f"off_{i}"] = _encode_strings(values)
+        else:
+            arrays[f"col_{i}"] = np.asarray(values, dtype=dtypes[kind])
+        masked = not bool(present.all())
+        if masked:
+            arrays[f"mask_{i}"] = present
+        
+        schema.append({"name": name, "kind": kind, "masked": masked, "offsets": has_offsets})
+    
+    return arrays, schema
+
+
+def decode_metadata(arrays: Dict[str, np.ndarray], schema: List[Dict[str, Any]]) -> ColumnarMetadata:
+    """Rebuild a lazily decoded metadata mapping from column arrays"""
+    columns = []
+    for i, column in enumerate(schema):
+        columns.append({
+            "name": column["name"],
+            "kind": column["kind"],
+            "values": arrays[f"col_{i}"],
+            "offsets": arrays[f"off_{i}"] if column.get("offsets") else None,
+            "mask": arrays[f"mask_{i}"] if column["masked"] else None
+        })
+    return ColumnarMetadata(arrays["ids"], columns)
+
+
+class IndexStore:
+    """On-disk store for similarity indices
+    
+    Layout::
+    
+        <root>/<index_name>/manifest.json      current generation pointer
+        <root>/<index_name>/<generation>/      index.faiss | index.ann, metadata.npz
+        <root>/<index_name>/reducer_<method>_<n_components>.joblib
+                                               fitted projections (optional)
+    
+    Each save writes a new generation directory and then atomically swaps the
+    manifest, so replicas reading an older generation are never disturbed.
+    """
+    
+    def __init__(self, root_dir: str):
+        self.root_dir = Path(root_dir)
+    
+    def _index_dir(self, index_name: str) -> Path:
+        if not _INDEX_NAME_PATTERN.match(index_name):
+            raise ValueError(f"Invalid index name for persistence: '{index_name}'")
+        return self.root_dir / index_name
+    
+    def save(
+        self,
+        index_name: str,
+        index: Any,
+        index_type: str,
+        manifest: Dict[str, Any],
+        metadata: Optional[Dict[int, Dict[str, Any]]] = None
+    ) -> Path:
+        """Write index, metadata sidecar and manifest; returns generation dir"""
+        index_dir = self._index_dir(index_name)
+        generation = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        generation_dir = index_dir / generation
+        generation_dir.mkdir(parents=True, exist_ok=False)
+        
+        if index_type == "annoy":
+            index_file = "index.ann"
+            index.save(str(generation_dir / index_file))
+        else:
+            index_file = "index.faiss"
+            if hasattr(faiss, "index_gpu_to_cpu") and faiss.get_num_gpus() > 0:
+                index = faiss.index_gpu_to_cpu(index)
+            faiss.write_index(index, str(generation_dir / index_file))
+        
+        metadata_schema = None
+        if metadata:
+            arrays, metadata_schema = encode_metadata(metadata)
+            np.savez(generation_dir / "metadata.npz", **arrays)
+        
+        manifest = dict(manifest)
+        manifest.update({
+            "format_version": INDEX_FORMAT_VERSION,
+            "index_name": index_name,
+            "index_type": index_type,
+            "generation": generation,
+            "index_file": index_file,
+            "metadata_schema": metadata_schema,
+            "saved_at": datetime.utcnow().isoformat()
+        })
+        
+        # Atomically publish the new generation, through a temporary file of
+        # this save's own so concurrent saves never share one
+        fd, tmp_path = tempfile.mkstemp(dir=index_dir, prefix="manifest.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(manifest, f)
+            os.replace(tmp_path, index_dir / "manifest.json")
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        
+        self._prune_generations(index_dir, generation)
+        
+        logger.info(f"Saved index '{index_name}' generation {generation}")
+        return generation_dir
+    
+    def _prune_generations(self, index_dir: Path, current: str):
+        """Remove generations beyond the most recent KEEP_GENERATIONS"""
+        generations = sorted(
+            (p for p in index_dir.iterdir() if p.is_dir()),
+            key=lambda p: p.name,
+            reverse=True
+        )
+        for old in generations[KEEP_GENERATIONS:]:
+            if old.name != current:
+                shutil.rmtree(old, ignore_errors=True)
+    
+    def read_manifest(self, index_name: str) -> Dict[str, Any]:
+        """Read the current manifest for an index"""
+        manifest_path = self._index_dir(index_name) / "manifest.json"
+        if not manifest_path.exists():
+            raise ValueError(f"No saved index '{index_name}' in {self.root_dir}")
+        
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        
+        if manifest.get("format_version") not in SUPPORTED_FORMAT_VERSIONS:
+            raise ValueError(
+                f"Unsupported index format version {manifest.get('format_version')} "
+                f"for '{index_name}'"
+            )
+        return manifest
+    
+    def load(
+        self,
+        index_name: str,
+        mmap: bool = True
+    ) -> Tuple[Any, Dict[str, Any], Optional[ColumnarMetadata]]:
+        """Load index, manifest and metadata for the current generation
+        
+        With ``mmap`` IVF indices are memory-mapped (``IO_FLAG_MMAP``) so
+        replicas share the page cache, and are read-only; other FAISS types
+        are read into memory and stay modifiable. Annoy indices are always
+        mapped, without prefaulting.
+        """
+        manifest = self.read_manifest(index_name)
+        generation_dir = self._index_dir(index_name) / manifest["generation"]
+        index_path = str(generation_dir / manifest["index_file"])
+        
+        if manifest["index_type"] == "annoy":
+            index = AnnoyIndex(manifest["dimension"], manifest["annoy_metric"])
+            index.load(index_path, prefault=False)
+        else:
+            flags = faiss.IO_FLAG_MMAP if mmap and manifest["index_type"] in MMAP_INDEX_TYPES else 0
+            index = faiss.read_index(index_path, flags)
+        
+        metadata = None
+        if manifest.get("metadata_schema"):
+            with np.load(generation_dir / "metadata.npz", allow_pickle=False) as data:
+                arrays = {key: data[key] for key in data.files}
+            metadata = decode_metadata(arrays, manifest["metadata_schema"])
+        
+        logger.info(f"Loaded index '{index_name}' generation {manifest['generation']} (mmap={mmap})")
+        return index, manifest, metadata
+    
+    @staticmethod
+    def _reducer_file(method: str, n_components: int) -> str:
+        return f"reducer_{method}_{n_components}.joblib"
+    
+    def save_reducer(self, index_name: str, reducer: Any):
+        """Persist a fitted reducer next to the index generations
+        
+        Each method and output dimension has its own file, so reducers of
+        one index do not overwrite each other.
+        """
+        index_dir = self._index_dir(index_name)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=index_dir, prefix="reducer.", suffix=".tmp")
+        os.close(fd)
+        try:
+            reducer.save(tmp_path)
+            os.replace(tmp_path, index_dir / self._reducer_file(reducer.method, reducer.n_components))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    
+    def reducer_path(self, index_name: str, method: str, n_components: int) -> Optional[Path]:
+        """Path of the saved reducer of a method and dimension, if there is one"""
+        path = self._index_dir(index_name) / self._reducer_file(method, n_components)
+        return path if path.exists() else None
+    
+    def list_indices(self) -> List[str]:
+        """Names of all indices with a published manifest"""
+        if not self.root_dir.exists():
+            return []
+        return sorted(
+            p.name for p in self.root_dir.iterdir()
+            if (p / "manifest.json").exists()
+        )
+    
+    def delete(self, index_name: str):
+        """Remove all generations of a saved index"""
+        shutil.rmtree(self._index_dir(index_name), ignore_errors=True)
\ No newline at end of file
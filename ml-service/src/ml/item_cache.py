@@ -0,0 +1,132 @@
+"""
+Item Result Cache
+Per-item analysis results keyed by a hash of their inputs
+"""
+
+import hashlib
+import json
+import logging
+from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _json_default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+class ItemResultCache:
+    """Bounded in-process LRU in front of Redis for per-item results
+    
+    Keys are derived from everything a result depends on (the item's
+    content plus the stage's parameters), so an unchanged item hits the
+    cache across requests while any edit produces a new key. Values are
+    stored as JSON, so callers get a fresh copy on every hit.
+    """
+    
+    def __init__(
+        self,
+        redis_client=None,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: int = 3600 * 24 * 7,
+        namespace: str = "item_result:v1"
+    ):
+        self.redis_client = redis_client
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.namespace = namespace
+        
+        self._local: "OrderedDict[str, str]" = OrderedDict()
+        self._local_bytes = 0
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "evictions": 0}
+    
+    def make_key(self, stage: str, *inputs: Any) -> str:
+        """Cache key for a stage result computed from ``inputs``"""
+        payload = json.dumps(inputs, sort_keys=True, default=_json_default)
+        digest = hashlib.sha256(payload.encode()).hexdigest()
+        return f"{self.namespace}:{stage}:{digest}"
+    
+    def _put_local(self, key: str, stored: str):
+        if len(stored) > self.max_bytes:
+            return
+        
+        previous = self._local.pop(key, None)
+        if previous is not None:
+            self._local_bytes -= len(previous)
+        
+        self._local[key] = stored
+        self._local_bytes += len(stored)
+        
+        while self._local_bytes > self.max_bytes:
+            _, evicted = self._local.popitem(last=False)
+            self._local_bytes -= len(evicted)
+            self.stats["evictions"] += 1
+    
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """Look up keys locally, then fetch all local misses in one MGET"""
+        stored: List[Optional[str]] = [None] * len(keys)
+        remote_positions = []
+        
+        for i, key in enumerate(keys):
+            value = self._local.get(key)
+            if value is not None:
+                self._local.move_to_end(key)
+                stored[i] = value
+                self.stats["local_hits"] += 1
+            else:
+                remote_positions.append(i)
+        
+        if remote_positions and self.redis_client:
+            try:
+                values = await self.redis_client.mget([keys[i] for i in remote_positions])
+                for position, value in zip(remote_positions, values):
+                    if value:
+                        value = value.decode() if isinstance(value, bytes) else value
+                        self._put_local(keys[position], value)
+                        stored[position] = value
+                        self.stats["redis_hits"] += 1
+            except Exception as e:
+                logger.warning(f"Item cache retrieval failed: {e}")
+        
+        self.stats["misses"] += sum(1 for value in stored if value is None)
+        return [json.loads(value) if value is not None else None for value in stored]
+    
+    async def set_many(self, items: Dict[str, Any]):
+        """Store results locally and in Redis with one pipelined round trip"""
+        if not items:
+            return
+        
+        encoded = {
+            key: json.dumps(value, default=_json_default)
+            for key, value in items.items()
+        }
+        for key, stored in encoded.items():
+            self._put_local(key, stored)
+        
+        if self.redis_client:
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for key, stored in encoded.items():
+                    pipe.set(key, stored, ex=self.ttl)
+                await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Item cache storage failed: {e}")
+    
+    def clear(self):
+        """Drop the in-process tier"""
+        self._local.clear()
+        self._local_bytes = 0
+    
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            **self.stats,
+            "local_entries": len(self._local),
+            "local_bytes": self._local_bytes,
+            "max_bytes": self.max_bytes
+        }
\ No newline at end of file
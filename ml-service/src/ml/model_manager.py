@@ -20,21 +20,72 @@ from transformers import (
 import joblib
 from functools import lru_cache
 import asyncio
+import threading
+import time
+from contextlib import contextmanager
 from concurrent.futures import ThreadPoolExecutor
 
+from .embedding_scheduler import EmbeddingScheduler, SchedulerConfig
+from .onnx_backend import OnnxConfig, OnnxSentenceEncoder, OnnxTextClassifier
+
 logger = logging.getLogger(__name__)
 
 
 class ModelManager:
     """Manages ML models for the optimization engine"""
     
-    def __init__(self, model_cache_dir: str = "/app/models"):
+    def __init__(
+        self,
+        model_cache_dir: str = "/app/models",
+        scheduler_config: Optional[SchedulerConfig] = None,
+        inference_backend: Optional[str] = None,
+        onnx_config: Optional[OnnxConfig] = None,
+        memory_budget_mb: Optional[float] = None,
+        idle_unload_seconds: Optional[float] = None
+    ):
         self.model_cache_dir = Path(model_cache_dir)
         self.model_cache_dir.mkdir(parents=True, exist_ok=True)
         self.models: Dict[str, Any] = {}
         self.tokenizers: Dict[str, Any] = {}
+        
+        # torch (default) or onnx (quantized ONNX Runtime on CPU)
+        self.inference_backend = inference_backend or os.getenv("INFERENCE_BACKEND", "torch")
+        self.onnx_config = onnx_config or OnnxConfig()
+        self.model_backends: Dict[str, str] = {}
+        
+        # Lazy loading: models load on first use, idle ones are unloaded
+        # (least recently used first) when the memory budget is exceeded.
+        # Preloaded models, models in use and models used within the last
+        # idle_unload_seconds are never unloaded.
+        self._model_loaders = {
+            "embeddings": self._load_embeddings,
+            "embeddings_multilingual": self._load_multilingual_embeddings,
+            "bert": self._load_bert,
+            "sentiment": self._load_sentiment,
+            "readability_classifier": self._load_readability,
+            "topic_classifier": self._load_topic,
+            "text_generator": self._load_gpt2,
+            "summarizer": self._load_summarizer
+        }
+        if memory_budget_mb is None:
+            memory_budget_mb = float(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))
+        self.memory_budget_bytes = int(memory_budget_mb * 2**20)  # 0 disables
+        if idle_unload_seconds is None:
+            idle_unload_seconds = float(os.getenv("MODEL_IDLE_UNLOAD_SECONDS", "300"))
+        self.idle_unload_seconds = idle_unload_seconds
+        self._in_use: Dict[str, int] = {}
+        self.model_states: Dict[str, str] = {}
+        self.model_sizes: Dict[str, int] = {}
+        self.last_used: Dict[str, float] = {}
+        self.preload: List[str] = []
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._state_lock = threading.RLock()
+        
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.executor = ThreadPoolExecutor(max_workers=4)
+        
+        # Cross-request micro-batching for embeddings
+        self.embedding_scheduler = EmbeddingScheduler(self._encode_texts, scheduler_config)
         logger.info(f"Model Manager initialized with device: {self.device}")
         
         # Configure GPU memory if available
@@ -46,182 +97,294 @@ class ModelManager:
                 for gpu in gpus:
                     tf.config.experimental.set_memory_growth(gpu, True)
     
-    async def initialize_models(self):
-        """Initialize all required models"""
-        logger.info("Initializing ML models...")
+    async def initialize_models(self, preload: Optional[List[str]] = None):
+        """Load the models this replica needs up front
+        
+        Every other model is loaded lazily on first use. ``preload``
+        defaults to the PRELOAD_MODELS env var (comma separated, "all" for
+        every model), or just the default embedding model.
+        """
+        if preload is None:
+            preload = [
+                key.strip() for key in os.getenv("PRELOAD_MODELS", "embeddings").split(",")
+                if key.strip()
+            ]
+        if "all" in preload:
+            preload = list(self._model_loaders)
+        self.preload = preload
+        
+        logger.info(f"Initializing ML models: {', '.join(preload) or 'none'}")
         
         # Load models asynchronously
-        tasks = [
-            self._load_embedding_model(),
-            self._load_nlp_models(),
-            self._load_classification_models(),
-            self._load_generation_models()
-        ]
-        
-        await asyncio.gather(*tasks)
+        await asyncio.gather(*[self.get_model(key) for key in preload])
         logger.info(f"Successfully loaded {len(self.models)} models")
     
-    async def _load_embedding_model(self):
-        """Load sentence transformer for embeddings"""
-        try:
-            loop = asyncio.get_event_loop()
-            
-            # Load multilingual model for better language support
-            model_name = "sentence-transformers/all-MiniLM-L6-v2"
-            
-            def load_model():
-                return SentenceTransformer(
-                    model_name,
-                    device=self.device,
-                    cache_folder=str(self.model_cache_dir)
-                )
-            
-            self.models["embeddings"] = await loop.run_in_executor(
-                self.executor, load_model
-            )
-            
-            # Also load a multilingual model
-            multilingual_model = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
-            
-            def load_multilingual():
-                return SentenceTransformer(
-                    multilingual_model,
-                    device=self.device,
-                    cache_folder=str(self.model_cache_dir)
-                )
-            
-            self.models["embeddings_multilingual"] = await loop.run_in_executor(
-                self.executor, load_multilingual
-            )
-            
-            logger.info("Embedding models loaded successfully")
-        except Exception as e:
-            logger.error(f"Failed to load embedding models: {e}")
-            raise
+    async def get_model(self, model_key: str) -> Any:
+        """Return a model, loading it on first use without blocking the loop"""
+        if model_key in self.models:
+            self._touch(model_key)
+            return self.models[model_key]
+        
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, self._require_model, model_key)
     
-    async def _load_nlp_models(self):
-        """Load NLP models for text analysis"""
-        try:
-            loop = asyncio.get_event_loop()
-            
-            # Load BERT for text analysis
-            bert_model = "bert-base-uncased"
-            
-            def load_bert():
-                tokenizer = AutoTokenizer.from_pretrained(
-                    bert_model,
-                    cache_dir=str(self.model_cache_dir)
-                )
-                model = AutoModel.from_pretrained(
-                    bert_model,
-                    cache_dir=str(self.model_cache_dir)
-                ).to(self.device)
-                return tokenizer, model
-            
-            tokenizer, model = await loop.run_in_executor(
-                self.executor, load_bert
-            )
+    def _require_model(self, model_key: str) -> Any:
+        """Return a model, loading it in the calling thread if needed
+        
+        Loads are single-flight: concurrent callers for the same model wait
+        on a per-model lock and share the result of one load.
+        """
+        if model_key not in self._model_loaders:
+            raise ValueError(f"Unknown model {model_key}")
+        
+        model = self.models.get(model_key)
+        if model is not None:
+            self._touch(model_key)
+            return model
+        
+        with self._state_lock:
+            load_lock = self._load_locks.setdefault(model_key, threading.Lock())
+        
+        with load_lock:
+            model = self.models.get(model_key)
+            if model is not None:
+                self._touch(model_key)
+                return model
             
-            self.tokenizers["bert"] = tokenizer
-            self.models["bert"] = model
+            with self._state_lock:
+                self.model_states[model_key] = "loading"
+            try:
+                model = self._model_loaders[model_key]()
+            except Exception as e:
+                with self._state_lock:
+                    self.model_states[model_key] = "failed"
+                logger.error(f"Failed to load model {model_key}: {e}")
+                raise ValueError(f"Model {model_key} could not be loaded: {e}")
             
-            # Load sentiment analysis pipeline
-            def load_sentiment():
-                return pipeline(
-                    "sentiment-analysis",
-                    model="nlptown/bert-base-multilingual-uncased-sentiment",
-                    device=0 if self.device == "cuda" else -1
-                )
+            with self._state_lock:
+                self.models[model_key] = model
+                self.model_sizes[model_key] = self._estimate_model_bytes(model)
+                self.model_states[model_key] = "loaded"
+                self._touch(model_key)
+                self._enforce_memory_budget(keep=model_key)
             
-            self.models["sentiment"] = await loop.run_in_executor(
-                self.executor, load_sentiment
+            logger.info(
+                f"Loaded model {model_key} "
+                f"({self.model_sizes[model_key] / 2**20:.0f} MB, backend={self.model_backends.get(model_key, 'torch')})"
             )
-            
-            logger.info("NLP models loaded successfully")
-        except Exception as e:
-            logger.error(f"Failed to load NLP models: {e}")
-            raise
+            return model
+    
+    def _touch(self, model_key: str):
+        self.last_used[model_key] = time.monotonic()
     
-    async def _load_classification_models(self):
-        """Load classification models"""
+    @contextmanager
+    def _model_in_use(self, model_key: str):
+        """Hold a model for the duration of a call so it cannot be unloaded"""
+        with self._state_lock:
+            self._in_use[model_key] = self._in_use.get(model_key, 0) + 1
         try:
-            loop = asyncio.get_event_loop()
-            
-            # Load readability classifier
-            def load_readability():
-                return pipeline(
-                    "text-classification",
-                    model="facebook/bart-large-mnli",
-                    device=0 if self.device == "cuda" else -1
-                )
-            
-            self.models["readability_classifier"] = await loop.run_in_executor(
-                self.executor, load_readability
-            )
-            
-            # Load topic classifier
-            def load_topic():
-                return pipeline(
-                    "zero-shot-classification",
-                    model="facebook/bart-large-mnli",
-                    device=0 if self.device == "cuda" else -1
-                )
-            
-            self.models["topic_classifier"] = await loop.run_in_executor(
-                self.executor, load_topic
+            yield self._require_model(model_key)
+        finally:
+            with self._state_lock:
+                self._in_use[model_key] -= 1
+                if not self._in_use[model_key]:
+                    del self._in_use[model_key]
+                self._touch(model_key)
+    
+    def _is_idle(self, model_key: str, now: float) -> bool:
+        """Whether a model may be unloaded: not preloaded, unused for a while"""
+        return (
+            model_key not in self.preload
+            and not self._in_use.get(model_key)
+            and now - self.last_used.get(model_key, 0.0) >= self.idle_unload_seconds
+        )
+    
+    @staticmethod
+    def _estimate_model_bytes(model: Any) -> int:
+        """Approximate resident size of a loaded model"""
+        module = getattr(model, "model", model)  # transformers pipelines wrap the model
+        if hasattr(module, "parameters"):
+            tensors = list(module.parameters()) + list(module.buffers())
+            return sum(t.numel() * t.element_size() for t in tensors)
+        
+        meta = getattr(model, "meta", None)
+        export_dir = getattr(model, "export_dir", None)
+        if meta and export_dir is not None:
+            return (export_dir / meta["model_file"]).stat().st_size
+        return 0
+    
+    def _enforce_memory_budget(self, keep: str):
+        """Unload least recently used idle models until within the budget"""
+        if not self.memory_budget_bytes:
+            return
+        
+        now = time.monotonic()
+        for model_key in sorted(self.models, key=lambda key: self.last_used.get(key, 0.0)):
+            if sum(self.model_sizes.values()) <= self.memory_budget_bytes:
+                break
+            if model_key == keep or not self._is_idle(model_key, now):
+                continue
+            self._unload(model_key)
+        
+        if sum(self.model_sizes.values()) > self.memory_budget_bytes:
+            logger.warning(
+                f"Loaded models use {sum(self.model_sizes.values()) / 2**20:.0f} MB, "
+                f"above the {self.memory_budget_bytes / 2**20:.0f} MB budget"
             )
-            
-            logger.info("Classification models loaded successfully")
-        except Exception as e:
-            logger.error(f"Failed to load classification models: {e}")
-            raise
     
-    async def _load_generation_models(self):
-        """Load text generation models"""
+    def _unload(self, model_key: str):
+        """Drop a model so its memory can be reclaimed; it reloads on next use"""
+        self.models.pop(model_key, None)
+        self.tokenizers.pop(model_key, None)
+        self.model_sizes.pop(model_key, None)
+        self.model_states[model_key] = "unloaded"
+        if model_key.startswith("embeddings"):
+            self.get_embeddings.cache_clear()
+        if self.device == "cuda":
+            torch.cuda.empty_cache()
+        logger.info(f"Unloaded idle model {model_key} to stay within the memory budget")
+    
+    def get_model_status(self) -> Dict[str, Dict[str, Any]]:
+        """Per-model readiness for health checks"""
+        now = time.monotonic()
+        return {
+            model_key: {
+                "state": self.model_states.get(model_key, "unloaded"),
+                "backend": self.model_backends.get(model_key, "torch") if model_key in self.models else None,
+                "memory_mb": round(self.model_sizes.get(model_key, 0) / 2**20, 1),
+                "idle_seconds": round(now - self.last_used[model_key], 1) if model_key in self.last_used else None,
+                "in_use": self._in_use.get(model_key, 0),
+                "preloaded": model_key in self.preload
+            }
+            for model_key in self._model_loaders
+        }
+    
+    def _load_embeddings(self):
+        """Load sentence transformer for embeddings"""
+        model_name = "sentence-transformers/all-MiniLM-L6-v2"
+        return self._load_with_backend(
+            "embeddings",
+            lambda: SentenceTransformer(
+                model_name,
+                device=self.device,
+                cache_folder=str(self.model_cache_dir)
+            ),
+            OnnxSentenceEncoder
+        )
+    
+    def _load_multilingual_embeddings(self):
+        """Load multilingual model for better language support"""
+        multilingual_model = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+        return self._load_with_backend(
+            "embeddings_multilingual",
+            lambda: SentenceTransformer(
+                multilingual_model,
+                device=self.device,
+                cache_folder=str(self.model_cache_dir)
+            ),
+            OnnxSentenceEncoder
+        )
+    
+    def _load_with_backend(self, model_key: str, load_torch, onnx_cls) -> Any:
+        """Load a model, preferring its quantized ONNX export when enabled
+        
+        The first start exports and quantizes the torch model and compares
+        both on sample texts; the export is only used if it passed that
+        drift check. Later starts load the accepted export without torch.
+        """
+        self.model_backends[model_key] = "torch"
+        if self.inference_backend != "onnx" or self.device == "cuda":
+            return load_torch()
+        
+        export_dir = self.model_cache_dir / "onnx" / model_key
+        torch_model = None
         try:
-            loop = asyncio.get_event_loop()
-            
-            # Load small GPT-2 for text generation suggestions
-            def load_gpt2():
-                return pipeline(
-                    "text-generation",
-                    model="gpt2",
-                    device=0 if self.device == "cuda" else -1,
-                    max_length=150
-                )
-            
-            self.models["text_generator"] = await loop.run_in_executor(
-                self.executor, load_gpt2
-            )
-            
-            # Load summarization model
-            def load_summarizer():
-                return pipeline(
-                    "summarization",
-                    model="facebook/bart-large-cnn",
-                    device=0 if self.device == "cuda" else -1
-                )
+            accepted = onnx_cls.is_accepted(export_dir)
+            if accepted:
+                onnx_model = onnx_cls(export_dir, self.onnx_config)
+            elif accepted is None:
+                torch_model = load_torch()
+                onnx_model = onnx_cls.export(torch_model, export_dir, self.onnx_config)
+            else:
+                onnx_model = None
             
-            self.models["summarizer"] = await loop.run_in_executor(
-                self.executor, load_summarizer
-            )
+            if onnx_model is not None and onnx_model.meta["accepted"]:
+                self.model_backends[model_key] = "onnx"
+                return onnx_model
             
-            logger.info("Generation models loaded successfully")
+            logger.warning(f"ONNX export of {model_key} failed its drift check, using torch")
         except Exception as e:
-            logger.error(f"Failed to load generation models: {e}")
-            raise
+            logger.warning(f"ONNX backend unavailable for {model_key}, using torch: {e}")
+        
+        return torch_model if torch_model is not None else load_torch()
+    
+    def _load_bert(self):
+        """Load BERT for text analysis"""
+        bert_model = "bert-base-uncased"
+        tokenizer = AutoTokenizer.from_pretrained(
+            bert_model,
+            cache_dir=str(self.model_cache_dir)
+        )
+        model = AutoModel.from_pretrained(
+            bert_model,
+            cache_dir=str(self.model_cache_dir)
+        ).to(self.device)
+        
+        self.tokenizers["bert"] = tokenizer
+        return model
+    
+    def _load_sentiment(self):
+        """Load sentiment analysis pipeline"""
+        return self._load_with_backend(
+            "sentiment",
+            lambda: pipeline(
+                "sentiment-analysis",
+                model="nlptown/bert-base-multilingual-uncased-sentiment",
+                device=0 if self.device == "cuda" else -1
+            ),
+            OnnxTextClassifier
+        )
+    
+    def _load_readability(self):
+        """Load readability classifier"""
+        return pipeline(
+            "text-classification",
+            model="facebook/bart-large-mnli",
+            device=0 if self.device == "cuda" else -1
+        )
+    
+    def _load_topic(self):
+        """Load topic classifier"""
+        return pipeline(
+            "zero-shot-classification",
+            model="facebook/bart-large-mnli",
+            device=0 if self.device == "cuda" else -1
+        )
+    
+    def _load_gpt2(self):
+        """Load small GPT-2 for text generation suggestions"""
+        return pipeline(
+            "text-generation",
+            model="gpt2",
+            device=0 if self.device == "cuda" else -1,
+            max_length=150
+        )
+    
+    def _load_summarizer(self):
+        """Load summarization model"""
+        return pipeline(
+            "summarization",
+            model="facebook/bart-large-cnn",
+            device=0 if self.device == "cuda" else -1
+        )
     
     @lru_cache(maxsize=1000)
     def get_embeddings(self, text: str, model_type: str = "default") -> torch.Tensor:
         """Get embeddings for text with caching"""
         model_key = "embeddings" if model_type == "default" else "embeddings_multilingual"
-        model = self.models.get(model_key)
-        
-        if not model:
-            raise ValueError(f"Model {model_key} not loaded")
         
         # Generate embeddings
-        with torch.no_grad():
+        with self._model_in_use(model_key) as model, torch.no_grad():
             embeddings = model.encode(text, convert_to_tensor=True)
         
         return embeddings
@@ -232,34 +395,36 @@ class ModelManager:
         model_type: str = "default",
         batch_size: int = 32
     ) -> torch.Tensor:
-        """Get embeddings for batch of texts"""
-        model_key = "embeddings" if model_type == "default" else "embeddings_multilingual"
-        model = self.models.get(model_key)
+        """Get embeddings for batch of texts
         
-        if not model:
-            raise ValueError(f"Model {model_key} not loaded")
-        
-        loop = asyncio.get_event_loop()
+        Texts are handed to the embedding scheduler, which coalesces them
+        with concurrent requests into length-bucketed batches; batch sizes
+        are therefore set by ``SchedulerConfig.max_batch_size`` and
+        ``batch_size`` is kept only for compatibility.
+        """
+        model_key = "embeddings" if model_type == "default" else "embeddings_multilingual"
+        model = await self.get_model(model_key)
         
-        def encode_batch():
-            with torch.no_grad():
-                return model.encode(
-                    texts,
-                    convert_to_tensor=True,
-                    batch_size=batch_size,
-                    show_progress_bar=len(texts) > 100
-                )
+        if not texts:
+            return torch.empty((0, model.get_sentence_embedding_dimension()))
         
-        embeddings = await loop.run_in_executor(self.executor, encode_batch)
-        return embeddings
+        rows = await self.embedding_scheduler.encode(model_key, texts)
+        return torch.stack(rows)
+    
+    def _encode_texts(self, model_key: str, texts: List[str]) -> torch.Tensor:
+        """Encode one scheduled batch (runs on the inference thread)"""
+        with self._model_in_use(model_key) as model, torch.no_grad():
+            return model.encode(
+                texts,
+                convert_to_tensor=True,
+                batch_size=len(texts),
+                show_progress_bar=False
+            )
     
     def analyze_sentiment(self, text: str) -> Dict[str, float]:
         """Analyze sentiment of text"""
-        sentiment_model = self.models.get("sentiment")
-        if not sentiment_model:
-            raise ValueError("Sentiment model not loaded")
-        
-        results = sentiment_model(text[:512])  # Limit text length
+        with self._model_in_use("sentiment") as sentiment_model:
+            results = sentiment_model(text[:512])  # Limit text length
         
         # Convert to standardized format
         sentiment_map = {
@@ -279,11 +444,8 @@ class ModelManager:
     
     def classify_topics(self, text: str, candidate_labels: List[str]) -> Dict[str, float]:
         """Classify text into topics"""
-        classifier = self.models.get("topic_classifier")
-        if not classifier:
-            raise ValueError("Topic classifier not loaded")
-        
-        results = classifier(text, candidate_labels)
+        with self._model_in_use("topic_classifier") as classifier:
+            results = classifier(text, candidate_labels)
         
         # Return as dictionary
         topic_scores = {}
@@ -294,42 +456,36 @@ class ModelManager:
     
     def generate_suggestions(self, prompt: str, max_length: int = 100) -> List[str]:
         """Generate text suggestions"""
-        generator = self.models.get("text_generator")
-        if not generator:
-            raise ValueError("Text generator not loaded")
-        
-        results = generator(
-            prompt,
-            max_length=max_length,
-            num_return_sequences=3,
-            temperature=0.8,
-            do_sample=True
-        )
+        with self._model_in_use("text_generator") as generator:
+            results = generator(
+                prompt,
+                max_length=max_length,
+                num_return_sequences=3,
+                temperature=0.8,
+                do_sample=True
+            )
         
         suggestions = [result["generated_text"] for result in results]
         return suggestions
     
     def summarize_text(self, text: str, max_length: int = 150) -> str:
         """Summarize long text"""
-        summarizer = self.models.get("summarizer")
-        if not summarizer:
-            raise ValueError("Summarizer not loaded")
-        
-        # Handle long texts by chunking
-        max_chunk_length = 1024
-        if len(text) > max_chunk_length:
-            # Simple chunking - in production, use better sentence boundary detection
-            chunks = [text[i:i+max_chunk_length] for i in range(0, len(text), max_chunk_length)]
-            summaries = []
-            
-            for chunk in chunks:
-                result = summarizer(chunk, max_length=max_length // len(chunks), min_length=30)
-                summaries.append(result[0]["summary_text"])
-            
-            return " ".join(summaries)
-        else:
-            result = summarizer(text, max_length=max_length, min_length=30)
-            return result[0]["summary_text"]
+        with self._model_in_use("summarizer") as summarizer:
+            # Handle long texts by chunking
+            max_chunk_length = 1024
+            if len(text) > max_chunk_length:
+                # Simple chunking - in production, use better sentence boundary detection
+                chunks = [text[i:i+max_chunk_length] for i in range(0, len(text), max_chunk_length)]
+                summaries = []
+                
+                for chunk in chunks:
+                    result = summarizer(chunk, max_length=max_length // len(chunks), min_length=30)
+                    summaries.append(result[0]["summary_text"])
+                
+                return " ".join(summaries)
+            else:
+                result = summarizer(text, max_length=max_length, min_length=30)
+                return result[0]["summary_text"]
     
     def cleanup(self):
         """Cleanup models and free memory"""
@@ -338,12 +494,15 @@ class ModelManager:
         # Clear models
         self.models.clear()
         self.tokenizers.clear()
+        self.model_sizes.clear()
+        self.model_states.clear()
         
         # Clear GPU cache if available
         if self.device == "cuda":
             torch.cuda.empty_cache()
         
-        # Shutdown executor
+        # Shutdown executors
+        self.embedding_scheduler.shutdown()
         self.executor.shutdown(wait=True)
         
         logger.info("Model cleanup completed")
@@ -0,0 +1,156 @@
+"""
+Near-Duplicate Detection
+MinHash signatures with an LSH index, for mapping repeated chunks to one canonical text
+"""
+
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Set, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Multipliers of the splitmix64 finalizer used to derive the hash functions
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+
+def shingles(text: str, size: int = 5) -> Set[str]:
+    """Character shingles of the lower-cased, whitespace-normalised text"""
+    text = " ".join(text.lower().split())
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def minhash(shingle_set: Set[str], seeds: np.ndarray) -> np.ndarray:
+    """MinHash signature, one minimum per seed
+    
+    Each shingle is hashed once; the hash functions are that hash XORed
+    with a seed and passed through the splitmix64 finalizer.
+    """
+    hashes = np.fromiter(
+        (
+            int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "little")
+            for shingle in shingle_set
+        ),
+        dtype=np.uint64,
+        count=len(shingle_set)
+    )
+    with np.errstate(over="ignore"):
+        mixed = hashes[:, None] ^ seeds[None, :]
+        mixed = (mixed ^ (mixed >> np.uint64(30))) * _MIX_1
+        mixed = (mixed ^ (mixed >> np.uint64(27))) * _MIX_2
+        mixed ^= mixed >> np.uint64(31)
+    return mixed.min(axis=0)
+
+
+class NearDuplicateIndex:
+    """Canonical texts indexed by MinHash, for near-duplicate lookups
+    
+    A text whose estimated Jaccard similarity (over character shingles) to
+    a canonical text is at least ``threshold`` maps to the most similar
+    one; otherwise it becomes canonical itself. Signatures of ``num_perm``
+    minima are split into ``bands`` LSH bands, so lookups only compare
+    against canonical texts sharing a band; with the defaults pairs above
+    0.8 similarity share one with probability > 0.999. Texts with fewer
+    than ``min_shingles`` shingles are never merged. The ``max_entries``
+    most recently matched canonical texts are kept.
+    """
+    
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 128,
+        bands: int = 32,
+        shingle_size: int = 5,
+        min_shingles: int = 20,
+        max_entries: int = 10000,
+        seed: int = 1
+    ):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.min_shingles = min_shingles
+        self.max_entries = max_entries
+        self.seeds = np.random.default_rng(seed).integers(
+            0, np.iinfo(np.uint64).max, size=num_perm, dtype=np.uint64, endpoint=True
+        )
+        
+        # Entry id -> (signature, canonical text), least recently used first
+        self.entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._buckets: List[Dict[bytes, Set[int]]] = [{} for _ in range(bands)]
+        self._next_id = 0
+        self._lock = threading.Lock()
+        
+        self.lookups = 0
+        self.near_duplicates = 0
+    
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """MinHash signature of a text, None if it is too short to compare"""
+        shingle_set = shingles(text, self.shingle_size)
+        if len(shingle_set) < self.min_shingles:
+            return None
+        return minhash(shingle_set, self.seeds)
+    
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [band.tobytes() for band in np.split(signature, self.bands)]
+    
+    def _find(self, signature: np.ndarray) -> Optional[int]:
+        """Most similar canonical entry at or above the threshold"""
+        candidates = set()
+        for buckets, key in zip(self._buckets, self._band_keys(signature)):
+            candidates.update(buckets.get(key, ()))
+        
+        best, best_similarity = None, self.threshold
+        for entry_id in candidates:
+            similarity = float(np.mean(self.entries[entry_id][0] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = entry_id, similarity
+        return best
+    
+    def _insert(self, signature: np.ndarray, text: str):
+        entry_id = self._next_id
+        self._next_id += 1
+        self.entries[entry_id] = (signature, text)
+        for buckets, key in zip(self._buckets, self._band_keys(signature)):
+            buckets.setdefault(key, set()).add(entry_id)
+        
+        while len(self.entries) > self.max_entries:
+            old_id, (old_signature, _) = self.entries.popitem(last=False)
+            for buckets, key in zip(self._buckets, self._band_keys(old_signature)):
+                bucket = buckets[key]
+                bucket.discard(old_id)
+                if not bucket:
+                    del buckets[key]
+    
+    def canonicalize(self, texts: List[str]) -> List[str]:
+        """Canonical text of each text (the text itself if it has none)"""
+        signatures = [self.signature(text) for text in texts]
+        
+        canonical = []
+        with self._lock:
+            for text, signature in zip(texts, signatures):
+                if signature is None:
+                    canonical.append(text)
+                    continue
+                
+                self.lookups += 1
+                entry_id = self._find(signature)
+                if entry_id is None:
+                    self._insert(signature, text)
+                    canonical.append(text)
+                    continue
+                
+                self.entries.move_to_end(entry_id)
+                canonical_text = self.entries[entry_id][1]
+                if canonical_text != text:
+                    self.near_duplicates += 1
+                canonical.append(canonical_text)
+        
+        return canonical
\ No newline at end of file
@@ -0,0 +1,323 @@
+"""
+ONNX Runtime Backend
+Quantized CPU inference for embedding and sentiment models
+"""
+
+import os
+import json
+import logging
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Union
+from dataclasses import dataclass, field
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+# Texts used to compare ONNX outputs against the torch reference
+DRIFT_SAMPLE_TEXTS = [
+    "Machine learning models learn patterns from data.",
+    "The quarterly report shows revenue growth across all regions.",
+    "I absolutely loved this product, it works perfectly!",
+    "Terrible service, the package arrived broken and late.",
+    "Search engine optimization improves organic traffic.",
+    "Los modelos multilingües comparten un espacio semántico.",
+    "A short one.",
+    "Content marketing strategies should align with audience intent and keep "
+    "readers engaged across long-form articles, newsletters and social posts."
+]
+
+META_FILE = "onnx_meta.json"
+
+
+def _default_intra_op_threads() -> int:
+    """``ONNX_INTRA_OP_THREADS`` if set, else the physical cores available
+    
+    The scheduler runs one inference at a time, so a session can use every
+    core without oversubscribing; hyperthreads only add contention in GEMMs.
+    """
+    configured = os.getenv("ONNX_INTRA_OP_THREADS")
+    if configured:
+        return max(1, int(configured))
+    
+    try:
+        available = len(os.sched_getaffinity(0))
+    except AttributeError:
+        available = os.cpu_count() or 1
+    try:
+        import psutil
+        physical = psutil.cpu_count(logical=False)
+    except ImportError:
+        physical = None
+    return max(1, min(available, physical or available))
+
+
+@dataclass
+class OnnxConfig:
+    """Configuration for the ONNX Runtime backend"""
+    quantize: bool = True  # Dynamic int8 weight quantization
+    # ONNX_INTRA_OP_THREADS, else one thread per available physical core
+    intra_op_threads: int = field(default_factory=_default_intra_op_threads)
+    inter_op_threads: int = 1
+    opset_version: int = 14
+    min_cosine_similarity: float = 0.99  # Embedding drift gate vs torch
+    min_label_agreement: float = 0.9  # Classifier drift gate vs torch
+
+
+class _FirstOutput(torch.nn.Module):
+    """Expose a transformers model as positional inputs -> first output"""
+    
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+    
+    def forward(self, *inputs):
+        return self.model(*inputs, return_dict=False)[0]
+
+
+def _export(model, tokenizer, export_dir: Path, output_name: str, config: OnnxConfig) -> Path:
+    """Export a transformers model to ONNX, optionally int8-quantized"""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    
+    export_dir.mkdir(parents=True, exist_ok=True)
+    sample = tokenizer(["export sample"], return_tensors="pt", padding=True)
+    input_names = [
+        name for name in ("input_ids", "attention_mask", "token_type_ids")
+        if name in sample
+    ]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    # Encoder hidden states follow the input length; logits are per text
+    if output_name == "logits":
+        dynamic_axes[output_name] = {0: "batch"}
+    else:
+        dynamic_axes[output_name] = {0: "batch", 1: "sequence"}
+    
+    fp32_path = export_dir / "model.onnx"
+    with torch.no_grad():
+        torch.onnx.export(
+            _FirstOutput(model.eval()),
+            tuple(sample[name] for name in input_names),
+            str(fp32_path),
+            input_names=input_names,
+            output_names=[output_name],
+            dynamic_axes=dynamic_axes,
+            opset_version=config.opset_version,
+            do_constant_folding=True
+        )
+    tokenizer.save_pretrained(str(export_dir))
+    
+    if not config.quantize:
+        return fp32_path
+    
+    int8_path = export_dir / "model.int8.onnx"
+    quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+    fp32_path.unlink()
+    return int8_path
+
+
+def _create_session(model_path: Path, config: OnnxConfig):
+    import onnxruntime as ort
+    
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = config.intra_op_threads
+    options.inter_op_num_threads = config.inter_op_threads
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+
+
+def _read_meta(export_dir: Path) -> Optional[Dict[str, Any]]:
+    meta_path = Path(export_dir) / META_FILE
+    if not meta_path.exists():
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+
+def _write_meta(export_dir: Path, meta: Dict[str, Any]):
+    with open(Path(export_dir) / META_FILE, "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+class _OnnxModel:
+    """Shared session/tokenizer handling for exported models"""
+    
+    def __init__(self, export_dir: Union[str, Path], config: Optional[OnnxConfig] = None):
+        from transformers import AutoTokenizer
+        
+        self.export_dir = Path(export_dir)
+        self.config = config or OnnxConfig()
+        self.meta = _read_meta(self.export_dir)
+        if self.meta is None:
+            raise ValueError(f"No exported ONNX model in {self.export_dir}")
+        
+        self.tokenizer = AutoTokenizer.from_pretrained(str(self.export_dir))
+        self.session = _create_session(self.export_dir / self.meta["model_file"], self.config)
+        self.input_names = {i.name for i in self.session.get_inputs()}
+    
+    @classmethod
+    def is_accepted(cls, export_dir: Union[str, Path]) -> Optional[bool]:
+        """True/False if an export passed/failed the drift check, None if none"""
+        meta = _read_meta(Path(export_dir))
+        if meta is None or "accepted" not in meta:
+            return None
+        return bool(meta["accepted"])
+    
+    def _run(self, texts: List[str]) -> Any:
+        tokens = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.meta["max_seq_length"],
+            return_tensors="np"
+        )
+        inputs = {
+            name: tokens[name].astype(np.int64)
+            for name in tokens if name in self.input_names
+        }
+        return self.session.run(None, inputs)[0], tokens["attention_mask"]
+
+
+class OnnxSentenceEncoder(_OnnxModel):
+    """Drop-in replacement for ``SentenceTransformer.encode`` on ONNX Runtime"""
+    
+    @classmethod
+    def export(
+        cls,
+        model,
+        export_dir: Union[str, Path],
+        config: Optional[OnnxConfig] = None
+    ) -> "OnnxSentenceEncoder":
+        """Export a SentenceTransformer and record its drift against torch"""
+        config = config or OnnxConfig()
+        export_dir = Path(export_dir)
+        
+        pooling, normalize = "mean", False
+        for module in model:
+            name = type(module).__name__
+            if name == "Pooling":
+                if module.pooling_mode_cls_token:
+                    pooling = "cls"
+                elif module.pooling_mode_max_tokens:
+                    pooling = "max"
+            elif name == "Normalize":
+                normalize = True
+        
+        model_path = _export(model[0].auto_model, model.tokenizer, export_dir, "last_hidden_state", config)
+        meta = {
+            "kind": "sentence_encoder",
+            "model_file": model_path.name,
+            "quantized": config.quantize,
+            "pooling": pooling,
+            "normalize": normalize,
+            "max_seq_length": model.max_seq_length,
+            "dimension": model.get_sentence_embedding_dimension()
+        }
+        _write_meta(export_dir, meta)
+        
+        encoder = cls(export_dir, config)
+        reference = model.encode(DRIFT_SAMPLE_TEXTS, convert_to_numpy=True)
+        candidate = encoder.encode(DRIFT_SAMPLE_TEXTS)
+        cosine = np.sum(reference * candidate, axis=1) / (
+            np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1) + 1e-8
+        )
+        meta["drift"] = {"min_cosine": float(cosine.min()), "mean_cosine": float(cosine.mean())}
+        meta["accepted"] = bool(cosine.min() >= config.min_cosine_similarity)
+        _write_meta(export_dir, meta)
+        encoder.meta = meta
+        
+        logger.info(f"Exported ONNX encoder to {export_dir}: drift {meta['drift']}, accepted={meta['accepted']}")
+        return encoder
+    
+    def _pool(self, hidden: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        if self.meta["pooling"] == "cls":
+            pooled = hidden[:, 0]
+        elif self.meta["pooling"] == "max":
+            pooled = np.where(mask[..., None] > 0, hidden, -np.inf).max(axis=1)
+        else:
+            weights = mask[..., None].astype(hidden.dtype)
+            pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        
+        if self.meta["normalize"]:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
+    
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        convert_to_tensor: bool = False,
+        show_progress_bar: bool = False,
+        **kwargs
+    ) -> Union[np.ndarray, torch.Tensor]:
+        """Encode sentences; mirrors the SentenceTransformer signature"""
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        
+        embeddings = np.zeros((len(sentences), self.meta["dimension"]), dtype=np.float32)
+        # Length-sorted batches keep padding low
+        order = np.argsort([-len(s) for s in sentences], kind="stable")
+        for start in range(0, len(sentences), batch_size):
+            batch = order[start:start + batch_size]
+            hidden, mask = self._run([sentences[i] for i in batch])
+            embeddings[batch] = self._pool(hidden, mask)
+        
+        result = embeddings[0] if single else embeddings
+        return torch.from_numpy(result) if convert_to_tensor else result
+    
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.meta["dimension"]
+
+
+class OnnxTextClassifier(_OnnxModel):
+    """Drop-in replacement for a transformers text-classification pipeline"""
+    
+    @classmethod
+    def export(
+        cls,
+        classifier,
+        export_dir: Union[str, Path],
+        config: Optional[OnnxConfig] = None
+    ) -> "OnnxTextClassifier":
+        """Export a classification pipeline and record label agreement"""
+        config = config or OnnxConfig()
+        export_dir = Path(export_dir)
+        
+        model_path = _export(classifier.model, classifier.tokenizer, export_dir, "logits", config)
+        meta = {
+            "kind": "text_classifier",
+            "model_file": model_path.name,
+            "quantized": config.quantize,
+            "max_seq_length": min(classifier.tokenizer.model_max_length, 512),
+            "id2label": {str(k): v for k, v in classifier.model.config.id2label.items()}
+        }
+        _write_meta(export_dir, meta)
+        
+        onnx_classifier = cls(export_dir, config)
+        reference = [classifier(text)[0] for text in DRIFT_SAMPLE_TEXTS]
+        candidate = [onnx_classifier(text)[0] for text in DRIFT_SAMPLE_TEXTS]
+        agreement = np.mean([r["label"] == c["label"] for r, c in zip(reference, candidate)])
+        score_diff = max(abs(r["score"] - c["score"]) for r, c in zip(reference, candidate))
+        meta["drift"] = {"label_agreement": float(agreement), "max_score_diff": float(score_diff)}
+        meta["accepted"] = bool(agreement >= config.min_label_agreement)
+        _write_meta(export_dir, meta)
+        onnx_classifier.meta = meta
+        
+        logger.info(f"Exported ONNX classifier to {export_dir}: drift {meta['drift']}, accepted={meta['accepted']}")
+        return onnx_classifier
+    
+    def __call__(self, texts: Union[str, List[str]], **kwargs) -> List[Dict[str, Any]]:
+        """Top label and score per text, like ``pipeline(...)``"""
+        if isinstance(texts, str):
+            texts = [texts]
+        
+        logits, _ = self._run(texts)
+        logits = logits - logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits) / np.exp(logits).sum(axis=1, keepdims=True)
+        best = probs.argmax(axis=1)
+        return [
+            {"label": self.meta["id2label"][str(label)], "score": float(probs[i, label])}
+            for i, label in enumerate(best.tolist())
+        ]
\ No newline at end of file
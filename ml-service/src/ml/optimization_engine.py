@@ -3,19 +3,28 @@ Optimization Suggestions Engine
 Generates content improvement recommendations based on semantic analysis
 """
 
+import os
+import hashlib
+import threading
 import numpy as np
 import logging
-from typing import List, Dict, Any, Tuple, Optional
-from dataclasses import dataclass
+from typing import List, Dict, Any, Tuple, Optional, Callable, Awaitable, Union
+from dataclasses import dataclass, asdict
 from collections import defaultdict
+from pathlib import Path
 import asyncio
+import functools
 from concurrent.futures import ThreadPoolExecutor
 import nltk
-from nltk.tokenize import sent_tokenize, word_tokenize
-from textstat import flesch_reading_ease, flesch_kincaid_grade
+from nltk.tokenize import word_tokenize
 import re
 from transformers import pipeline
 
+from .item_cache import ItemResultCache
+from .analysis_context import AnalysisContext
+from .term_statistics import TermStatistics
+from .incremental_state import DebouncedSaver
+
 logger = logging.getLogger(__name__)
 
 
@@ -47,14 +56,50 @@ class OptimizationConfig:
             self.engagement_factors = ["questions", "examples", "visuals", "cta"]
 
 
+def _in_worker_pool(method):
+    """Run a CPU-bound analyzer in the engine's worker pool, awaitably"""
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(method, self, *args, **kwargs)
+        )
+    return wrapper
+
+
 class OptimizationEngine:
     """Engine for generating content optimization suggestions"""
     
-    def __init__(self, model_manager, similarity_engine, gap_analysis_engine):
+    def __init__(
+        self,
+        model_manager,
+        similarity_engine,
+        gap_analysis_engine,
+        result_cache: Optional[ItemResultCache] = None,
+        max_workers: Optional[int] = None,
+        term_stats_dir: Optional[str] = None
+    ):
         self.model_manager = model_manager
         self.similarity_engine = similarity_engine
         self.gap_analysis_engine = gap_analysis_engine
-        self.executor = ThreadPoolExecutor(max_workers=4)
+        # Worker pool for the CPU-bound analyzers (parsing, textstat, regexes)
+        if max_workers is None:
+            max_workers = int(os.getenv("OPTIMIZATION_WORKERS", "4"))
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # Per-analysis results keyed by content and parameters
+        self.result_cache = result_cache
+        
+        # Corpus term statistics per tenant, persisted to term_stats_dir when
+        # set; a tenant's statistics are saved after every save_every updates
+        # or save_interval seconds, flush_term_statistics saves the rest
+        self.term_stats_dir = Path(term_stats_dir) if term_stats_dir else None
+        self.term_statistics: Dict[str, TermStatistics] = {}
+        self._term_statistics_lock = threading.Lock()
+        self.term_statistics_saver = DebouncedSaver(
+            self._save_term_statistics,
+            save_every=int(os.getenv("TERM_STATS_SAVE_EVERY", "20")),
+            save_interval=float(os.getenv("TERM_STATS_SAVE_INTERVAL", "60"))
+        )
         self._initialize_resources()
     
     def _initialize_resources(self):
@@ -69,13 +114,73 @@ class OptimizationEngine:
         except LookupError:
             nltk.download('averaged_perceptron_tagger')
     
+    def _term_statistics_path(self, tenant_id: str) -> Optional[Path]:
+        if self.term_stats_dir is None:
+            return None
+        tenant_hash = hashlib.sha1(tenant_id.encode()).hexdigest()[:16]
+        return self.term_stats_dir / f"terms_{tenant_hash}.joblib"
+    
+    def get_term_statistics(self, tenant_id: str = "default") -> TermStatistics:
+        """Return the tenant's term statistics, loading or creating them"""
+        with self._term_statistics_lock:
+            term_stats = self.term_statistics.get(tenant_id)
+            if term_stats is not None:
+                return term_stats
+            
+            path = self._term_statistics_path(tenant_id)
+            if path is not None and path.exists():
+                try:
+                    term_stats = TermStatistics.load(path)
+                except Exception as e:
+                    logger.warning(f"Could not load term statistics {path}: {e}")
+            if term_stats is None:
+                term_stats = TermStatistics()
+            
+            self.term_statistics[tenant_id] = term_stats
+            return term_stats
+    
+    def _save_term_statistics(self, tenant_id: str):
+        path = self._term_statistics_path(tenant_id)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self.term_statistics[tenant_id].save(path)
+        except Exception as e:
+            logger.warning(f"Could not save term statistics {path}: {e}")
+    
+    def _term_statistics_updated(self, tenant_id: str):
+        """Count an update to a tenant's statistics, saving them when due"""
+        if self._term_statistics_path(tenant_id) is not None:
+            self.term_statistics_saver.updated(tenant_id)
+    
+    def flush_term_statistics(self):
+        """Save every tenant's statistics with updates since their last save"""
+        self.term_statistics_saver.flush()
+    
+    async def update_term_statistics(self, tenant_id: str, texts: List[str]) -> int:
+        """Feed crawled or ingested documents into a tenant's term statistics
+        
+        Refits the tenant's LSI model once the corpus has grown enough.
+        Returns the number of documents not seen before.
+        """
+        def update():
+            term_stats = self.get_term_statistics(tenant_id)
+            new_docs = term_stats.update(texts)
+            if new_docs:
+                term_stats.refresh_lsi()
+                self._term_statistics_updated(tenant_id)
+            return new_docs
+        
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, update)
+    
     async def generate_optimizations(
         self,
         content: str,
         metadata: Dict[str, Any],
         target_keywords: List[str],
         competitive_content: Optional[List[str]] = None,
-        config: Optional[OptimizationConfig] = None
+        config: Optional[OptimizationConfig] = None,
+        tenant_id: str = "default"
     ) -> List[OptimizationSuggestion]:
         """Generate comprehensive optimization suggestions"""
         if config is None:
@@ -83,19 +188,31 @@ class OptimizationEngine:
         
         logger.info("Generating optimization suggestions")
         
-        # Run multiple analysis tasks in parallel
-        tasks = [
-            self._analyze_readability(content, config),
-            self._analyze_structure(content, config),
-            self._analyze_keywords(content, target_keywords, config),
-            self._analyze_engagement(content, config),
-            self._analyze_semantic_coherence(content),
+        # Parsed once, lazily, and shared by every analyzer below
+        context = AnalysisContext(content, self.model_manager)
+        loop = asyncio.get_event_loop()
+        term_stats = await loop.run_in_executor(self.executor, self.get_term_statistics, tenant_id)
+        
+        # Each analysis with the inputs (besides content) its result depends on
+        config_inputs = asdict(config)
+        analyses = [
+            ("readability", [config_inputs], lambda: self._analyze_readability(context, config)),
+            ("structure", [config_inputs], lambda: self._analyze_structure(context, config)),
+            ("keywords", [target_keywords, config_inputs, tenant_id, term_stats.generation],
+             lambda: self._analyze_keywords(context, target_keywords, config, term_stats)),
+            ("engagement", [config_inputs], lambda: self._analyze_engagement(context, config)),
+            ("semantic_coherence", [], lambda: self._analyze_semantic_coherence(context)),
         ]
         
         if competitive_content:
-            tasks.append(self._analyze_competitive_position(content, competitive_content))
+            analyses.append((
+                "competitive_position",
+                [competitive_content],
+                lambda: self._analyze_competitive_position(context, competitive_content)
+            ))
         
-        results = await asyncio.gather(*tasks)
+        # Run uncached analysis tasks in parallel
+        results = await self._run_cached_analyses(content, analyses)
         
         # Combine all suggestions
         all_suggestions = []
@@ -108,21 +225,52 @@ class OptimizationEngine:
         logger.info(f"Generated {len(all_suggestions)} optimization suggestions")
         return all_suggestions
     
-    async def _analyze_readability(
+    async def _run_cached_analyses(
         self,
         content: str,
+        analyses: List[Tuple[str, List[Any], Callable[[], Awaitable[List[OptimizationSuggestion]]]]]
+    ) -> List[List[OptimizationSuggestion]]:
+        """Run analyses, reusing cached results for unchanged inputs"""
+        if self.result_cache is None:
+            return await asyncio.gather(*[run() for _, _, run in analyses])
+        
+        keys = [
+            self.result_cache.make_key(f"optimization.{name}", content, *inputs)
+            for name, inputs, _ in analyses
+        ]
+        cached = await self.result_cache.get_many(keys)
+        results = [
+            [OptimizationSuggestion(**suggestion) for suggestion in value] if value is not None else None
+            for value in cached
+        ]
+        
+        missing = [i for i, value in enumerate(results) if value is None]
+        computed = await asyncio.gather(*[analyses[i][2]() for i in missing])
+        for i, suggestions in zip(missing, computed):
+            results[i] = suggestions
+        
+        await self.result_cache.set_many({
+            keys[i]: [asdict(suggestion) for suggestion in results[i]] for i in missing
+        })
+        return results
+    
+    @_in_worker_pool
+    def _analyze_readability(
+        self,
+        content: Union[str, AnalysisContext],
         config: OptimizationConfig
     ) -> List[OptimizationSuggestion]:
         """Analyze content readability"""
+        context = AnalysisContext.of(content, self.model_manager)
         suggestions = []
         
         # Calculate readability metrics
-        reading_ease = flesch_reading_ease(content)
-        grade_level = flesch_kincaid_grade(content)
+        reading_ease = context.reading_ease
+        grade_level = context.grade_level
         
         # Analyze sentences
-        sentences = sent_tokenize(content)
-        sentence_lengths = [len(word_tokenize(sent)) for sent in sentences]
+        sentences = context.sentences
+        sentence_lengths = context.sentence_lengths
         avg_sentence_length = np.mean(sentence_lengths)
         
         # Check reading level
@@ -182,12 +330,15 @@ class OptimizationEngine:
         
         return suggestions
     
-    async def _analyze_structure(
+    @_in_worker_pool
+    def _analyze_structure(
         self,
-        content: str,
+        content: Union[str, AnalysisContext],
         config: OptimizationConfig
     ) -> List[OptimizationSuggestion]:
         """Analyze content structure"""
+        context = AnalysisContext.of(content, self.model_manager)
+        content = context.content
         suggestions = []
         
         # Check for headers
@@ -207,8 +358,8 @@ class OptimizationEngine:
             ))
         
         # Check paragraph length
-        paragraphs = content.split('\n\n')
-        para_lengths = [len(word_tokenize(para)) for para in paragraphs if para.strip()]
+        paragraphs = context.raw_paragraphs
+        para_lengths = context.paragraph_lengths
         
         long_paragraphs = sum(1 for length in para_lengths if length > 150)
         if long_paragraphs > len(paragraphs) * 0.3:
@@ -246,15 +397,20 @@ class OptimizationEngine:
     
     async def _analyze_keywords(
         self,
-        content: str,
+        content: Union[str, AnalysisContext],
         target_keywords: List[str],
-        config: OptimizationConfig
+        config: OptimizationConfig,
+        term_stats: Optional[TermStatistics] = None
     ) -> List[OptimizationSuggestion]:
         """Analyze keyword optimization"""
+        context = AnalysisContext.of(content, self.model_manager)
         suggestions = []
         
-        content_lower = content.lower()
-        word_count = len(word_tokenize(content))
+        # Tokenising is CPU-bound, keep it off the event loop
+        loop = asyncio.get_event_loop()
+        content_lower, word_count = await loop.run_in_executor(
+            self.executor, lambda: (context.content_lower, context.word_count)
+        )
         
         # Analyze keyword presence and density
         keyword_stats = {}
@@ -314,7 +470,7 @@ class OptimizationEngine:
                     ))
         
         # Suggest LSI keywords
-        lsi_suggestions = await self._generate_lsi_keywords(content, target_keywords)
+        lsi_suggestions = await self._generate_lsi_keywords(context, target_keywords, term_stats)
         if lsi_suggestions:
             suggestions.append(OptimizationSuggestion(
                 suggestion_id="kw_4",
@@ -329,12 +485,14 @@ class OptimizationEngine:
         
         return suggestions
     
-    async def _analyze_engagement(
+    @_in_worker_pool
+    def _analyze_engagement(
         self,
-        content: str,
+        content: Union[str, AnalysisContext],
         config: OptimizationConfig
     ) -> List[OptimizationSuggestion]:
         """Analyze engagement factors"""
+        content = AnalysisContext.of(content, self.model_manager).content
         suggestions = []
         
         # Check for questions
@@ -401,7 +559,7 @@ class OptimizationEngine:
             ))
         
         # Check emotional language
-        emotion_score = await self._analyze_emotional_tone(content)
+        emotion_score = self._emotional_tone(content)
         if emotion_score < 0.3:
             suggestions.append(OptimizationSuggestion(
                 suggestion_id="eng_4",
@@ -418,18 +576,15 @@ class OptimizationEngine:
     
     async def _analyze_semantic_coherence(
         self,
-        content: str
+        content: Union[str, AnalysisContext]
     ) -> List[OptimizationSuggestion]:
         """Analyze semantic coherence of content"""
+        context = AnalysisContext.of(content, self.model_manager)
         suggestions = []
         
-        # Split into paragraphs
-        paragraphs = [p.strip() for p in content.split('\n\n') if p.strip()]
-        
-        if len(paragraphs) > 1:
-            # Generate embeddings for paragraphs
-            embeddings = await self.model_manager.get_embeddings_batch(paragraphs)
-            embeddings = embeddings.numpy()
+        if len(context.paragraphs) > 1:
+            # Embeddings for paragraphs
+            embeddings = await context.paragraph_embeddings()
             
             # Calculate coherence between consecutive paragraphs
             coherence_scores = []
@@ -473,14 +628,15 @@ class OptimizationEngine:
     
     async def _analyze_competitive_position(
         self,
-        content: str,
+        content: Union[str, AnalysisContext],
         competitive_content: List[str]
     ) -> List[OptimizationSuggestion]:
         """Analyze content against competition"""
+        context = AnalysisContext.of(content, self.model_manager)
         suggestions = []
         
         # Generate embeddings
-        our_embedding = self.model_manager.get_embeddings(content)
+        our_embedding = await context.document_embedding()
         comp_embeddings = await self.model_manager.get_embeddings_batch(competitive_content)
         
         # Find unique angles
@@ -503,8 +659,11 @@ class OptimizationEngine:
             ))
         
         # Analyze length
-        our_length = len(word_tokenize(content))
-        comp_lengths = [len(word_tokenize(comp)) for comp in competitive_content]
+        loop = asyncio.get_event_loop()
+        our_length, comp_lengths = await loop.run_in_executor(
+            self.executor,
+            lambda: (context.word_count, [len(word_tokenize(comp)) for comp in competitive_content])
+        )
         avg_comp_length = np.mean(comp_lengths)
         
         if our_length < avg_comp_length * 0.7:
@@ -526,20 +685,30 @@ class OptimizationEngine:
     
     async def _generate_lsi_keywords(
         self,
-        content: str,
-        target_keywords: List[str]
+        content: Union[str, AnalysisContext],
+        target_keywords: List[str],
+        term_stats: Optional[TermStatistics] = None
     ) -> List[str]:
-        """Generate LSI keywords using embeddings"""
+        """Generate LSI keywords
+        
+        Uses the tenant's corpus LSI model when it has one that knows the
+        keywords, and falls back to embedding similarity otherwise.
+        """
+        context = AnalysisContext.of(content, self.model_manager)
+        loop = asyncio.get_event_loop()
+        
+        if term_stats is not None:
+            related = await loop.run_in_executor(
+                self.executor, term_stats.related_terms, context.content, target_keywords
+            )
+            if related is not None:
+                return [word for word, _ in related]
+        
         # Get embeddings for target keywords
         keyword_embeddings = await self.model_manager.get_embeddings_batch(target_keywords)
         
-        # Extract candidate terms from content
-        words = word_tokenize(content.lower())
-        word_freq = defaultdict(int)
-        
-        for word in words:
-            if len(word) > 3 and word.isalpha():
-                word_freq[word] += 1
+        # Candidate terms from the shared word counts
+        word_freq = await loop.run_in_executor(self.executor, lambda: context.word_frequencies)
         
         # Get top candidate terms
         candidates = [word for word, freq in word_freq.items() 
@@ -566,7 +735,7 @@ class OptimizationEngine:
         
         return [word for word, _ in lsi_keywords[:10]]
     
-    async def _analyze_emotional_tone(self, content: str) -> float:
+    def _emotional_tone(self, content: str) -> float:
         """Analyze emotional tone of content"""
         try:
             # Use sentiment analysis
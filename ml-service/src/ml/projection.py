@@ -0,0 +1,237 @@
+"""
+Fitted Projection
+Reusable dimensionality reduction with out-of-sample projection and drift tracking
+"""
+
+import logging
+import threading
+from pathlib import Path
+from typing import Optional, Union
+import numpy as np
+import joblib
+from sklearn.decomposition import IncrementalPCA
+
+logger = logging.getLogger(__name__)
+
+
+class FittedReducer:
+    """Dimensionality reducer that is fitted once and reused for new points
+    
+    ``pca`` projects with an ``IncrementalPCA``; ``umap`` uses
+    ``umap.UMAP.transform`` (falling back to PCA when umap is not
+    installed). Either way a PCA basis with ``monitor_components``
+    components is kept to measure drift: the share of each new vector's
+    variance it fails to reconstruct, relative to the same figure on the
+    fitted data. Once that rises by more than ``drift_threshold`` the
+    reducer reports ``needs_refresh``; ``refresh`` refits on a reservoir
+    sample of everything seen and aligns the new projection to the old one
+    so that existing plots keep their orientation.
+    """
+    
+    def __init__(
+        self,
+        n_components: int = 3,
+        method: str = "pca",
+        monitor_components: int = 32,
+        drift_threshold: float = 0.2,
+        min_drift_samples: int = 100,
+        max_samples: int = 20000,
+        random_state: int = 42
+    ):
+        if method not in ("pca", "umap"):
+            raise ValueError(f"Method {method} cannot project new points, use pca or umap")
+        self.n_components = n_components
+        self.method = method
+        self.monitor_components = monitor_components
+        self.drift_threshold = drift_threshold
+        self.min_drift_samples = min_drift_samples
+        self.max_samples = max_samples
+        self.random_state = random_state
+        
+        self.monitor: Optional[IncrementalPCA] = None
+        self.model = None  # UMAP model, when method == "umap"
+        self.alignment = None  # (source mean, rotation * scale, target mean)
+        self.baseline_error = 0.0
+        self.recent_error = 0.0
+        self.observed = 0
+        self.generation = 0
+        self.samples: Optional[np.ndarray] = None
+        self.samples_seen = 0
+        self._rng = np.random.default_rng(random_state)
+        self._lock = threading.Lock()
+        self._refreshing = False
+    
+    @property
+    def fitted(self) -> bool:
+        return self.monitor is not None
+    
+    def _fit_models(self, embeddings: np.ndarray):
+        """Fit the monitor (and UMAP) and measure the baseline drift error
+        
+        The baseline is measured on a held-out fifth of the data, since
+        vectors the monitor basis was fitted on are reconstructed better
+        than unseen ones from the same distribution.
+        """
+        n_samples, dimension = embeddings.shape
+        if n_samples < self.n_components:
+            raise ValueError(
+                f"Need at least {self.n_components} samples to fit a reducer, got {n_samples}"
+            )
+        
+        order = self._rng.permutation(n_samples)
+        n_holdout = n_samples // 5
+        if n_samples - n_holdout < self.n_components:
+            n_holdout = 0
+        training = embeddings[order[n_holdout:]]
+        holdout = embeddings[order[:n_holdout]] if n_holdout else training
+        
+        monitor = IncrementalPCA(
+            n_components=max(self.n_components, min(self.monitor_components, len(training), dimension))
+        )
+        monitor.fit(training)
+        baseline_error = float(self._residual_ratio(monitor, holdout).mean())
+        
+        model = None
+        if self.method == "umap":
+            try:
+                import umap
+                model = umap.UMAP(n_components=self.n_components, random_state=self.random_state)
+                model.fit(embeddings)
+            except ImportError:
+                logger.warning("UMAP not installed, falling back to PCA")
+        return monitor, model, baseline_error
+    
+    @staticmethod
+    def _residual_ratio(monitor: IncrementalPCA, embeddings: np.ndarray) -> np.ndarray:
+        """Share of each vector's variance the monitor basis does not explain"""
+        centred = embeddings - monitor.mean_
+        coefficients = centred @ monitor.components_.T
+        residual = (centred ** 2).sum(axis=1) - (coefficients ** 2).sum(axis=1)
+        return np.maximum(residual, 0.0) / ((centred ** 2).sum(axis=1) + 1e-12)
+    
+    @staticmethod
+    def _project(monitor: IncrementalPCA, model, n_components: int, embeddings: np.ndarray) -> np.ndarray:
+        if model is not None:
+            return model.transform(embeddings)
+        return (embeddings - monitor.mean_) @ monitor.components_[:n_components].T
+    
+    def fit(self, embeddings: np.ndarray) -> "FittedReducer":
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        monitor, model, baseline_error = self._fit_models(embeddings)
+        with self._lock:
+            self.monitor, self.model, self.alignment = monitor, model, None
+            self.baseline_error = baseline_error
+            self.recent_error = self.baseline_error
+            self.observed = 0
+            self.generation += 1
+            self.samples = None
+            self.samples_seen = 0
+            self._add_samples(embeddings)
+        return self
+    
+    def _add_samples(self, embeddings: np.ndarray):
+        """Reservoir sample of every vector seen, used for refits"""
+        if self.samples is None:
+            self.samples = np.zeros((0, embeddings.shape[1]), dtype=np.float32)
+        
+        room = self.max_samples - len(self.samples)
+        if room > 0:
+            self.samples = np.vstack([self.samples, embeddings[:room]])
+            self.samples_seen += len(embeddings[:room])
+            embeddings = embeddings[room:]
+        
+        if len(embeddings):
+            # Vector i replaces a random slot with probability max_samples / seen
+            seen = self.samples_seen + np.arange(1, len(embeddings) + 1)
+            slots = self._rng.integers(0, seen)
+            keep = slots < self.max_samples
+            self.samples[slots[keep]] = embeddings[keep]
+            self.samples_seen += len(embeddings)
+    
+    def transform(self, embeddings: np.ndarray, observe: bool = True) -> np.ndarray:
+        """Project new embeddings with the fitted reducer"""
+        if not self.fitted:
+            raise ValueError("Reducer is not fitted")
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        
+        with self._lock:
+            monitor, model, alignment = self.monitor, self.model, self.alignment
+        projected = self._project(monitor, model, self.n_components, embeddings)
+        if alignment is not None:
+            source_mean, rotation, target_mean = alignment
+            projected = (projected - source_mean) @ rotation + target_mean
+        
+        if observe and len(embeddings):
+            batch_error = float(self._residual_ratio(monitor, embeddings).mean())
+            with self._lock:
+                # Moving average over roughly the last min_drift_samples vectors
+                weight = min(1.0, len(embeddings) / self.min_drift_samples)
+                self.recent_error += weight * (batch_error - self.recent_error)
+                self.observed += len(embeddings)
+                self._add_samples(embeddings)
+        return projected
+    
+    @property
+    def drift(self) -> float:
+        """Relative increase of unexplained variance since the last fit"""
+        return self.recent_error / max(self.baseline_error, 1e-12) - 1.0
+    
+    @property
+    def needs_refresh(self) -> bool:
+        return (
+            self.fitted
+            and not self._refreshing
+            and self.observed >= self.min_drift_samples
+            and self.drift > self.drift_threshold
+        )
+    
+    def refresh(self) -> bool:
+        """Refit on the reservoir sample, aligned to the current projection
+        
+        Returns False if a refresh is already running.
+        """
+        with self._lock:
+            if self._refreshing:
+                return False
+            self._refreshing = True
+            samples = self.samples.copy()
+        try:
+            previous = self.transform(samples, observe=False)
+            monitor, model, baseline_error = self._fit_models(samples)
+            current = self._project(monitor, model, self.n_components, samples)
+            
+            # Orthogonal Procrustes (with scale) onto the previous projection
+            source_mean, target_mean = current.mean(axis=0), previous.mean(axis=0)
+            source, target = current - source_mean, previous - target_mean
+            u, s, vt = np.linalg.svd(source.T @ target)
+            scale = s.sum() / max(float((source ** 2).sum()), 1e-12)
+            
+            with self._lock:
+                self.monitor, self.model = monitor, model
+                self.alignment = (source_mean, (u @ vt) * scale, target_mean)
+                self.baseline_error = baseline_error
+                self.recent_error = self.baseline_error
+                self.observed = 0
+                self.generation += 1
+            logger.info(f"Refreshed {self.method} reducer on {len(samples)} samples")
+            return True
+        finally:
+            self._refreshing = False
+    
+    def save(self, path: Union[str, Path]):
+        with self._lock:
+            joblib.dump(self, str(path))
+    
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "FittedReducer":
+        return joblib.load(str(path))
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_lock", None)
+        state["_refreshing"] = False
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
\ No newline at end of file
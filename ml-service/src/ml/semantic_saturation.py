@@ -3,24 +3,32 @@ Semantic Saturation Controller
 Main orchestrator for the semantic analysis and optimization pipeline
 """
 
+import os
 import asyncio
 import logging
-from typing import List, Dict, Any, Optional, Tuple
-from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
+from dataclasses import dataclass, asdict
 import numpy as np
 from datetime import datetime
 import json
 
 from .model_manager import get_model_manager
 from .embedding_pipeline import EmbeddingPipeline, EmbeddingConfig
+from .embedding_codec import EmbeddingCodec, decode_embeddings, read_header
 from .similarity_engine import SimilarityEngine, SimilarityConfig
 from .content_mesh import ContentMesh, ContentNode, MeshConfig
 from .gap_analysis import GapAnalysisEngine, GapAnalysisConfig
 from .visualization import VisualizationEngine, VisualizationConfig
+from .threejs_binary import MEDIA_TYPE as THREEJS_MEDIA_TYPE
 from .optimization_engine import OptimizationEngine, OptimizationConfig
+from .stage_executor import Stage, StageExecutor
+from .item_cache import ItemResultCache
 
 logger = logging.getLogger(__name__)
 
+# Stage values passed between stages but not streamed or returned
+INTERNAL_STAGES = {"mesh"}
+
 
 @dataclass
 class SemanticAnalysisRequest:
@@ -31,6 +39,7 @@ class SemanticAnalysisRequest:
     competitor_content: Optional[List[Dict[str, Any]]] = None
     optimization_goals: List[str] = None
     analysis_config: Optional[Dict[str, Any]] = None
+    tenant_id: str = "default"
 
 
 @dataclass
@@ -44,6 +53,7 @@ class SemanticAnalysisResult:
     visualizations: Dict[str, Any]
     metrics: Dict[str, float]
     processing_time: float
+    embeddings: Optional[np.ndarray] = None  # One row per content item
 
 
 class SemanticSaturationController:
@@ -58,10 +68,25 @@ class SemanticSaturationController:
         # Component instances
         self.embedding_pipeline = None
         self.similarity_engine = None
-        self.content_mesh = None
         self.gap_analysis_engine = None
         self.visualization_engine = None
         self.optimization_engine = None
+        self.item_cache = None
+        
+        # Storage format for embeddings persisted with analysis results
+        self.result_codec = EmbeddingCodec.from_env(
+            "RESULT_EMBEDDING_CODEC", "int8", "RESULT_EMBEDDING_PQ_PATH"
+        )
+        
+        # json, binary or both; binary payloads are kept in Redis and served
+        # separately (with range requests) instead of inline
+        self.threejs_format = os.getenv("THREEJS_FORMAT", "both")
+        
+        # Runs independent analysis stages concurrently; CPU-heavy work is
+        # bounded to its worker pool
+        self.stage_executor = StageExecutor(
+            max_workers=int(os.getenv("ANALYSIS_WORKERS", "4"))
+        )
     
     async def initialize(self):
         """Initialize all components"""
@@ -79,24 +104,103 @@ class SemanticSaturationController:
             self.redis_client
         )
         
-        self.similarity_engine = SimilarityEngine()
+        # SIMILARITY_SHARDS > 0 spreads indices over that many worker processes
+        self.similarity_engine = SimilarityEngine(
+            n_shards=int(os.getenv("SIMILARITY_SHARDS", "0"))
+        )
+        
+        # Warm start from persisted (memory-mapped) indices
+        loaded_indices = await self.similarity_engine.load_saved_indices()
+        if loaded_indices:
+            logger.info(f"Loaded {len(loaded_indices)} persisted similarity indices")
         
         self.gap_analysis_engine = GapAnalysisEngine(
             self.model_manager,
-            self.similarity_engine
+            self.similarity_engine,
+            topic_model_dir=os.getenv("TOPIC_MODEL_DIR")
         )
         
         self.visualization_engine = VisualizationEngine()
         
+        # Per-item results keyed by content hash, reused across requests
+        self.item_cache = ItemResultCache(self.redis_client)
+        
         self.optimization_engine = OptimizationEngine(
             self.model_manager,
             self.similarity_engine,
-            self.gap_analysis_engine
+            self.gap_analysis_engine,
+            result_cache=self.item_cache,
+            term_stats_dir=os.getenv("TERM_STATS_DIR")
         )
         
         self.components_initialized = True
         logger.info("Semantic Saturation Controller initialized successfully")
     
+    def _analysis_stages(self, request: SemanticAnalysisRequest, request_id: str) -> List[Stage]:
+        """Analysis steps and their data dependencies
+        
+        Gap analysis and optimization suggestions only need the raw content,
+        so they run alongside embeddings and mesh building. The mesh itself
+        is handed to the visualizations stage as the ``mesh`` stage value,
+        which is internal and not part of the result.
+        """
+        # Filled by the per-item stages, reported by the metrics stage
+        cache_stats: Dict[str, Dict[str, int]] = {}
+        
+        return [
+            Stage(
+                "embeddings",
+                lambda: self._generate_content_embeddings(request.content_items, cache_stats)
+            ),
+            Stage(
+                "mesh",
+                lambda embeddings: self._build_content_mesh(
+                    request.content_items, embeddings, request.tenant_id
+                ),
+                ["embeddings"]
+            ),
+            Stage(
+                "content_mesh",
+                lambda mesh: self._summarize_content_mesh(mesh),
+                ["mesh"]
+            ),
+            Stage(
+                "semantic_gaps",
+                lambda: self._analyze_gaps(
+                    request.content_items,
+                    request.reference_topics,
+                    request.competitor_content,
+                    request.tenant_id
+                )
+            ),
+            Stage(
+                "optimization_suggestions",
+                lambda: self._generate_optimizations(
+                    request.content_items,
+                    request.target_keywords,
+                    request.competitor_content,
+                    cache_stats,
+                    request.tenant_id
+                )
+            ),
+            Stage(
+                "visualizations",
+                lambda mesh, semantic_gaps, embeddings: self._create_visualizations(
+                    mesh, semantic_gaps, embeddings,
+                    layout_key=request.tenant_id,
+                    request_id=request_id
+                ),
+                ["mesh", "semantic_gaps", "embeddings"]
+            ),
+            Stage(
+                "metrics",
+                lambda content_mesh, semantic_gaps, optimization_suggestions: self._calculate_metrics(
+                    content_mesh, semantic_gaps, optimization_suggestions, cache_stats
+                ),
+                ["content_mesh", "semantic_gaps", "optimization_suggestions"]
+            )
+        ]
+    
     async def analyze_content(
         self,
         request: SemanticAnalysisRequest
@@ -111,77 +215,104 @@ class SemanticSaturationController:
         logger.info(f"Starting semantic analysis for request {request_id}")
         
         try:
-            # Step 1: Generate embeddings for all content
-            embeddings = await self._generate_content_embeddings(request.content_items)
-            
-            # Step 2: Build content mesh
-            content_mesh_data = await self._build_content_mesh(
-                request.content_items,
-                embeddings
-            )
-            
-            # Step 3: Analyze semantic gaps
-            semantic_gaps = await self._analyze_gaps(
-                request.content_items,
-                request.reference_topics,
-                request.competitor_content
-            )
-            
-            # Step 4: Generate optimization suggestions
-            optimization_suggestions = await self._generate_optimizations(
-                request.content_items,
-                request.target_keywords,
-                request.competitor_content
-            )
-            
-            # Step 5: Create visualizations
-            visualizations = await self._create_visualizations(
-                content_mesh_data,
-                semantic_gaps,
-                embeddings
-            )
-            
-            # Step 6: Calculate metrics
-            metrics = self._calculate_metrics(
-                content_mesh_data,
-                semantic_gaps,
-                optimization_suggestions
-            )
-            
-            # Calculate processing time
-            processing_time = (datetime.utcnow() - start_time).total_seconds()
-            
-            # Create result
-            result = SemanticAnalysisResult(
-                request_id=request_id,
-                timestamp=start_time,
-                content_mesh=content_mesh_data,
-                semantic_gaps=semantic_gaps,
-                optimization_suggestions=optimization_suggestions,
-                visualizations=visualizations,
-                metrics=metrics,
-                processing_time=processing_time
-            )
-            
-            # Cache result if Redis available
-            if self.redis_client:
-                await self._cache_result(result)
-            
-            # Store in MongoDB if available
-            if self.mongodb_client:
-                await self._store_result(result)
+            outputs = {}
+            async for stage_result in self.stage_executor.run(self._analysis_stages(request, request_id)):
+                outputs[stage_result.name] = stage_result.value
             
-            logger.info(f"Semantic analysis completed for request {request_id} in {processing_time:.2f}s")
-            
-            return result
+            return await self._finalize_result(request_id, start_time, outputs)
             
         except Exception as e:
             logger.error(f"Error in semantic analysis: {e}")
             raise
     
+    async def analyze_content_stream(
+        self,
+        request: SemanticAnalysisRequest
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Perform semantic analysis, yielding each stage's output when ready
+        
+        Yields ``{"event": "stage", ...}`` per stage, then a final
+        ``{"event": "complete", ...}`` (or ``{"event": "error", ...}``).
+        """
+        start_time = datetime.utcnow()
+        request_id = f"sem_{start_time.timestamp()}"
+        
+        await self.initialize()
+        
+        logger.info(f"Starting streamed semantic analysis for request {request_id}")
+        
+        outputs = {}
+        try:
+            async for stage_result in self.stage_executor.run(self._analysis_stages(request, request_id)):
+                outputs[stage_result.name] = stage_result.value
+                if stage_result.name in INTERNAL_STAGES:
+                    continue
+                
+                data = stage_result.value
+                if stage_result.name == "embeddings":
+                    # Too large to stream; clients fetch them with the result
+                    data = {"count": len(data), "dimensions": int(data.shape[1]) if len(data) else 0}
+                
+                yield {
+                    "event": "stage",
+                    "request_id": request_id,
+                    "stage": stage_result.name,
+                    "duration": stage_result.duration,
+                    "elapsed": stage_result.elapsed,
+                    "data": data
+                }
+            
+            result = await self._finalize_result(request_id, start_time, outputs)
+        except Exception as e:
+            logger.error(f"Error in semantic analysis: {e}")
+            yield {"event": "error", "request_id": request_id, "error": str(e)}
+            return
+        
+        yield {
+            "event": "complete",
+            "request_id": request_id,
+            "processing_time": result.processing_time
+        }
+    
+    async def _finalize_result(
+        self,
+        request_id: str,
+        start_time: datetime,
+        outputs: Dict[str, Any]
+    ) -> SemanticAnalysisResult:
+        """Assemble, cache and store the result of a finished analysis"""
+        # Calculate processing time
+        processing_time = (datetime.utcnow() - start_time).total_seconds()
+        
+        # Create result
+        result = SemanticAnalysisResult(
+            request_id=request_id,
+            timestamp=start_time,
+            content_mesh=outputs["content_mesh"],
+            semantic_gaps=outputs["semantic_gaps"],
+            optimization_suggestions=outputs["optimization_suggestions"],
+            visualizations=outputs["visualizations"],
+            metrics=outputs["metrics"],
+            processing_time=processing_time,
+            embeddings=outputs["embeddings"]
+        )
+        
+        # Cache result if Redis available
+        if self.redis_client:
+            await self._cache_result(result)
+        
+        # Store in MongoDB if available
+        if self.mongodb_client:
+            await self._store_result(result)
+        
+        logger.info(f"Semantic analysis completed for request {request_id} in {processing_time:.2f}s")
+        
+        return result
+    
     async def _generate_content_embeddings(
         self,
-        content_items: List[Dict[str, Any]]
+        content_items: List[Dict[str, Any]],
+        cache_stats: Optional[Dict[str, Dict[str, int]]] = None
     ) -> np.ndarray:
         """Generate embeddings for all content items"""
         logger.info(f"Generating embeddings for {len(content_items)} items")
@@ -198,17 +329,21 @@ class SemanticSaturationController:
             cache_embeddings=True
         )
         
-        # Generate embeddings
-        embeddings = await self.embedding_pipeline.generate_embeddings(texts, config)
+        # Generate embeddings; unchanged items come from the embedding cache
+        stats = {}
+        embeddings = await self.embedding_pipeline.generate_embeddings(texts, config, stats=stats)
+        if cache_stats is not None:
+            cache_stats["embeddings"] = stats
         
         return np.array(embeddings)
     
     async def _build_content_mesh(
         self,
         content_items: List[Dict[str, Any]],
-        embeddings: np.ndarray
-    ) -> Dict[str, Any]:
-        """Build content mesh from items and embeddings"""
+        embeddings: np.ndarray,
+        tenant_id: str = "default"
+    ) -> ContentMesh:
+        """Build this request's content mesh from items and embeddings"""
         logger.info("Building content mesh")
         
         # Create content nodes
@@ -233,24 +368,31 @@ class SemanticSaturationController:
             use_community_detection=True
         )
         
-        # Build mesh
-        self.content_mesh = ContentMesh(self.similarity_engine)
-        await self.content_mesh.build_mesh(nodes, mesh_config)
+        # Build mesh, indexed in the tenant's namespace
+        content_mesh = ContentMesh(
+            self.similarity_engine,
+            self.similarity_engine.tenant_index_name(tenant_id, "content_mesh")
+        )
+        await content_mesh.build_mesh(nodes, mesh_config)
         
+        return content_mesh
+    
+    def _summarize_content_mesh(self, content_mesh: ContentMesh) -> Dict[str, Any]:
+        """Statistics, gaps and graph export of a built content mesh"""
         # Get mesh statistics
-        stats = self.content_mesh.get_mesh_statistics()
+        stats = content_mesh.get_mesh_statistics()
         
         # Find content gaps in mesh
-        gaps = self.content_mesh.find_content_gaps()
+        gaps = content_mesh.find_content_gaps()
         
         # Export mesh data
         mesh_data = {
-            "nodes": len(nodes),
+            "nodes": stats["num_nodes"],
             "edges": stats["num_edges"],
             "communities": stats["num_communities"],
             "density": stats["density"],
             "gaps": gaps,
-            "graph_data": json.loads(self.content_mesh.export_mesh("json"))
+            "graph_data": json.loads(content_mesh.export_mesh("json"))
         }
         
         return mesh_data
@@ -259,7 +401,8 @@ class SemanticSaturationController:
         self,
         content_items: List[Dict[str, Any]],
         reference_topics: Optional[List[str]],
-        competitor_content: Optional[List[Dict[str, Any]]]
+        competitor_content: Optional[List[Dict[str, Any]]],
+        tenant_id: str = "default"
     ) -> List[Dict[str, Any]]:
         """Analyze semantic gaps"""
         logger.info("Analyzing semantic gaps")
@@ -278,7 +421,8 @@ class SemanticSaturationController:
             content_items,
             reference_topics,
             competitor_content,
-            config
+            config,
+            tenant_id
         )
         
         # Prioritize gaps
@@ -306,9 +450,17 @@ class SemanticSaturationController:
         self,
         content_items: List[Dict[str, Any]],
         target_keywords: List[str],
-        competitor_content: Optional[List[Dict[str, Any]]]
+        competitor_content: Optional[List[Dict[str, Any]]],
+        cache_stats: Optional[Dict[str, Dict[str, int]]] = None,
+        tenant_id: str = "default"
     ) -> List[Dict[str, Any]]:
-        """Generate optimization suggestions"""
+        """Generate optimization suggestions
+        
+        Suggestions are cached per item, keyed by the item's content and
+        every input they depend on, so only new or edited items are analysed.
+        All submitted content first updates the tenant's corpus term
+        statistics, whose LSI model generation is part of the key.
+        """
         logger.info("Generating optimization suggestions")
         
         optimization_data = []
@@ -320,29 +472,50 @@ class SemanticSaturationController:
             engagement_factors=["questions", "examples", "visuals", "cta"]
         )
         
-        # Generate optimizations for each content item
-        for item in content_items[:5]:  # Limit to first 5 for performance
-            content = item.get("content", "")
-            metadata = item.get("metadata", {})
-            
-            # Extract competitor content texts if available
-            comp_texts = None
-            if competitor_content:
-                comp_texts = [c.get("content", "") for c in competitor_content[:3]]
-            
+        items = content_items[:5]  # Limit to first 5 for performance
+        
+        # Extract competitor content texts if available
+        comp_texts = None
+        if competitor_content:
+            comp_texts = [c.get("content", "") for c in competitor_content[:3]]
+        
+        corpus_texts = [item.get("content", "") for item in content_items]
+        if competitor_content:
+            corpus_texts.extend(c.get("content", "") for c in competitor_content)
+        await self.optimization_engine.update_term_statistics(
+            tenant_id, [text for text in corpus_texts if text]
+        )
+        lsi_generation = self.optimization_engine.get_term_statistics(tenant_id).generation
+        
+        keys = [
+            self.item_cache.make_key(
+                "optimizations",
+                item.get("content", ""),
+                item.get("metadata", {}),
+                target_keywords,
+                comp_texts,
+                asdict(config),
+                tenant_id,
+                lsi_generation
+            )
+            for item in items
+        ]
+        cached = await self.item_cache.get_many(keys)
+        
+        async def optimize(item: Dict[str, Any]) -> List[Dict[str, Any]]:
             # Generate suggestions
             suggestions = await self.optimization_engine.generate_optimizations(
-                content,
-                metadata,
+                item.get("content", ""),
+                item.get("metadata", {}),
                 target_keywords,
                 comp_texts,
-                config
+                config,
+                tenant_id
             )
             
             # Convert to serializable format
-            for suggestion in suggestions[:10]:  # Limit suggestions per item
-                optimization_data.append({
-                    "content_id": item.get("id", "unknown"),
+            return [
+                {
                     "suggestion_id": suggestion.suggestion_id,
                     "category": suggestion.category,
                     "priority": suggestion.priority,
@@ -350,15 +523,95 @@ class SemanticSaturationController:
                     "implementation": suggestion.implementation,
                     "expected_impact": suggestion.expected_impact,
                     "confidence": suggestion.confidence
+                }
+                for suggestion in suggestions[:10]  # Limit suggestions per item
+            ]
+        
+        missing = [i for i, entry in enumerate(cached) if entry is None]
+        computed = await asyncio.gather(*[optimize(items[i]) for i in missing])
+        for i, entry in zip(missing, computed):
+            cached[i] = entry
+        await self.item_cache.set_many({keys[i]: cached[i] for i in missing})
+        
+        for item, entry in zip(items, cached):
+            for suggestion_data in entry:
+                optimization_data.append({
+                    "content_id": item.get("id", "unknown"),
+                    **suggestion_data
                 })
         
+        if cache_stats is not None:
+            cache_stats["optimizations"] = {
+                "requested": len(items),
+                "cache_hits": len(items) - len(missing)
+            }
+        
         return optimization_data
     
     async def _create_visualizations(
         self,
-        content_mesh_data: Dict[str, Any],
+        content_mesh: Optional[ContentMesh],
+        semantic_gaps: List[Dict[str, Any]],
+        embeddings: np.ndarray,
+        layout_key: Optional[str] = None,
+        request_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Create visualizations on the stage worker pool
+        
+        A binary Three.js payload is stored for ranged download and replaced
+        by a reference to it.
+        """
+        visualizations = await self.stage_executor.run_cpu(
+            self._render_visualizations,
+            content_mesh,
+            semantic_gaps,
+            embeddings,
+            layout_key
+        )
+        
+        network = visualizations.get("network_3d", {})
+        payload = network.pop("threejs_binary", None)
+        if payload is not None and request_id and await self._store_network_binary(request_id, payload):
+            network["threejs_binary"] = {
+                "url": f"/semantic-analysis/{request_id}/network",
+                "media_type": THREEJS_MEDIA_TYPE,
+                "bytes": len(payload)
+            }
+        return visualizations
+    
+    async def _store_network_binary(self, request_id: str, payload: bytes) -> bool:
+        """Keep a binary Three.js payload in Redis alongside the cached result"""
+        if not self.redis_client:
+            return False
+        try:
+            await self.redis_client.setex(
+                f"semantic_analysis:{request_id}:network",
+                3600 * 24,  # Same lifetime as the cached result
+                payload
+            )
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to store network payload: {e}")
+            return False
+    
+    async def network_binary_size(self, request_id: str) -> int:
+        """Size in bytes of a stored binary Three.js payload (0 if missing)"""
+        if not self.redis_client:
+            return 0
+        return await self.redis_client.strlen(f"semantic_analysis:{request_id}:network")
+    
+    async def read_network_binary(self, request_id: str, start: int, end: int) -> bytes:
+        """Bytes ``start`` through ``end`` (inclusive) of a stored payload"""
+        return await self.redis_client.getrange(
+            f"semantic_analysis:{request_id}:network", start, end
+        )
+    
+    def _render_visualizations(
+        self,
+        content_mesh: Optional[ContentMesh],
         semantic_gaps: List[Dict[str, Any]],
-        embeddings: np.ndarray
+        embeddings: np.ndarray,
+        layout_key: Optional[str] = None
     ) -> Dict[str, Any]:
         """Create visualizations"""
         logger.info("Creating visualizations")
@@ -371,20 +624,24 @@ class SemanticSaturationController:
             node_size_metric="pagerank",
             color_by="community",
             dimensions=3,
-            show_labels=True
+            show_labels=True,
+            threejs_format=self.threejs_format
         )
         
         # Create 3D network visualization
-        if self.content_mesh:
+        if content_mesh is not None:
             network_viz = self.visualization_engine.generate_3d_network(
-                self.content_mesh,
-                config
+                content_mesh,
+                config,
+                layout_key=layout_key
             )
             
             visualizations["network_3d"] = {
-                "plotly_html": network_viz["plotly_figure"].to_html(div_id="network_3d"),
-                "threejs_data": network_viz["threejs_data"]
+                "plotly_html": network_viz["plotly_figure"].to_html(div_id="network_3d")
             }
+            for key in ("threejs_data", "threejs_binary"):
+                if key in network_viz:
+                    visualizations["network_3d"][key] = network_viz[key]
         
         # Create gap visualization
         if semantic_gaps:
@@ -396,8 +653,18 @@ class SemanticSaturationController:
         
         # Create embedding visualization
         if len(embeddings) > 0:
-            embedding_viz = self.visualization_engine.generate_embedding_visualization(
+            # Project with the reducer fitted for the mesh index instead of
+            # refitting PCA on every request
+            reduced = self.similarity_engine.reduce_dimensions(
                 embeddings[:100],  # Limit for performance
+                n_components=3,
+                method="pca",
+                index_name=self.similarity_engine.tenant_index_name(
+                    layout_key or "default", "content_mesh"
+                )
+            )
+            embedding_viz = self.visualization_engine.generate_embedding_visualization(
+                reduced,
                 method="pca"
             )
             
@@ -409,7 +676,8 @@ class SemanticSaturationController:
         self,
         content_mesh_data: Dict[str, Any],
         semantic_gaps: List[Dict[str, Any]],
-        optimization_suggestions: List[Dict[str, Any]]
+        optimization_suggestions: List[Dict[str, Any]],
+        cache_stats: Optional[Dict[str, Dict[str, int]]] = None
     ) -> Dict[str, float]:
         """Calculate analysis metrics"""
         metrics = {}
@@ -448,6 +716,17 @@ class SemanticSaturationController:
             metrics["total_optimizations"] = 0
             metrics["avg_expected_impact"] = 0
         
+        # Per-item cache reuse
+        if cache_stats:
+            requested = hits = 0
+            for stage, stats in cache_stats.items():
+                stage_requested = stats.get("requested", 0)
+                stage_hits = stats.get("cache_hits", 0)
+                metrics[f"{stage}_cache_hit_ratio"] = stage_hits / stage_requested if stage_requested else 0.0
+                requested += stage_requested
+                hits += stage_hits
+            metrics["item_reuse_ratio"] = hits / requested if requested else 0.0
+        
         # Overall health score
         metrics["semantic_health_score"] = self._calculate_health_score(metrics)
         
@@ -508,39 +787,78 @@ class SemanticSaturationController:
                 "metrics": result.metrics,
                 "processing_time": result.processing_time
             }
+            if result.embeddings is not None and len(result.embeddings) > 0:
+                # Compact binary payload instead of nested float lists
+                document["embeddings"] = self.result_codec.encode(result.embeddings)
             
             await self.mongodb_client.semantic_analysis.insert_one(document)
         except Exception as e:
             logger.warning(f"Failed to store result: {e}")
     
-    async def get_analysis_result(self, request_id: str) -> Optional[Dict[str, Any]]:
-        """Retrieve analysis result by ID"""
+    async def get_analysis_result(
+        self,
+        request_id: str,
+        include_embeddings: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """Retrieve analysis result by ID
+        
+        Stored embeddings are decoded to lists only when requested; otherwise
+        just their codec, count and dimension are reported. The cached
+        summary carries no embeddings, so it is skipped when they are
+        requested. Raises ValueError if stored embeddings cannot be decoded.
+        """
         # Try cache first
-        if self.redis_client:
+        if self.redis_client and not include_embeddings:
             try:
                 cached = await self.redis_client.get(f"semantic_analysis:{request_id}")
                 if cached:
                     return json.loads(cached)
-            except:
-                pass
+            except Exception as e:
+                logger.warning(f"Failed to read cached result: {e}")
         
         # Try MongoDB
-        if self.mongodb_client:
-            try:
-                result = await self.mongodb_client.semantic_analysis.find_one({"_id": request_id})
-                if result:
-                    result["request_id"] = result.pop("_id")
-                    return result
-            except:
-                pass
-        
-        return None
+        if not self.mongodb_client:
+            return None
+        try:
+            result = await self.mongodb_client.semantic_analysis.find_one({"_id": request_id})
+        except Exception as e:
+            logger.warning(f"Failed to retrieve result: {e}")
+            return None
+        if not result:
+            return None
+        
+        result["request_id"] = result.pop("_id")
+        payload = result.pop("embeddings", None)
+        if payload is not None:
+            header = read_header(payload)
+            result["embedding_info"] = {
+                key: header[key] for key in ("codec", "count", "dimension")
+            }
+            if include_embeddings:
+                result["embeddings"] = decode_embeddings(
+                    payload, self.result_codec.product_quantizer
+                ).tolist()
+        return result
+    
+    async def save_indices(self):
+        """Persist similarity indices changed since they were last saved
+        
+        Run at shutdown, before ``cleanup``, so that the next start warm
+        starts from them.
+        """
+        if self.similarity_engine:
+            await self.similarity_engine.save_dirty_indices()
     
     def cleanup(self):
         """Clean up resources"""
+        if self.gap_analysis_engine:
+            self.gap_analysis_engine.flush_topic_models()
+        if self.optimization_engine:
+            self.optimization_engine.flush_term_statistics()
         if self.model_manager:
             self.model_manager.cleanup()
         if self.similarity_engine:
             self.similarity_engine.cleanup()
+        self.stage_executor.shutdown()
         
         logger.info("Semantic Saturation Controller cleaned up")
\ No newline at end of file
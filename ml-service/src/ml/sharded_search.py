@@ -0,0 +1,460 @@
+"""
+Sharded Similarity Search
+Similarity indices partitioned across worker processes, searched scatter-gather
+"""
+
+import os
+import re
+import asyncio
+import hashlib
+import inspect
+import logging
+import multiprocessing
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace, fields
+from typing import List, Dict, Any, Tuple, Optional
+import numpy as np
+
+from .index_store import IndexStore
+from .similarity_engine import SimilarityConfig, SearchResult, FAISS_INDEX_TYPES
+
+logger = logging.getLogger(__name__)
+
+
+_PARTITION_PATTERN = re.compile(r"^(?P<base>.+)\.part(?P<part>\d+)of(?P<total>\d+)$")
+
+
+def partition_name(index_name: str, partition: int, partitions: int) -> str:
+    """Name a partition is held and persisted under on its shard
+    
+    Unpartitioned indices keep their own name, so their saved layout is the
+    same as in unsharded mode.
+    """
+    if partitions == 1:
+        return index_name
+    return f"{index_name}.part{partition}of{partitions}"
+
+
+# State of a shard worker process, set up by _init_shard
+_shard_engine = None
+_shard_loop = None
+
+
+def _init_shard(index_dir: str, omp_threads: int):
+    global _shard_engine, _shard_loop
+    import faiss
+    from .similarity_engine import SimilarityEngine
+    
+    # Split the cores between shards instead of every shard using all of them
+    faiss.omp_set_num_threads(omp_threads)
+    _shard_engine = SimilarityEngine(index_dir)
+    _shard_loop = asyncio.new_event_loop()
+
+
+def _shard_call(method: str, *args) -> Any:
+    """Call a SimilarityEngine method in the shard, awaiting it if needed"""
+    result = getattr(_shard_engine, method)(*args)
+    if inspect.isawaitable(result):
+        result = _shard_loop.run_until_complete(result)
+    return result
+
+
+def _read_shared(shared: Tuple[str, Tuple[int, ...], str], rows: np.ndarray) -> np.ndarray:
+    """Copy the given rows out of a shared-memory vector block"""
+    name, shape, dtype = shared
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        vectors = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        subset = vectors[rows]
+        del vectors
+        return subset
+    finally:
+        block.close()
+
+
+def _shard_build(
+    name: str,
+    shared: Tuple[str, Tuple[int, ...], str],
+    rows: np.ndarray,
+    ids: np.ndarray,
+    config: SimilarityConfig,
+    metadata: Optional[List[Dict[str, Any]]]
+) -> int:
+    vectors = _read_shared(shared, rows)
+    _shard_loop.run_until_complete(_shard_engine.build_index(vectors, name, config, metadata, ids=ids))
+    return len(ids)
+
+
+def _shard_add(
+    name: str,
+    shared: Tuple[str, Tuple[int, ...], str],
+    rows: np.ndarray,
+    ids: np.ndarray,
+    metadata: Optional[List[Dict[str, Any]]]
+) -> int:
+    vectors = _read_shared(shared, rows)
+    _shard_loop.run_until_complete(_shard_engine.add_vectors(vectors, name, ids, metadata))
+    return len(ids)
+
+
+def _shard_drop(name: str):
+    _shard_engine.indices.pop(name, None)
+    _shard_engine.metadata_store.pop(name, None)
+    _shard_engine.evicted.pop(name, None)
+
+
+def _merge_top_k(result_lists: List[List[SearchResult]], k: int) -> List[SearchResult]:
+    merged = [result for results in result_lists for result in results]
+    merged.sort(key=lambda result: result.score, reverse=True)
+    return merged[:k]
+
+
+def _shard_search(names: List[str], queries: np.ndarray, k: int) -> List[List[SearchResult]]:
+    """Search every partition this shard holds for an index, merged locally"""
+    per_partition = [
+        _shard_loop.run_until_complete(_shard_engine.batch_search(queries, name, k))
+        for name in names
+    ]
+    return [
+        _merge_top_k([results[row] for results in per_partition], k)
+        for row in range(len(queries))
+    ]
+
+
+class ShardedSearchPool:
+    """Similarity indices partitioned across worker processes
+    
+    Each shard is one worker process running its own ``SimilarityEngine``,
+    so searching and building results scale past a single interpreter. An
+    index is split into ``partitions`` by id (``id % partitions``), one per
+    shard at most: small indices stay whole on the shard their name hashes
+    to, which spreads tenants over the shards, while indices larger than
+    ``shard_partition_size`` are spread over several shards. Partition ``p``
+    of an index lives on shard ``(hash(name) + p) % n_shards``.
+    
+    Searches scatter to the shards holding an index and merge their top-k.
+    Vectors reach the shards through one shared-memory block per batch
+    rather than per-shard copies, and indices loaded from the index store
+    are memory-mapped, so shards share the page cache instead of RAM.
+    """
+    
+    def __init__(self, n_shards: int, index_dir: str, omp_threads: Optional[int] = None):
+        if n_shards < 1:
+            raise ValueError(f"Need at least one shard, got {n_shards}")
+        if omp_threads is None:
+            omp_threads = max(1, (os.cpu_count() or 1) // n_shards)
+        
+        context = multiprocessing.get_context("spawn")
+        self.n_shards = n_shards
+        self.shards = [
+            ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=context,
+                initializer=_init_shard,
+                initargs=(index_dir, omp_threads)
+            )
+            for _ in range(n_shards)
+        ]
+        self.index_store = IndexStore(index_dir)
+        self.indices: Dict[str, Dict[str, Any]] = {}
+        logger.info(f"Sharded similarity search with {n_shards} shards, {omp_threads} threads each")
+    
+    def _owner(self, index_name: str, partition: int) -> int:
+        name_hash = int(hashlib.sha1(index_name.encode()).hexdigest()[:8], 16)
+        return (name_hash + partition) % self.n_shards
+    
+    async def _call(self, shard: int, fn, *args) -> Any:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.shards[shard], fn, *args)
+    
+    def _require(self, index_name: str) -> Dict[str, Any]:
+        if index_name not in self.indices:
+            raise ValueError(f"Index '{index_name}' not found")
+        return self.indices[index_name]
+    
+    @contextmanager
+    def _shared_vectors(self, vectors: np.ndarray):
+        """Place vectors in a shared-memory block for the shards to read"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        block = shared_memory.SharedMemory(create=True, size=max(vectors.nbytes, 1))
+        try:
+            view = np.ndarray(vectors.shape, dtype=vectors.dtype, buffer=block.buf)
+            view[:] = vectors
+            del view
+            yield (block.name, vectors.shape, vectors.dtype.str)
+        finally:
+            block.close()
+            block.unlink()
+    
+    def _partition_count(self, n_vectors: int, config: SimilarityConfig) -> int:
+        if config.index_type not in FAISS_INDEX_TYPES:
+            # Annoy ids index a dense array, so an Annoy index stays whole
+            return 1
+        size = max(1, config.shard_partition_size)
+        return int(min(self.n_shards, max(1, -(-n_vectors // size))))
+    
+    async def _drop_partitions(self, index_name: str):
+        index_info = self.indices.pop(index_name, None)
+        if index_info is None:
+            return
+        partitions = index_info["partitions"]
+        await asyncio.gather(*[
+            self._call(self._owner(index_name, p), _shard_drop, partition_name(index_name, p, partitions))
+            for p in range(partitions)
+        ])
+    
+    async def build_index(
+        self,
+        embeddings: np.ndarray,
+        index_name: str,
+        config: Optional[SimilarityConfig] = None,
+        metadata: Optional[List[Dict[str, Any]]] = None,
+        ids: Optional[np.ndarray] = None
+    ):
+        """Build an index, partitioned by id across the shards"""
+        config = SimilarityConfig() if config is None else replace(config)
+        if config.index_type != "annoy" and config.index_type not in FAISS_INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {config.index_type}")
+        
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        ids = np.arange(len(embeddings), dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+        if len(ids) != len(embeddings):
+            raise ValueError("Number of ids does not match number of vectors")
+        
+        partitions = self._partition_count(len(embeddings), config)
+        previous = self.indices.get(index_name)
+        if previous is not None and previous["partitions"] != partitions:
+            await self._drop_partitions(index_name)
+        
+        assignment = ids % partitions
+        with self._shared_vectors(embeddings) as shared:
+            calls = []
+            for p in range(partitions):
+                rows = np.flatnonzero(assignment == p)
+                part_metadata = [metadata[i] for i in rows] if metadata else None
+                calls.append(self._call(
+                    self._owner(index_name, p), _shard_build,
+                    partition_name(index_name, p, partitions),
+                    shared, rows, ids[rows], config, part_metadata
+                ))
+            await asyncio.gather(*calls)
+        
+        self.indices[index_name] = {
+            "config": config,
+            "dimension": embeddings.shape[1],
+            "partitions": partitions,
+            "size": len(embeddings),
+            "next_id": int(ids.max()) + 1 if len(ids) else 0
+        }
+        logger.info(
+            f"Built sharded {config.index_type} index '{index_name}' with {len(embeddings)} vectors "
+            f"in {partitions} partitions"
+        )
+    
+    async def add_vectors(
+        self,
+        embeddings: np.ndarray,
+        index_name: str,
+        ids: Optional[np.ndarray] = None,
+        metadata: Optional[List[Dict[str, Any]]] = None
+    ) -> np.ndarray:
+        """Add vectors to the partitions their ids hash to"""
+        index_info = self._require(index_name)
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, index_info["dimension"])
+        
+        if ids is None:
+            start = index_info["next_id"]
+            ids = np.arange(start, start + len(embeddings), dtype=np.int64)
+        else:
+            ids = np.asarray(ids, dtype=np.int64)
+            if len(ids) != len(embeddings):
+                raise ValueError("Number of ids does not match number of vectors")
+        if len(ids) == 0:
+            return ids
+        
+        partitions = index_info["partitions"]
+        assignment = ids % partitions
+        with self._shared_vectors(embeddings) as shared:
+            calls = []
+            for p in np.unique(assignment).tolist():
+                rows = np.flatnonzero(assignment == p)
+                part_metadata = [metadata[i] for i in rows] if metadata else None
+                calls.append(self._call(
+                    self._owner(index_name, p), _shard_add,
+                    partition_name(index_name, p, partitions),
+                    shared, rows, ids[rows], part_metadata
+                ))
+            await asyncio.gather(*calls)
+        
+        index_info["next_id"] = max(index_info["next_id"], int(ids.max()) + 1)
+        index_info["size"] += len(ids)
+        return ids
+    
+    async def remove_ids(self, ids: np.ndarray, index_name: str) -> int:
+        """Remove ids from the partitions holding them"""
+        index_info = self._require(index_name)
+        ids = np.asarray(ids, dtype=np.int64)
+        partitions = index_info["partitions"]
+        assignment = ids % partitions
+        
+        removed = await asyncio.gather(*[
+            self._call(
+                self._owner(index_name, p), _shard_call, "remove_ids",
+                ids[assignment == p], partition_name(index_name, p, partitions)
+            )
+            for p in np.unique(assignment).tolist()
+        ])
+        index_info["size"] -= int(sum(removed))
+        return int(sum(removed))
+    
+    async def batch_search(
+        self,
+        query_embeddings: np.ndarray,
+        index_name: str,
+        k: Optional[int] = None
+    ) -> List[List[SearchResult]]:
+        """Scatter queries to the shards holding the index, gather the top-k"""
+        index_info = self._require(index_name)
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, index_info["dimension"])
+        if k is None:
+            k = index_info["config"].n_neighbors
+        if k <= 0 or len(queries) == 0:
+            return [[] for _ in range(len(queries))]
+        
+        # One call per shard, covering every partition it holds
+        partitions = index_info["partitions"]
+        by_shard: Dict[int, List[str]] = {}
+        for p in range(partitions):
+            by_shard.setdefault(self._owner(index_name, p), []).append(
+                partition_name(index_name, p, partitions)
+            )
+        
+        shard_results = await asyncio.gather(*[
+            self._call(shard, _shard_search, names, queries, k)
+            for shard, names in by_shard.items()
+        ])
+        if len(shard_results) == 1:
+            return shard_results[0]
+        return [
+            _merge_top_k([results[row] for results in shard_results], k)
+            for row in range(len(queries))
+        ]
+    
+    async def set_search_params(
+        self,
+        index_name: str,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ):
+        """Tune every partition of an index, waiting for all shards"""
+        index_info = self._require(index_name)
+        partitions = index_info["partitions"]
+        await asyncio.gather(*[
+            self._call(
+                self._owner(index_name, p), _shard_call, "set_search_params",
+                partition_name(index_name, p, partitions), nprobe, ef_search
+            )
+            for p in range(partitions)
+        ])
+        if nprobe is not None:
+            index_info["config"].nprobe = nprobe
+        if ef_search is not None:
+            index_info["config"].ef_search = ef_search
+    
+    async def save_index(self, index_name: str) -> List[str]:
+        """Persist every partition from its shard; returns generation dirs"""
+        index_info = self._require(index_name)
+        partitions = index_info["partitions"]
+        return list(await asyncio.gather(*[
+            self._call(
+                self._owner(index_name, p), _shard_call, "save_index",
+                partition_name(index_name, p, partitions)
+            )
+            for p in range(partitions)
+        ]))
+    
+    def _saved_partitions(self) -> Dict[str, List[str]]:
+        """Saved index names grouped by index, for complete partition sets"""
+        groups: Dict[str, Dict[int, str]] = {}
+        totals: Dict[str, int] = {}
+        for name in self.index_store.list_indices():
+            match = _PARTITION_PATTERN.match(name)
+            if match is None:
+                groups.setdefault(name, {})[0] = name
+                totals[name] = 1
+                continue
+            base = match.group("base")
+            total = int(match.group("total"))
+            if totals.setdefault(base, total) != total:
+                logger.warning(f"Saved index '{base}' has partitions of different layouts, skipping")
+                totals[base] = -1
+                continue
+            groups.setdefault(base, {})[int(match.group("part"))] = name
+        
+        complete = {}
+        for base, parts in groups.items():
+            if totals[base] > 0 and sorted(parts) == list(range(totals[base])):
+                complete[base] = [parts[p] for p in range(totals[base])]
+            else:
+                logger.warning(f"Saved index '{base}' is missing partitions, skipping")
+        return complete
+    
+    async def load_index(self, index_name: str, mmap: bool = True):
+        """Load a saved index's partitions onto their shards"""
+        saved = self._saved_partitions()
+        if index_name not in saved:
+            raise ValueError(f"No saved index '{index_name}' in {self.index_store.root_dir}")
+        await self._load_partitions(index_name, saved[index_name], mmap)
+    
+    async def _load_partitions(self, index_name: str, names: List[str], mmap: bool):
+        manifests = [self.index_store.read_manifest(name) for name in names]
+        partitions = len(names)
+        await asyncio.gather(*[
+            self._call(self._owner(index_name, p), _shard_call, "load_index", name, mmap)
+            for p, name in enumerate(names)
+        ])
+        
+        # Ignore config keys written by other versions
+        known_fields = {f.name for f in fields(SimilarityConfig)}
+        config = SimilarityConfig(**{
+            key: value for key, value in manifests[0]["config"].items()
+            if key in known_fields
+        })
+        self.indices[index_name] = {
+            "config": config,
+            "dimension": manifests[0]["dimension"],
+            "partitions": partitions,
+            "size": sum(manifest["size"] for manifest in manifests),
+            "next_id": max(manifest["next_id"] for manifest in manifests)
+        }
+    
+    async def resident_bytes_by_tenant(self) -> Dict[str, int]:
+        """Resident index memory per tenant, summed over the shards"""
+        usage: Dict[str, int] = {}
+        shard_usage = await asyncio.gather(*[
+            self._call(shard, _shard_call, "resident_bytes_by_tenant")
+            for shard in range(self.n_shards)
+        ])
+        for tenants in shard_usage:
+            for tenant, resident in tenants.items():
+                usage[tenant] = usage.get(tenant, 0) + resident
+        return usage
+    
+    async def load_saved_indices(self, mmap: bool = True) -> List[str]:
+        """Warm start: load every saved index onto the shards"""
+        loaded = []
+        for index_name, names in self._saved_partitions().items():
+            try:
+                await self._load_partitions(index_name, names, mmap)
+                loaded.append(index_name)
+            except Exception as e:
+                logger.warning(f"Failed to load saved index '{index_name}': {e}")
+        return loaded
+    
+    def close(self):
+        for shard in self.shards:
+            shard.shutdown(wait=True)
+        self.indices.clear()
+        logger.info("Sharded similarity search shut down")
\ No newline at end of file
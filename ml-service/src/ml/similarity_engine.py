@@ -3,18 +3,28 @@ Similarity Computation Engine
 Handles efficient similarity search and clustering using FAISS and other algorithms
 """
 
+import os
+import re
+import time
+import hashlib
 import numpy as np
 import faiss
 import logging
 from typing import List, Dict, Any, Tuple, Optional
-from dataclasses import dataclass
+from dataclasses import dataclass, replace, asdict, fields
 from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.cluster import KMeans, DBSCAN, AgglomerativeClustering
+from sklearn.cluster import KMeans, MiniBatchKMeans, DBSCAN, AgglomerativeClustering
 from sklearn.decomposition import PCA
 import torch
 from annoy import AnnoyIndex
 import asyncio
+import threading
+from contextlib import asynccontextmanager
 from concurrent.futures import ThreadPoolExecutor
+from prometheus_client import Counter, Gauge
+
+from .index_store import IndexStore, ColumnarMetadata, MMAP_INDEX_TYPES
+from .projection import FittedReducer
 
 logger = logging.getLogger(__name__)
 
@@ -25,9 +35,61 @@ class SimilarityConfig:
     metric: str = "cosine"  # cosine, euclidean, dot
     threshold: float = 0.7
     use_gpu: bool = False
-    index_type: str = "faiss"  # faiss, annoy
+    index_type: str = "faiss"  # faiss (exact), ivf_flat, ivf_pq, hnsw, annoy
     n_neighbors: int = 10
     clustering_algorithm: str = "kmeans"  # kmeans, dbscan, hierarchical
+    
+    # Approximate index parameters (ivf_flat, ivf_pq, hnsw)
+    nlist: int = 1024  # IVF coarse centroids
+    nprobe: int = 16  # IVF lists visited per query (recall vs latency)
+    pq_m: int = 16  # PQ sub-quantizers
+    pq_nbits: int = 8  # Bits per PQ sub-quantizer code
+    hnsw_m: int = 32  # HNSW graph degree
+    ef_construction: int = 200  # HNSW build-time candidate list
+    ef_search: int = 64  # HNSW query-time candidate list (recall vs latency)
+    train_sample_size: int = 100000  # Max vectors sampled to train IVF indices
+    search_chunk_size: int = 1024  # Queries per FAISS batch search call
+    
+    # Large-scale clustering: above the threshold k-means runs mini-batch and
+    # k is estimated on a sample
+    scalable_clustering_threshold: int = 20000
+    cluster_sample_size: int = 10000  # Vectors used to estimate k
+    silhouette_sample_size: int = 2000  # Vectors scored per candidate k
+    kmeans_batch_size: int = 4096
+    
+    # Sharded mode: indices above this many vectors are split across shards
+    shard_partition_size: int = 50000
+
+
+# Index types backed by FAISS
+FAISS_INDEX_TYPES = ("faiss", "ivf_flat", "ivf_pq", "hnsw")
+
+# FAISS recommends at least this many training points per IVF centroid
+MIN_POINTS_PER_CENTROID = 39
+
+# HNSW indices are rebuilt once tombstones exceed this fraction of their vectors
+MAX_TOMBSTONE_FRACTION = 0.2
+
+# IVF indices sized below their configured nlist/PQ code size are retrained
+# once they hold this many times the vectors they were trained on
+IVF_RETRAIN_GROWTH = 4
+
+# Rough cost of one metadata record held as a Python dict
+METADATA_RECORD_BYTES = 256
+
+# Tenant ids usable as-is as an index namespace; others are hashed
+_TENANT_PATTERN = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+index_resident_bytes = Gauge(
+    'ml_similarity_index_resident_bytes',
+    'Estimated memory held by resident similarity indices',
+    ['tenant']
+)
+index_evictions = Counter(
+    'ml_similarity_index_evictions_total',
+    'Indices spilled to the index store to stay within memory quotas',
+    ['tenant']
+)
 
 
 @dataclass
@@ -39,13 +101,59 @@ class SearchResult:
 
 
 class SimilarityEngine:
-    """Engine for computing similarities and performing efficient search"""
+    """Engine for computing similarities and performing efficient search
+    
+    With ``n_shards`` > 0 indices are held by a ``ShardedSearchPool`` of
+    worker processes instead of this one; index building, updates, search
+    and persistence are delegated to it, everything else runs locally.
+    
+    Index names of the form ``tenant:name`` (see ``tenant_index_name``)
+    belong to that tenant's namespace. Resident indices are charged an
+    estimate of their memory against ``tenant_quota_bytes`` and
+    ``global_quota_bytes`` (0 for no limit, by default read in MB from
+    ``INDEX_TENANT_QUOTA_MB`` and ``INDEX_MEMORY_QUOTA_MB``); once either is
+    exceeded the least recently used indices are spilled to the index store
+    and reloaded when next used. In sharded mode the quotas apply per shard.
+    
+    Changes to an index (adds, removals, compaction, tuning and saves) and
+    FAISS searches of it are serialised by a per-index lock, since FAISS CPU
+    indices are not safe to modify while they are read or modified
+    elsewhere. Annoy indices are immutable and searched without it.
+    """
     
-    def __init__(self):
+    def __init__(
+        self,
+        index_dir: str = "/app/indices",
+        n_shards: int = 0,
+        tenant_quota_bytes: Optional[int] = None,
+        global_quota_bytes: Optional[int] = None
+    ):
         self.indices = {}
         self.metadata_store = {}
-        self.executor = ThreadPoolExecutor(max_workers=4)
+        if tenant_quota_bytes is None:
+            tenant_quota_bytes = int(float(os.getenv("INDEX_TENANT_QUOTA_MB", "0")) * 2 ** 20)
+        if global_quota_bytes is None:
+            global_quota_bytes = int(float(os.getenv("INDEX_MEMORY_QUOTA_MB", "0")) * 2 ** 20)
+        self.tenant_quota_bytes = tenant_quota_bytes
+        self.global_quota_bytes = global_quota_bytes
+        # Spilled index -> how to reload it (mmap, pending search params)
+        self.evicted: Dict[str, Dict[str, Any]] = {}
+        # Index -> in-flight eviction or reload, awaited by other callers
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._in_use: Dict[str, int] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._metric_tenants = set()
+        self.max_workers = 4
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self.index_store = IndexStore(index_dir)
+        self.reducers: Dict[Tuple[str, str, int], FittedReducer] = {}
+        self._reducer_lock = threading.Lock()
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        
+        self.shards = None
+        if n_shards > 0:
+            from .sharded_search import ShardedSearchPool
+            self.shards = ShardedSearchPool(n_shards, index_dir)
         logger.info(f"Similarity Engine initialized with device: {self.device}")
     
     def _normalize_vectors(self, vectors: np.ndarray) -> np.ndarray:
@@ -53,12 +161,76 @@ class SimilarityEngine:
         norms = np.linalg.norm(vectors, axis=1, keepdims=True)
         return vectors / (norms + 1e-8)
     
+    def _faiss_metric(self, config: SimilarityConfig) -> int:
+        """Map configured metric to FAISS metric type"""
+        if config.metric == "euclidean":
+            return faiss.METRIC_L2
+        # Inner product on normalized vectors is equivalent to cosine
+        return faiss.METRIC_INNER_PRODUCT
+    
+    def _effective_nlist(
+        self,
+        config: SimilarityConfig,
+        n_vectors: Optional[int]
+    ) -> int:
+        """Limit IVF centroids so each one gets enough training points"""
+        if not n_vectors:
+            return config.nlist
+        return max(1, min(config.nlist, n_vectors // MIN_POINTS_PER_CENTROID))
+    
+    def _effective_pq_params(
+        self,
+        dimension: int,
+        config: SimilarityConfig,
+        n_vectors: Optional[int]
+    ) -> Tuple[int, int]:
+        """Pick PQ sub-quantizer count dividing the dimension and a trainable code size"""
+        m = max(1, min(config.pq_m, dimension))
+        while dimension % m:
+            m -= 1
+        
+        nbits = config.pq_nbits
+        if n_vectors:
+            # k-means needs at least 2**nbits training points per sub-quantizer
+            nbits = max(1, min(nbits, int(np.log2(max(n_vectors, 2)))))
+        
+        return m, nbits
+    
     def create_faiss_index(
         self,
         dimension: int,
-        config: SimilarityConfig
+        config: SimilarityConfig,
+        n_vectors: Optional[int] = None
     ) -> faiss.Index:
-        """Create FAISS index based on configuration"""
+        """Create FAISS index based on configuration
+        
+        Exact and HNSW indices are wrapped in an ID map so that vectors are
+        addressed by external id; IVF indices store ids natively.
+        """
+        metric = self._faiss_metric(config)
+        
+        if config.index_type in ("ivf_flat", "ivf_pq"):
+            nlist = self._effective_nlist(config, n_vectors)
+            if metric == faiss.METRIC_L2:
+                quantizer = faiss.IndexFlatL2(dimension)
+            else:
+                quantizer = faiss.IndexFlatIP(dimension)
+            
+            if config.index_type == "ivf_flat":
+                index = faiss.IndexIVFFlat(quantizer, dimension, nlist, metric)
+            else:
+                m, nbits = self._effective_pq_params(dimension, config, n_vectors)
+                index = faiss.IndexIVFPQ(quantizer, dimension, nlist, m, nbits, metric)
+            
+            index.nprobe = min(config.nprobe, nlist)
+            return index
+        
+        if config.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(dimension, config.hnsw_m, metric)
+            index.hnsw.efConstruction = config.ef_construction
+            index.hnsw.efSearch = config.ef_search
+            return faiss.IndexIDMap2(index)
+        
         if config.metric == "cosine":
             # Use Inner Product for normalized vectors (equivalent to cosine)
             if config.use_gpu and faiss.get_num_gpus() > 0:
@@ -98,7 +270,7 @@ class SimilarityEngine:
             else:
                 index = faiss.IndexFlatIP(dimension)
         
-        return index
+        return faiss.IndexIDMap2(index)
     
     def create_annoy_index(
         self,
@@ -106,20 +278,358 @@ class SimilarityEngine:
         config: SimilarityConfig
     ) -> AnnoyIndex:
         """Create Annoy index for approximate search"""
-        metric = "angular" if config.metric == "cosine" else "euclidean"
-        index = AnnoyIndex(dimension, metric)
+        index = AnnoyIndex(dimension, self._annoy_metric(config))
         return index
     
+    def _annoy_metric(self, config: SimilarityConfig) -> str:
+        """Map configured metric to Annoy metric name"""
+        return "angular" if config.metric == "cosine" else "euclidean"
+    
+    def _train_index(
+        self,
+        index: faiss.Index,
+        vectors: np.ndarray,
+        config: SimilarityConfig
+    ) -> faiss.Index:
+        """Train an untrained (IVF) index on a random sample of vectors
+        
+        The index is recreated with nlist and PQ code size chosen for the
+        batch first, since an index built empty was sized without knowing
+        how many training points it would get. Returns the trained index.
+        """
+        if index.is_trained:
+            return index
+        
+        index = self.create_faiss_index(index.d, config, len(vectors))
+        
+        if len(vectors) > config.train_sample_size:
+            rng = np.random.default_rng(42)
+            sample_idx = rng.choice(len(vectors), config.train_sample_size, replace=False)
+            vectors = vectors[sample_idx]
+        
+        index.train(vectors)
+        return index
+    
+    def _ivf_undersized(self, index: faiss.Index, config: SimilarityConfig, n_vectors: int) -> bool:
+        """Whether an IVF index has fewer centroids or PQ bits than ``n_vectors`` supports"""
+        ivf = faiss.extract_index_ivf(index)
+        if ivf.nlist < self._effective_nlist(config, n_vectors):
+            return True
+        if config.index_type == "ivf_pq":
+            _, nbits = self._effective_pq_params(index.d, config, n_vectors)
+            return faiss.downcast_index(ivf).pq.nbits < nbits
+        return False
+    
+    def _retrain_ivf(
+        self,
+        index: faiss.Index,
+        vectors: np.ndarray,
+        config: SimilarityConfig
+    ) -> faiss.Index:
+        """Rebuild an IVF index trained on its own vectors plus ``vectors``
+        
+        The stored vectors are reconstructed (decoded, for IVF-PQ) and moved
+        to a new index sized for the combined count; ``vectors`` are only
+        used for training, the caller adds them.
+        """
+        ivf = faiss.extract_index_ivf(index)
+        invlists = ivf.invlists
+        id_lists = []
+        for list_no in range(ivf.nlist):
+            list_size = invlists.list_size(list_no)
+            if list_size:
+                ids_ptr = invlists.get_ids(list_no)
+                id_lists.append(faiss.rev_swig_ptr(ids_ptr, list_size).copy())
+                invlists.release_ids(list_no, ids_ptr)
+        ids = np.concatenate(id_lists) if id_lists else np.zeros(0, dtype=np.int64)
+        
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        stored = ivf.reconstruct_batch(ids) if len(ids) else np.zeros((0, index.d), dtype=np.float32)
+        
+        rebuilt = self.create_faiss_index(index.d, config)
+        rebuilt = self._train_index(rebuilt, np.vstack([stored, vectors]).astype(np.float32), config)
+        if len(ids):
+            rebuilt.add_with_ids(np.ascontiguousarray(stored, dtype=np.float32), ids)
+        return rebuilt
+    
+    def _apply_search_params(self, index: faiss.Index, config: SimilarityConfig):
+        """Push nprobe/efSearch from config into the FAISS index"""
+        if config.index_type in ("ivf_flat", "ivf_pq"):
+            ivf = faiss.extract_index_ivf(index)
+            ivf.nprobe = min(config.nprobe, ivf.nlist)
+        elif config.index_type == "hnsw":
+            faiss.downcast_index(index.index).hnsw.efSearch = config.ef_search
+    
+    def _compact_hnsw(self, index_info: Dict[str, Any]) -> faiss.Index:
+        """Rebuild an HNSW index from its live vectors, dropping tombstones
+        
+        Runs in the executor with the index lock held; the caller swaps the
+        compacted index in and clears ``deleted_ids`` on the event loop.
+        """
+        index = index_info["index"]
+        ids = faiss.vector_to_array(index.id_map)
+        vectors = index.index.reconstruct_n(0, index.ntotal)
+        live = ~np.isin(ids, np.fromiter(index_info["deleted_ids"], dtype=np.int64))
+        
+        compacted = self.create_faiss_index(index_info["dimension"], index_info["config"])
+        compacted.add_with_ids(
+            np.ascontiguousarray(vectors[live], dtype=np.float32),
+            np.ascontiguousarray(ids[live])
+        )
+        return compacted
+    
+    def _needs_compaction(self, index_info: Dict[str, Any]) -> bool:
+        """Whether tombstones make up too much of an HNSW index"""
+        return len(index_info["deleted_ids"]) > MAX_TOMBSTONE_FRACTION * index_info["index"].ntotal
+    
+    def _resident_count(self, index_info: Dict[str, Any]) -> int:
+        """Number of live (non-deleted) vectors in an index"""
+        if index_info["config"].index_type == "annoy":
+            return index_info["index"].get_n_items()
+        return index_info["index"].ntotal - len(index_info["deleted_ids"])
+    
+    @staticmethod
+    def tenant_index_name(tenant_id: str, index_name: str) -> str:
+        """Name of ``index_name`` within a tenant's namespace
+        
+        The default tenant keeps unscoped names, so existing indices stay
+        where they are.
+        """
+        if tenant_id == "default":
+            return index_name
+        if not _TENANT_PATTERN.match(tenant_id):
+            tenant_id = "t-" + hashlib.sha1(tenant_id.encode()).hexdigest()[:16]
+        return f"{tenant_id}:{index_name}"
+    
+    @staticmethod
+    def index_tenant(index_name: str) -> str:
+        """Tenant namespace of an index ("default" for unscoped names)"""
+        tenant, separator, _ = index_name.partition(":")
+        return tenant if separator else "default"
+    
+    def has_index(self, index_name: str) -> bool:
+        """Whether an index exists, resident or spilled to the index store"""
+        if self.shards is not None:
+            return index_name in self.shards.indices
+        return index_name in self.indices or index_name in self.evicted
+    
+    def _estimate_resident_bytes(self, index_name: str) -> int:
+        """Approximate memory held by an index and its metadata"""
+        index_info = self.indices[index_name]
+        index = index_info["index"]
+        config = index_info["config"]
+        dimension = index_info["dimension"]
+        
+        if config.index_type == "annoy":
+            # Item vectors plus roughly as many split nodes across the trees
+            total = index.get_n_items() * (dimension * 4 + 16) * 2
+        else:
+            vector_bytes = dimension * 4
+            if config.index_type == "ivf_pq":
+                vector_bytes = faiss.extract_index_ivf(index).code_size
+            elif config.index_type == "hnsw":
+                # Level-0 neighbour lists dominate the graph
+                vector_bytes += config.hnsw_m * 2 * 4
+            total = index.ntotal * (vector_bytes + 8)  # + 8 for the id
+            if config.index_type in ("ivf_flat", "ivf_pq"):
+                total += faiss.extract_index_ivf(index).nlist * dimension * 4
+        
+        metadata = self.metadata_store.get(index_name)
+        if isinstance(metadata, ColumnarMetadata):
+            total += metadata.nbytes + len(metadata._overrides) * METADATA_RECORD_BYTES
+        elif metadata:
+            total += len(metadata) * METADATA_RECORD_BYTES
+        return int(total)
+    
+    def _touch(self, index_name: str, changed: bool = False):
+        """Record an access, and with ``changed`` a modification, of an index"""
+        index_info = self.indices[index_name]
+        index_info["last_access"] = time.monotonic()
+        if changed or "resident_bytes" not in index_info:
+            index_info["resident_bytes"] = self._estimate_resident_bytes(index_name)
+            self._publish_memory_metrics()
+        if changed:
+            index_info["dirty"] = True
+    
+    def resident_bytes_by_tenant(self) -> Dict[str, int]:
+        """Estimated memory of the resident indices of each tenant"""
+        usage: Dict[str, int] = {}
+        for index_name, index_info in self.indices.items():
+            tenant = self.index_tenant(index_name)
+            usage[tenant] = usage.get(tenant, 0) + index_info.get("resident_bytes", 0)
+        return usage
+    
+    def _publish_memory_metrics(self, usage: Optional[Dict[str, int]] = None):
+        if usage is None:
+            usage = self.resident_bytes_by_tenant()
+        for tenant in self._metric_tenants - set(usage):
+            index_resident_bytes.labels(tenant=tenant).set(0)
+        for tenant, resident in usage.items():
+            index_resident_bytes.labels(tenant=tenant).set(resident)
+        self._metric_tenants |= set(usage)
+    
+    async def update_memory_metrics(self) -> Dict[str, int]:
+        """Refresh the resident size gauges (from all shards in sharded mode)"""
+        if self.shards is not None:
+            usage = await self.shards.resident_bytes_by_tenant()
+        else:
+            usage = self.resident_bytes_by_tenant()
+        self._publish_memory_metrics(usage)
+        return usage
+    
+    async def _enforce_quotas(self, protect: str):
+        """Spill least recently used indices until usage fits the quotas
+        
+        The tenant quota of ``protect``'s tenant is enforced first, by
+        evicting that tenant's own indices, then the global quota. Indices
+        in use and ``protect`` itself are never evicted.
+        """
+        if not (self.tenant_quota_bytes or self.global_quota_bytes):
+            return
+        
+        tenant = self.index_tenant(protect)
+        skipped = set()
+        while True:
+            usage = self.resident_bytes_by_tenant()
+            over_tenant = bool(self.tenant_quota_bytes) and usage.get(tenant, 0) > self.tenant_quota_bytes
+            over_global = bool(self.global_quota_bytes) and sum(usage.values()) > self.global_quota_bytes
+            if not (over_tenant or over_global):
+                return
+            
+            candidates = [
+                index_name for index_name in self.indices
+                if index_name != protect
+                and index_name not in skipped
+                and not self._in_use.get(index_name)
+            ]
+            if over_tenant:
+                tenant_candidates = [
+                    index_name for index_name in candidates
+                    if self.index_tenant(index_name) == tenant
+                ]
+                if tenant_candidates or not over_global:
+                    candidates = tenant_candidates
+            
+            if not candidates:
+                # Indices in use are retried once released; only an index
+                # that alone exceeds a quota is worth a warning
+                resident = self.indices.get(protect, {}).get("resident_bytes", 0)
+                quota = self.tenant_quota_bytes if over_tenant else self.global_quota_bytes
+                if resident > quota:
+                    logger.warning(
+                        f"Index '{protect}' ({resident} bytes) exceeds the "
+                        f"{'tenant' if over_tenant else 'global'} memory quota of {quota} bytes"
+                    )
+                return
+            
+            victim = min(candidates, key=lambda name: self.indices[name].get("last_access", 0.0))
+            if not await self.evict_index(victim):
+                skipped.add(victim)
+    
+    async def evict_index(self, index_name: str) -> bool:
+        """Spill a resident index to the index store and release its memory
+        
+        Unsaved changes are persisted first. Returns False if the index is
+        not resident or could not be saved (it then stays resident).
+        """
+        if index_name not in self.indices or index_name in self._pending:
+            return False
+        
+        # Unregister first so that callers wait for the eviction to finish
+        # instead of touching an index that is being written out
+        index_info = self.indices.pop(index_name)
+        metadata = self.metadata_store.pop(index_name, None)
+        done = asyncio.get_event_loop().create_future()
+        self._pending[index_name] = done
+        try:
+            if index_info.get("dirty", True):
+                await self._persist(index_name, index_info, metadata)
+        except Exception as e:
+            self.indices[index_name] = index_info
+            if metadata is not None:
+                self.metadata_store[index_name] = metadata
+            logger.warning(f"Failed to evict index '{index_name}': {e}")
+            return False
+        finally:
+            del self._pending[index_name]
+            done.set_result(None)
+        
+        self.evicted[index_name] = {"mmap": bool(index_info.get("read_only"))}
+        tenant = self.index_tenant(index_name)
+        index_evictions.labels(tenant=tenant).inc()
+        self._publish_memory_metrics()
+        logger.info(
+            f"Evicted index '{index_name}' ({index_info.get('resident_bytes', 0)} bytes) "
+            f"to stay within memory quotas"
+        )
+        return True
+    
+    async def _ensure_resident(self, index_name: str) -> Dict[str, Any]:
+        """Index info of a resident index, reloading it if it was evicted"""
+        while index_name in self._pending:
+            await asyncio.shield(self._pending[index_name])
+        
+        if index_name not in self.indices:
+            if index_name not in self.evicted:
+                raise ValueError(f"Index '{index_name}' not found")
+            
+            done = asyncio.get_event_loop().create_future()
+            self._pending[index_name] = done
+            try:
+                await self._load_index(index_name, self.evicted[index_name]["mmap"])
+            finally:
+                del self._pending[index_name]
+                done.set_result(None)
+            logger.info(f"Reloaded evicted index '{index_name}'")
+            await self._enforce_quotas(index_name)
+        
+        self._touch(index_name)
+        return self.indices[index_name]
+    
+    def _index_lock(self, index_name: str) -> asyncio.Lock:
+        """Lock serialising changes to and FAISS searches of an index"""
+        lock = self._locks.get(index_name)
+        if lock is None:
+            lock = self._locks[index_name] = asyncio.Lock()
+        return lock
+    
+    @asynccontextmanager
+    async def _use_index(self, index_name: str):
+        """Keep an index resident (and not evictable) while it is used"""
+        index_info = await self._ensure_resident(index_name)
+        self._in_use[index_name] = self._in_use.get(index_name, 0) + 1
+        try:
+            yield index_info
+        finally:
+            self._in_use[index_name] -= 1
+            if not self._in_use[index_name]:
+                del self._in_use[index_name]
+        # Indices skipped while in use may be evictable now
+        await self._enforce_quotas(index_name)
+    
     async def build_index(
         self,
         embeddings: np.ndarray,
         index_name: str,
         config: Optional[SimilarityConfig] = None,
-        metadata: Optional[List[Dict[str, Any]]] = None
+        metadata: Optional[List[Dict[str, Any]]] = None,
+        ids: Optional[np.ndarray] = None
     ):
-        """Build similarity index from embeddings"""
+        """Build similarity index from embeddings
+        
+        Vectors get ids ``0..n-1`` unless ``ids`` are given.
+        """
+        if self.shards is not None:
+            return await self.shards.build_index(embeddings, index_name, config, metadata, ids)
+        
         if config is None:
             config = SimilarityConfig()
+        else:
+            # Search knobs are tuned per index, so keep a private copy
+            config = replace(config)
+        
+        if config.index_type != "annoy" and config.index_type not in FAISS_INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {config.index_type}")
         
         loop = asyncio.get_event_loop()
         
@@ -129,11 +639,21 @@ class SimilarityEngine:
         
         dimension = embeddings.shape[1]
         
-        if config.index_type == "faiss":
+        if ids is None:
+            ids = np.arange(len(embeddings), dtype=np.int64)
+        else:
+            ids = np.asarray(ids, dtype=np.int64)
+            if len(ids) != len(embeddings):
+                raise ValueError("Number of ids does not match number of vectors")
+        
+        if config.index_type in FAISS_INDEX_TYPES:
             # Build FAISS index
             def build_faiss():
-                index = self.create_faiss_index(dimension, config)
-                index.add(embeddings.astype(np.float32))
+                index = self.create_faiss_index(dimension, config, len(embeddings))
+                vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+                if len(vectors) > 0:
+                    index = self._train_index(index, vectors, config)
+                    index.add_with_ids(vectors, ids)
                 return index
             
             index = await loop.run_in_executor(self.executor, build_faiss)
@@ -142,25 +662,383 @@ class SimilarityEngine:
             # Build Annoy index
             def build_annoy():
                 index = self.create_annoy_index(dimension, config)
-                for i, embedding in enumerate(embeddings):
-                    index.add_item(i, embedding)
+                for vector_id, embedding in zip(ids.tolist(), embeddings):
+                    index.add_item(vector_id, embedding)
                 index.build(50)  # 50 trees
                 return index
             
             index = await loop.run_in_executor(self.executor, build_annoy)
         
-        # Store index and metadata
+        # Store index and metadata once in-flight changes to a previous
+        # index of the same name are done
+        async with self._index_lock(index_name):
+            self.indices[index_name] = {
+                "index": index,
+                "config": config,
+                "dimension": dimension,
+                "size": len(embeddings),
+                "next_id": int(ids.max()) + 1 if len(ids) else 0,
+                "deleted_ids": set(),
+                # Vectors the (IVF) index was last trained on
+                "trained_size": len(embeddings)
+            }
+            
+            if metadata:
+                self.metadata_store[index_name] = dict(zip(ids.tolist(), metadata))
+            else:
+                self.metadata_store.pop(index_name, None)
+        
+        self.evicted.pop(index_name, None)
+        self._touch(index_name, changed=True)
+        logger.info(f"Built {config.index_type} index '{index_name}' with {len(embeddings)} vectors")
+        await self._enforce_quotas(index_name)
+    
+    async def add_vectors(
+        self,
+        embeddings: np.ndarray,
+        index_name: str,
+        ids: Optional[np.ndarray] = None,
+        metadata: Optional[List[Dict[str, Any]]] = None
+    ) -> np.ndarray:
+        """Incrementally add vectors to an existing FAISS index
+        
+        Untrained IVF indices are trained on the first batch. Returns the ids
+        assigned to the new vectors; new ids must not already be in the index.
+        """
+        if self.shards is not None:
+            return await self.shards.add_vectors(embeddings, index_name, ids, metadata)
+        
+        async with self._use_index(index_name), self._index_lock(index_name):
+            ids = await self._add_vectors(embeddings, index_name, ids, metadata)
+        await self._enforce_quotas(index_name)
+        return ids
+    
+    async def _add_vectors(
+        self,
+        embeddings: np.ndarray,
+        index_name: str,
+        ids: Optional[np.ndarray],
+        metadata: Optional[List[Dict[str, Any]]]
+    ) -> np.ndarray:
+        if index_name not in self.indices:
+            raise ValueError(f"Index '{index_name}' not found")
+        
+        index_info = self.indices[index_name]
+        index = index_info["index"]
+        config = index_info["config"]
+        
+        if config.index_type == "annoy":
+            raise ValueError("Annoy indices are immutable, rebuild with build_index")
+        if index_info.get("read_only"):
+            raise ValueError(
+                f"Index '{index_name}' is memory-mapped read-only, load it with mmap=False to modify"
+            )
+        
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(-1, index_info["dimension"])
+        if config.metric == "cosine":
+            embeddings = self._normalize_vectors(embeddings)
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        
+        if ids is None:
+            start = index_info["next_id"]
+            ids = np.arange(start, start + len(embeddings), dtype=np.int64)
+        else:
+            ids = np.asarray(ids, dtype=np.int64)
+            if len(ids) != len(embeddings):
+                raise ValueError("Number of ids does not match number of vectors")
+        
+        if len(ids) == 0:
+            return ids
+        
+        loop = asyncio.get_event_loop()
+        
+        # Re-added ids still sit in the HNSW graph as tombstones, drop those first
+        compact = config.index_type == "hnsw" and (
+            bool(index_info["deleted_ids"].intersection(ids.tolist()))
+            or self._needs_compaction(index_info)
+        )
+        
+        # IVF indices trained on a small first batch are rebuilt with more
+        # centroids (and PQ bits) once they have grown well past it
+        n_total = index.ntotal + len(ids)
+        retrain = (
+            config.index_type in ("ivf_flat", "ivf_pq")
+            and index.is_trained
+            and n_total >= IVF_RETRAIN_GROWTH * max(index_info["trained_size"], 1)
+            and self._ivf_undersized(index, config, n_total)
+        )
+        trains = retrain or not index.is_trained
+        
+        def add():
+            if compact:
+                trained = self._compact_hnsw(index_info)
+            elif retrain:
+                trained = self._retrain_ivf(index, embeddings, config)
+            else:
+                trained = self._train_index(index, embeddings, config)
+            trained.add_with_ids(embeddings, ids)
+            return trained
+        
+        index_info["index"] = await loop.run_in_executor(self.executor, add)
+        if compact:
+            index_info["deleted_ids"] = set()
+        if trains:
+            index_info["trained_size"] = n_total if retrain else len(embeddings)
+        
+        index_info["next_id"] = max(index_info["next_id"], int(ids.max()) + 1)
+        index_info["size"] = self._resident_count(index_info)
+        
+        if metadata:
+            store = self.metadata_store.setdefault(index_name, {})
+            for vector_id, item in zip(ids.tolist(), metadata):
+                store[vector_id] = item
+        
+        self._touch(index_name, changed=True)
+        logger.info(f"Added {len(ids)} vectors to index '{index_name}'")
+        return ids
+    
+    async def remove_ids(
+        self,
+        ids: np.ndarray,
+        index_name: str
+    ) -> int:
+        """Remove vectors from a FAISS index by id, returning the number removed"""
+        if self.shards is not None:
+            return await self.shards.remove_ids(ids, index_name)
+        
+        async with self._use_index(index_name), self._index_lock(index_name):
+            return await self._remove_ids(ids, index_name)
+    
+    async def _remove_ids(self, ids: np.ndarray, index_name: str) -> int:
+        if index_name not in self.indices:
+            raise ValueError(f"Index '{index_name}' not found")
+        
+        index_info = self.indices[index_name]
+        index = index_info["index"]
+        config = index_info["config"]
+        
+        if config.index_type == "annoy":
+            raise ValueError("Annoy indices are immutable, rebuild with build_index")
+        if index_info.get("read_only"):
+            raise ValueError(
+                f"Index '{index_name}' is memory-mapped read-only, load it with mmap=False to modify"
+            )
+        
+        ids = np.asarray(ids, dtype=np.int64)
+        
+        if config.index_type == "hnsw":
+            # HNSW graphs cannot drop nodes, so tombstone ids and filter at query time
+            present = ids[np.isin(ids, faiss.vector_to_array(index.id_map))]
+            new_ids = set(present.tolist()) - index_info["deleted_ids"]
+            index_info["deleted_ids"].update(new_ids)
+            removed = len(new_ids)
+            
+            if self._needs_compaction(index_info):
+                loop = asyncio.get_event_loop()
+                index_info["index"] = await loop.run_in_executor(
+                    self.executor, self._compact_hnsw, index_info
+                )
+                index_info["deleted_ids"] = set()
+        else:
+            loop = asyncio.get_event_loop()
+            removed = await loop.run_in_executor(
+                self.executor, index.remove_ids, ids
+            )
+        
+        metadata = self.metadata_store.get(index_name)
+        if metadata:
+            for vector_id in ids.tolist():
+                metadata.pop(vector_id, None)
+        
+        index_info["size"] = self._resident_count(index_info)
+        
+        self._touch(index_name, changed=True)
+        logger.info(f"Removed {removed} vectors from index '{index_name}'")
+        return int(removed)
+    
+    async def save_index(self, index_name: str) -> str:
+        """Persist an index and its metadata to the index directory
+        
+        Returns the generation directory written; in sharded mode, those of
+        all partitions joined by ``os.pathsep``.
+        """
+        if self.shards is not None:
+            return os.pathsep.join(await self.shards.save_index(index_name))
+        
+        async with self._use_index(index_name) as index_info:
+            return await self._persist(
+                index_name, index_info, self.metadata_store.get(index_name)
+            )
+    
+    async def save_dirty_indices(self) -> List[str]:
+        """Persist every resident index with unsaved changes
+        
+        Called at shutdown, so the next start warm-starts from the indices
+        built or updated since they were last saved (evicted indices were
+        saved when spilled). In sharded mode every index is saved. Returns
+        the names of the indices saved.
+        """
+        if self.shards is not None:
+            names = list(self.shards.indices)
+            for index_name in names:
+                await self.shards.save_index(index_name)
+            return names
+        
+        saved = []
+        for index_name in list(self.indices):
+            index_info = self.indices.get(index_name)
+            if index_info is None or not index_info.get("dirty", True):
+                continue
+            try:
+                await self.save_index(index_name)
+                saved.append(index_name)
+            except Exception as e:
+                logger.warning(f"Failed to save index '{index_name}': {e}")
+        
+        if saved:
+            logger.info(f"Saved {len(saved)} similarity indices")
+        return saved
+    
+    async def _persist(
+        self,
+        index_name: str,
+        index_info: Dict[str, Any],
+        metadata: Optional[Dict[int, Dict[str, Any]]]
+    ) -> str:
+        """Write an index to the index store, clearing its dirty flag
+        
+        Takes the index lock, so the index is never written while it changes.
+        """
+        async with self._index_lock(index_name):
+            config = index_info["config"]
+            
+            manifest = {
+                "dimension": index_info["dimension"],
+                "size": index_info["size"],
+                "next_id": index_info["next_id"],
+                "trained_size": index_info["trained_size"],
+                "deleted_ids": sorted(index_info["deleted_ids"]),
+                "annoy_metric": self._annoy_metric(config),
+                "config": asdict(config)
+            }
+            
+            loop = asyncio.get_event_loop()
+            generation_dir = await loop.run_in_executor(
+                self.executor,
+                self.index_store.save,
+                index_name,
+                index_info["index"],
+                config.index_type,
+                manifest,
+                metadata
+            )
+            
+            index_info["dirty"] = False
+            return str(generation_dir)
+    
+    async def load_index(self, index_name: str, mmap: bool = True):
+        """Load a persisted index, memory-mapped by default
+        
+        Memory-mapped (IVF) indices are read-only; load with ``mmap=False``
+        to keep updating them with add_vectors/remove_ids.
+        """
+        if self.shards is not None:
+            return await self.shards.load_index(index_name, mmap)
+        
+        while index_name in self._pending:
+            await asyncio.shield(self._pending[index_name])
+        await self._load_index(index_name, mmap)
+        await self._enforce_quotas(index_name)
+    
+    async def _load_index(self, index_name: str, mmap: bool):
+        loop = asyncio.get_event_loop()
+        index, manifest, metadata = await loop.run_in_executor(
+            self.executor, self.index_store.load, index_name, mmap
+        )
+        
+        # Ignore config keys written by other versions
+        known_fields = {f.name for f in fields(SimilarityConfig)}
+        config = SimilarityConfig(**{
+            key: value for key, value in manifest["config"].items()
+            if key in known_fields
+        })
+        
+        if config.index_type in FAISS_INDEX_TYPES:
+            self._apply_search_params(index, config)
+        
         self.indices[index_name] = {
             "index": index,
             "config": config,
-            "dimension": dimension,
-            "size": len(embeddings)
+            "dimension": manifest["dimension"],
+            "size": manifest["size"],
+            "next_id": manifest["next_id"],
+            "trained_size": manifest["trained_size"],
+            "deleted_ids": set(manifest["deleted_ids"]),
+            "read_only": mmap and config.index_type in MMAP_INDEX_TYPES,
+            "dirty": False
         }
         
-        if metadata:
+        if metadata is not None:
             self.metadata_store[index_name] = metadata
+        else:
+            self.metadata_store.pop(index_name, None)
         
-        logger.info(f"Built {config.index_type} index '{index_name}' with {len(embeddings)} vectors")
+        spilled = self.evicted.pop(index_name, None)
+        self._touch(index_name)
+        if spilled and spilled.get("search_params"):
+            await self.set_search_params(index_name, **spilled["search_params"])
+        
+        logger.info(f"Loaded {config.index_type} index '{index_name}' with {manifest['size']} vectors")
+    
+    async def load_saved_indices(self, mmap: bool = True) -> List[str]:
+        """Warm start: load every index found in the index directory"""
+        if self.shards is not None:
+            return await self.shards.load_saved_indices(mmap)
+        
+        loaded = []
+        for index_name in self.index_store.list_indices():
+            try:
+                await self.load_index(index_name, mmap=mmap)
+                loaded.append(index_name)
+            except Exception as e:
+                logger.warning(f"Failed to load saved index '{index_name}': {e}")
+        
+        return loaded
+    
+    async def set_search_params(
+        self,
+        index_name: str,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None
+    ):
+        """Tune recall/latency of an approximate index"""
+        if self.shards is not None:
+            return await self.shards.set_search_params(index_name, nprobe, ef_search)
+        
+        async with self._index_lock(index_name):
+            index_info = self.indices.get(index_name)
+            if index_info is None:
+                if index_name not in self.evicted:
+                    raise ValueError(f"Index '{index_name}' not found")
+                # Applied when the index is reloaded
+                params = self.evicted[index_name].setdefault("search_params", {})
+                if nprobe is not None:
+                    params["nprobe"] = nprobe
+                if ef_search is not None:
+                    params["ef_search"] = ef_search
+                return
+            
+            config = index_info["config"]
+            
+            if nprobe is not None:
+                config.nprobe = nprobe
+            if ef_search is not None:
+                config.ef_search = ef_search
+            # The tuned config is part of the saved manifest
+            index_info["dirty"] = True
+            
+            if config.index_type in FAISS_INDEX_TYPES:
+                self._apply_search_params(index_info["index"], config)
     
     async def search(
         self,
@@ -169,6 +1047,91 @@ class SimilarityEngine:
         k: Optional[int] = None
     ) -> List[SearchResult]:
         """Search for similar items in index"""
+        results = await self.batch_search(
+            query_embedding.reshape(1, -1),
+            index_name,
+            k
+        )
+        return results[0]
+    
+    def _distances_to_scores(
+        self,
+        distances: np.ndarray,
+        config: SimilarityConfig
+    ) -> np.ndarray:
+        """Convert raw index distances to similarity scores"""
+        if config.metric == "euclidean":
+            return 1.0 / (1.0 + distances)  # Convert distance to similarity
+        # FAISS IP gives similarity directly for cosine and dot
+        return distances
+    
+    def _build_search_results(
+        self,
+        distances: np.ndarray,
+        indices: np.ndarray,
+        index_name: str,
+        k: int
+    ) -> List[List[SearchResult]]:
+        """Turn (n_queries, fetch_k) search output into per-query result lists"""
+        index_info = self.indices[index_name]
+        deleted_ids = index_info["deleted_ids"]
+        metadata = self.metadata_store.get(index_name, {})
+        
+        scores = self._distances_to_scores(
+            distances.astype(np.float64),
+            index_info["config"]
+        ).tolist()
+        
+        # Valid, live ids only
+        valid = indices >= 0
+        if deleted_ids:
+            valid &= ~np.isin(indices, np.fromiter(deleted_ids, dtype=np.int64))
+        
+        id_rows = indices.tolist()
+        results = []
+        for row, row_valid in enumerate(valid):
+            positions = np.flatnonzero(row_valid)[:k].tolist()
+            row_ids = id_rows[row]
+            row_scores = scores[row]
+            results.append([
+                SearchResult(
+                    index=row_ids[pos],
+                    score=row_scores[pos],
+                    metadata=metadata.get(row_ids[pos], {})
+                )
+                for pos in positions
+            ])
+        
+        return results
+    
+    async def batch_search(
+        self,
+        query_embeddings: np.ndarray,
+        index_name: str,
+        k: Optional[int] = None
+    ) -> List[List[SearchResult]]:
+        """Batch search for multiple queries
+        
+        FAISS indices are queried with one matrix search per chunk of
+        ``search_chunk_size`` queries; Annoy queries are spread across the
+        thread pool. In sharded mode the queries are scattered to the shards
+        and their top-k merged.
+        """
+        if self.shards is not None:
+            return await self.shards.batch_search(query_embeddings, index_name, k)
+        
+        async with self._use_index(index_name) as index_info:
+            if index_info["config"].index_type == "annoy":
+                return await self._batch_search(query_embeddings, index_name, k)
+            async with self._index_lock(index_name):
+                return await self._batch_search(query_embeddings, index_name, k)
+    
+    async def _batch_search(
+        self,
+        query_embeddings: np.ndarray,
+        index_name: str,
+        k: Optional[int]
+    ) -> List[List[SearchResult]]:
         if index_name not in self.indices:
             raise ValueError(f"Index '{index_name}' not found")
         
@@ -176,82 +1139,70 @@ class SimilarityEngine:
         index = index_info["index"]
         config = index_info["config"]
         
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, index_info["dimension"])
+        n_queries = len(queries)
+        
         if k is None:
             k = config.n_neighbors
         
         # Ensure k doesn't exceed index size
         k = min(k, index_info["size"])
+        if k <= 0 or n_queries == 0:
+            return [[] for _ in range(n_queries)]
         
-        # Normalize query if needed
+        # Normalize queries once if needed
         if config.metric == "cosine":
-            query_embedding = self._normalize_vectors(query_embedding.reshape(1, -1))[0]
+            queries = self._normalize_vectors(queries)
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
         
         loop = asyncio.get_event_loop()
         
-        if config.index_type == "faiss":
-            # FAISS search
+        if config.index_type in FAISS_INDEX_TYPES:
+            # Over-fetch to make up for tombstoned ids
+            fetch_k = min(k + len(index_info["deleted_ids"]), index.ntotal)
+            chunk_size = max(1, config.search_chunk_size)
+            
             def faiss_search():
-                distances, indices = index.search(
-                    query_embedding.reshape(1, -1).astype(np.float32),
-                    k
-                )
-                return distances[0], indices[0]
+                distances = np.empty((n_queries, fetch_k), dtype=np.float32)
+                indices = np.empty((n_queries, fetch_k), dtype=np.int64)
+                for start in range(0, n_queries, chunk_size):
+                    end = start + chunk_size
+                    distances[start:end], indices[start:end] = index.search(
+                        queries[start:end],
+                        fetch_k
+                    )
+                return distances, indices
             
             distances, indices = await loop.run_in_executor(
                 self.executor, faiss_search
             )
         
         else:  # annoy
-            # Annoy search
-            def annoy_search():
-                indices, distances = index.get_nns_by_vector(
-                    query_embedding,
-                    k,
-                    include_distances=True
-                )
-                return np.array(distances), np.array(indices)
+            def annoy_search(chunk: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+                # Annoy pads nothing, so fill short result lists with -1
+                distances = np.zeros((len(chunk), k), dtype=np.float32)
+                indices = np.full((len(chunk), k), -1, dtype=np.int64)
+                for row, query in enumerate(chunk):
+                    ids, dists = index.get_nns_by_vector(
+                        query,
+                        k,
+                        include_distances=True
+                    )
+                    indices[row, :len(ids)] = ids
+                    distances[row, :len(dists)] = dists
+                return distances, indices
             
-            distances, indices = await loop.run_in_executor(
-                self.executor, annoy_search
-            )
-        
-        # Create search results
-        results = []
-        metadata = self.metadata_store.get(index_name, [])
-        
-        for i, (idx, dist) in enumerate(zip(indices, distances)):
-            if idx >= 0:  # Valid index
-                # Convert distance to similarity score
-                if config.metric == "cosine":
-                    score = float(dist)  # FAISS IP gives similarity directly
-                elif config.metric == "euclidean":
-                    score = 1.0 / (1.0 + float(dist))  # Convert distance to similarity
-                else:
-                    score = float(dist)
-                
-                result = SearchResult(
-                    index=int(idx),
-                    score=score,
-                    metadata=metadata[idx] if idx < len(metadata) else {}
-                )
-                results.append(result)
-        
-        return results
-    
-    async def batch_search(
-        self,
-        query_embeddings: np.ndarray,
-        index_name: str,
-        k: Optional[int] = None
-    ) -> List[List[SearchResult]]:
-        """Batch search for multiple queries"""
-        tasks = []
-        for query in query_embeddings:
-            task = self.search(query, index_name, k)
-            tasks.append(task)
+            n_chunks = min(self.max_workers, n_queries)
+            chunks = np.array_split(queries, n_chunks)
+            chunk_results = await asyncio.gather(*[
+                loop.run_in_executor(self.executor, annoy_search, chunk)
+                for chunk in chunks
+            ])
+            
+            distances = np.concatenate([d for d, _ in chunk_results])
+            indices = np.concatenate([i for _, i in chunk_results])
         
-        results = await asyncio.gather(*tasks)
-        return results
+        return self._build_search_results(distances, indices, index_name, k)
     
     def compute_pairwise_similarities(
         self,
@@ -283,27 +1234,36 @@ class SimilarityEngine:
         n_clusters: Optional[int] = None,
         config: Optional[SimilarityConfig] = None
     ) -> Tuple[np.ndarray, Dict[str, Any]]:
-        """Cluster embeddings using specified algorithm"""
+        """Cluster embeddings using specified algorithm
+        
+        Above ``config.scalable_clustering_threshold`` vectors, k-means
+        switches to mini-batch k-means with k estimated on a sample; the
+        sample sizes used are reported in the cluster info.
+        """
         if config is None:
             config = SimilarityConfig()
         
         loop = asyncio.get_event_loop()
         
         def perform_clustering():
+            k = n_clusters
             if config.clustering_algorithm == "kmeans":
-                if n_clusters is None:
+                if len(embeddings) > config.scalable_clustering_threshold:
+                    return self._cluster_minibatch(embeddings, k, config)
+                
+                if k is None:
                     # Estimate optimal clusters using elbow method
-                    n_clusters = self._estimate_optimal_clusters(embeddings)
+                    k = self._estimate_optimal_clusters(embeddings)
                 
                 clusterer = KMeans(
-                    n_clusters=n_clusters,
+                    n_clusters=k,
                     random_state=42,
                     n_init=10
                 )
                 labels = clusterer.fit_predict(embeddings)
                 
                 cluster_info = {
-                    "n_clusters": n_clusters,
+                    "n_clusters": k,
                     "centers": clusterer.cluster_centers_,
                     "inertia": clusterer.inertia_
                 }
@@ -317,7 +1277,7 @@ class SimilarityEngine:
                 labels = clusterer.fit_predict(embeddings)
                 
                 unique_labels = set(labels) - {-1}
-                n_clusters = len(unique_labels)
+                k = len(unique_labels)
                 
                 # Calculate cluster centers
                 centers = []
@@ -327,17 +1287,20 @@ class SimilarityEngine:
                     centers.append(center)
                 
                 cluster_info = {
-                    "n_clusters": n_clusters,
+                    "n_clusters": k,
                     "centers": np.array(centers) if centers else np.array([]),
                     "n_noise": np.sum(labels == -1)
                 }
             
             else:  # hierarchical
-                if n_clusters is None:
-                    n_clusters = self._estimate_optimal_clusters(embeddings)
+                if k is None:
+                    if len(embeddings) > config.scalable_clustering_threshold:
+                        k, _ = self._estimate_clusters_sampled(embeddings, config)
+                    else:
+                        k = self._estimate_optimal_clusters(embeddings)
                 
                 clusterer = AgglomerativeClustering(
-                    n_clusters=n_clusters,
+                    n_clusters=k,
                     linkage="average",
                     metric="cosine" if config.metric == "cosine" else "euclidean"
                 )
@@ -345,13 +1308,13 @@ class SimilarityEngine:
                 
                 # Calculate cluster centers
                 centers = []
-                for i in range(n_clusters):
+                for i in range(k):
                     mask = labels == i
                     center = embeddings[mask].mean(axis=0)
                     centers.append(center)
                 
                 cluster_info = {
-                    "n_clusters": n_clusters,
+                    "n_clusters": k,
                     "centers": np.array(centers)
                 }
             
@@ -363,6 +1326,79 @@ class SimilarityEngine:
         
         return labels, cluster_info
     
+    def _cluster_minibatch(
+        self,
+        embeddings: np.ndarray,
+        n_clusters: Optional[int],
+        config: SimilarityConfig
+    ) -> Tuple[np.ndarray, Dict[str, Any]]:
+        """Mini-batch k-means over all vectors, with k estimated on a sample"""
+        estimation = {}
+        if n_clusters is None:
+            n_clusters, estimation = self._estimate_clusters_sampled(embeddings, config)
+        
+        clusterer = MiniBatchKMeans(
+            n_clusters=n_clusters,
+            batch_size=config.kmeans_batch_size,
+            n_init=3,
+            random_state=42
+        )
+        labels = clusterer.fit_predict(embeddings)
+        
+        return labels, {
+            "n_clusters": n_clusters,
+            "centers": clusterer.cluster_centers_,
+            "inertia": clusterer.inertia_,
+            "algorithm": "minibatch_kmeans",
+            **estimation
+        }
+    
+    def _estimate_clusters_sampled(
+        self,
+        embeddings: np.ndarray,
+        config: SimilarityConfig,
+        max_clusters: int = 10
+    ) -> Tuple[int, Dict[str, Any]]:
+        """Pick k by silhouette score on a sample, for datasets too large to scan
+        
+        Each candidate is fitted with mini-batch k-means on
+        ``cluster_sample_size`` vectors and scored on a further
+        ``silhouette_sample_size`` subsample, so the cost is independent of
+        the dataset size.
+        """
+        from sklearn.metrics import silhouette_score
+        
+        rng = np.random.default_rng(42)
+        sample_size = min(config.cluster_sample_size, len(embeddings))
+        sample = embeddings[rng.choice(len(embeddings), sample_size, replace=False)]
+        max_clusters = min(max_clusters, sample_size - 1)
+        
+        best_k, best_score = 2, -1.0
+        for k in range(2, max_clusters + 1):
+            labels = MiniBatchKMeans(
+                n_clusters=k,
+                batch_size=config.kmeans_batch_size,
+                n_init=3,
+                random_state=42
+            ).fit_predict(sample)
+            if len(np.unique(labels)) < 2:
+                continue
+            score = silhouette_score(
+                sample,
+                labels,
+                metric="cosine" if config.metric == "cosine" else "euclidean",
+                sample_size=min(config.silhouette_sample_size, sample_size),
+                random_state=42
+            )
+            if score > best_score:
+                best_k, best_score = k, float(score)
+        
+        return best_k, {
+            "estimation_sample_size": sample_size,
+            "silhouette_sample_size": min(config.silhouette_sample_size, sample_size),
+            "silhouette_score": best_score
+        }
+    
     def _estimate_optimal_clusters(
         self,
         embeddings: np.ndarray,
@@ -412,9 +1448,27 @@ class SimilarityEngine:
         self,
         embeddings: np.ndarray,
         n_components: int = 3,
-        method: str = "pca"
+        method: str = "pca",
+        index_name: Optional[str] = None
     ) -> np.ndarray:
-        """Reduce embedding dimensions for visualization"""
+        """Reduce embedding dimensions for visualization
+        
+        With ``index_name`` (pca or umap) a reducer is fitted once per index,
+        persisted, and reused to project new embeddings; it is refitted in
+        the background when the embeddings drift away from the fitted data.
+        """
+        if index_name is not None and method in ("pca", "umap"):
+            reducer = self.get_reducer(index_name, n_components, method)
+            if reducer.fitted:
+                reduced = reducer.transform(embeddings)
+                if reducer.needs_refresh:
+                    self.executor.submit(self._refresh_reducer, index_name, reducer)
+                return reduced
+            
+            reducer.fit(embeddings)
+            self._save_reducer(index_name, reducer)
+            return reducer.transform(embeddings, observe=False)
+        
         if method == "pca":
             reducer = PCA(n_components=n_components)
             reduced = reducer.fit_transform(embeddings)
@@ -436,9 +1490,47 @@ class SimilarityEngine:
         
         return reduced
     
+    def get_reducer(self, index_name: str, n_components: int = 3, method: str = "pca") -> FittedReducer:
+        """Reducer for an index, loaded from disk on first use"""
+        key = (index_name, method, n_components)
+        with self._reducer_lock:
+            reducer = self.reducers.get(key)
+            if reducer is None:
+                reducer = self._load_reducer(index_name, n_components, method)
+                self.reducers[key] = reducer
+            return reducer
+    
+    def _load_reducer(self, index_name: str, n_components: int, method: str) -> FittedReducer:
+        try:
+            path = self.index_store.reducer_path(index_name, method, n_components)
+            if path is not None:
+                reducer = FittedReducer.load(path)
+                if reducer.method == method and reducer.n_components == n_components:
+                    return reducer
+        except Exception as e:
+            logger.warning(f"Failed to load reducer for index '{index_name}': {e}")
+        return FittedReducer(n_components=n_components, method=method)
+    
+    def _save_reducer(self, index_name: str, reducer: FittedReducer):
+        try:
+            self.index_store.save_reducer(index_name, reducer)
+        except Exception as e:
+            logger.warning(f"Failed to save reducer for index '{index_name}': {e}")
+    
+    def _refresh_reducer(self, index_name: str, reducer: FittedReducer):
+        """Background refit after drift; the old fit serves until it finishes"""
+        try:
+            if reducer.refresh():
+                self._save_reducer(index_name, reducer)
+        except Exception as e:
+            logger.warning(f"Failed to refresh reducer for index '{index_name}': {e}")
+    
     def cleanup(self):
         """Clean up resources"""
         self.indices.clear()
         self.metadata_store.clear()
+        self.evicted.clear()
         self.executor.shutdown(wait=True)
+        if self.shards is not None:
+            self.shards.close()
         logger.info("Similarity engine cleaned up")
\ No newline at end of file
@@ -0,0 +1,237 @@
+"""
+Sparse Graph Backend
+CSR adjacency with integer node ids for memory-efficient mesh analytics
+"""
+
+import logging
+from typing import List, Dict, Any, Optional, Union
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components, shortest_path
+import networkx as nx
+
+logger = logging.getLogger(__name__)
+
+
+class SparseGraph:
+    """Undirected weighted graph stored as a symmetric CSR matrix
+    
+    Node ids are mapped to contiguous integers; per-node values (e.g.
+    PageRank, community) live in arrays in ``node_values``. NetworkX is only
+    used as an export format via ``to_networkx``.
+    """
+    
+    def __init__(self, node_ids: List[str], adjacency: sp.csr_matrix):
+        self.node_ids = list(node_ids)
+        self.node_index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        self.adjacency = adjacency
+        self.node_values: Dict[str, np.ndarray] = {}
+    
+    @classmethod
+    def from_edges(
+        cls,
+        node_ids: List[str],
+        rows: np.ndarray,
+        cols: np.ndarray,
+        weights: np.ndarray
+    ) -> "SparseGraph":
+        """Build from (possibly duplicated, one-directional) edge arrays"""
+        n = len(node_ids)
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float32)
+        
+        # Canonicalise (u, v) so each undirected edge is kept once
+        low = np.minimum(rows, cols)
+        high = np.maximum(rows, cols)
+        _, first = np.unique(low * n + high, return_index=True)
+        low, high, weights = low[first], high[first], weights[first]
+        
+        off_diagonal = low != high
+        adjacency = sp.coo_matrix(
+            (
+                np.concatenate([weights, weights[off_diagonal]]),
+                (
+                    np.concatenate([low, high[off_diagonal]]),
+                    np.concatenate([high, low[off_diagonal]])
+                )
+            ),
+            shape=(n, n)
+        ).tocsr()
+        
+        return cls(node_ids, adjacency)
+    
+    @classmethod
+    def from_networkx(cls, graph: nx.Graph, weight: str = "weight") -> "SparseGraph":
+        """Snapshot a NetworkX graph"""
+        node_ids = list(graph.nodes())
+        node_index = {node_id: i for i, node_id in enumerate(node_ids)}
+        edges = [
+            (node_index[u], node_index[v], w)
+            for u, v, w in graph.edges(data=weight, default=1.0)
+        ]
+        rows, cols, weights = zip(*edges) if edges else ((), (), ())
+        return cls.from_edges(node_ids, rows, cols, weights)
+    
+    def number_of_nodes(self) -> int:
+        return len(self.node_ids)
+    
+    def number_of_edges(self) -> int:
+        self_loops = int(np.count_nonzero(self.adjacency.diagonal()))
+        return (self.adjacency.nnz - self_loops) // 2 + self_loops
+    
+    def degrees(self, weighted: bool = False) -> np.ndarray:
+        """Node degrees (edge counts, or summed weights if ``weighted``)"""
+        if weighted:
+            return np.asarray(self.adjacency.sum(axis=1)).ravel()
+        return np.diff(self.adjacency.indptr)
+    
+    def density(self) -> float:
+        n = self.number_of_nodes()
+        if n <= 1:
+            return 0.0
+        return 2.0 * self.number_of_edges() / (n * (n - 1))
+    
+    def subgraph_density(self, members: List[str]) -> float:
+        """Density of the subgraph induced by ``members``"""
+        idx = np.array([self.node_index[m] for m in members if m in self.node_index], dtype=np.int64)
+        n = len(idx)
+        if n <= 1:
+            return 0.0
+        sub = self.adjacency[idx][:, idx]
+        self_loops = int(np.count_nonzero(sub.diagonal()))
+        edges = (sub.nnz - self_loops) // 2 + self_loops
+        return 2.0 * edges / (n * (n - 1))
+    
+    def neighbors(self, node_id: str) -> List[str]:
+        i = self.node_index[node_id]
+        start, end = self.adjacency.indptr[i], self.adjacency.indptr[i + 1]
+        return [self.node_ids[j] for j in self.adjacency.indices[start:end]]
+    
+    def component_labels(self) -> np.ndarray:
+        """Connected component label per node"""
+        _, labels = connected_components(self.adjacency, directed=False)
+        return labels
+    
+    def connected_components(self) -> List[List[str]]:
+        """Connected components as lists of node ids"""
+        labels = self.component_labels()
+        order = np.argsort(labels, kind="stable")
+        boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+        return [
+            [self.node_ids[i] for i in group]
+            for group in np.split(order, boundaries)
+            if len(group)
+        ]
+    
+    def number_connected_components(self) -> int:
+        if self.number_of_nodes() == 0:
+            return 0
+        n_components, _ = connected_components(self.adjacency, directed=False)
+        return int(n_components)
+    
+    def pagerank(
+        self,
+        alpha: float = 0.85,
+        personalization: Optional[Dict[str, float]] = None,
+        nstart: Optional[Union[Dict[str, float], np.ndarray]] = None,
+        max_iter: int = 100,
+        tol: float = 1.0e-6
+    ) -> np.ndarray:
+        """Weighted PageRank by vectorised power iteration
+        
+        Mirrors ``networkx.pagerank``: dangling nodes redistribute their mass
+        according to the personalization vector. ``nstart`` warm-starts the
+        iteration from a previous score vector.
+        """
+        n = self.number_of_nodes()
+        if n == 0:
+            return np.zeros(0)
+        
+        out_weight = self.degrees(weighted=True)
+        dangling = out_weight == 0
+        inv_out = np.divide(1.0, out_weight, out=np.zeros(n), where=~dangling)
+        # Row-stochastic transition matrix
+        transition = sp.diags(inv_out) @ self.adjacency
+        
+        p = self._node_vector(personalization, default=1.0 / n)
+        x = self._node_vector(nstart, default=1.0 / n)
+        
+        for _ in range(max_iter):
+            x_last = x
+            x = alpha * (transition.T @ x_last + x_last[dangling].sum() * p) + (1 - alpha) * p
+            if np.abs(x - x_last).sum() < n * tol:
+                return x
+        
+        logger.warning(f"PageRank did not converge in {max_iter} iterations")
+        return x
+    
+    def _node_vector(
+        self,
+        values: Optional[Union[Dict[str, float], np.ndarray]],
+        default: float
+    ) -> np.ndarray:
+        """Normalised per-node vector from a dict/array, or uniform"""
+        n = self.number_of_nodes()
+        if values is None:
+            return np.full(n, default)
+        if isinstance(values, dict):
+            vector = np.array([values.get(node_id, 0.0) for node_id in self.node_ids], dtype=np.float64)
+        else:
+            vector = np.asarray(values, dtype=np.float64)
+        total = vector.sum()
+        if total <= 0:
+            return np.full(n, default)
+        return vector / total
+    
+    def modularity(self, labels: np.ndarray) -> float:
+        """Weighted modularity of a community labelling"""
+        total = self.adjacency.sum()
+        if total == 0:
+            return 0.0
+        
+        labels = np.asarray(labels)
+        coo = self.adjacency.tocoo()
+        internal = coo.data[labels[coo.row] == labels[coo.col]].sum()
+        strength = self.degrees(weighted=True)
+        _, inverse = np.unique(labels, return_inverse=True)
+        community_strength = np.bincount(inverse, weights=strength)
+        
+        return float(internal / total - np.sum((community_strength / total) ** 2))
+    
+    def eccentricities(self, chunk_size: int = 256) -> np.ndarray:
+        """Unweighted eccentricity per node, computed in BFS batches"""
+        n = self.number_of_nodes()
+        result = np.zeros(n)
+        for start in range(0, n, chunk_size):
+            distances = shortest_path(
+                self.adjacency,
+                directed=False,
+                unweighted=True,
+                indices=np.arange(start, min(start + chunk_size, n))
+            )
+            result[start:start + chunk_size] = distances.max(axis=1)
+        return result
+    
+    def to_networkx(
+        self,
+        node_attrs: Optional[Dict[str, Dict[str, Any]]] = None,
+        edge_type: str = "semantic"
+    ) -> nx.Graph:
+        """Export to NetworkX, attaching per-node attributes and values"""
+        graph = nx.Graph()
+        for i, node_id in enumerate(self.node_ids):
+            attrs = dict(node_attrs.get(node_id, {})) if node_attrs else {}
+            for name, values in self.node_values.items():
+                value = values[i]
+                if name == "community" and value < 0:
+                    continue
+                attrs[name] = value.item()
+            graph.add_node(node_id, **attrs)
+        
+        upper = sp.triu(self.adjacency).tocoo()
+        graph.add_edges_from(
+            (self.node_ids[u], self.node_ids[v], {"weight": float(w), "edge_type": edge_type})
+            for u, v, w in zip(upper.row.tolist(), upper.col.tolist(), upper.data.tolist())
+        )
+        return graph
\ No newline at end of file
@@ -0,0 +1,133 @@
+"""
+Stage Executor
+Runs a small DAG of analysis stages concurrently, yielding results as they finish
+"""
+
+import asyncio
+import inspect
+import logging
+import time
+from typing import List, Dict, Any, Callable, Optional, AsyncIterator, Sequence
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from prometheus_client import Histogram
+
+logger = logging.getLogger(__name__)
+
+
+stage_duration_histogram = Histogram(
+    'ml_analysis_stage_duration_seconds',
+    'Duration of each semantic analysis stage',
+    ['stage'],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+
+
+@dataclass
+class Stage:
+    """A unit of work; ``fn`` receives its dependencies' results as kwargs"""
+    name: str
+    fn: Callable[..., Any]  # May return a value or an awaitable
+    depends_on: List[str] = field(default_factory=list)
+
+
+@dataclass
+class StageResult:
+    name: str
+    value: Any
+    duration: float  # Seconds spent in the stage itself
+    elapsed: float  # Seconds since the run started
+
+
+class StageExecutor:
+    """Dependency-aware executor for analysis stages
+    
+    Every stage starts as soon as all of its dependencies have finished, so
+    independent stages overlap. CPU-heavy synchronous work should go through
+    ``run_cpu``, which bounds it to a shared worker pool instead of blocking
+    the event loop.
+    """
+    
+    def __init__(self, max_workers: Optional[int] = None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis-stage")
+    
+    async def run_cpu(self, fn: Callable[..., Any], *args) -> Any:
+        """Run synchronous CPU-bound work on the worker pool"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, fn, *args)
+    
+    @staticmethod
+    def _validate(stages: Sequence[Stage]):
+        names = [stage.name for stage in stages]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate stage names: {names}")
+        
+        dependencies = {stage.name: set(stage.depends_on) for stage in stages}
+        for name, depends_on in dependencies.items():
+            unknown = depends_on - dependencies.keys()
+            if unknown:
+                raise ValueError(f"Stage {name} depends on unknown stages: {sorted(unknown)}")
+        
+        # Kahn's algorithm: anything left unresolved is part of a cycle
+        resolved = set()
+        while len(resolved) < len(dependencies):
+            ready = {name for name, depends_on in dependencies.items()
+                     if name not in resolved and depends_on <= resolved}
+            if not ready:
+                raise ValueError(f"Stage dependencies form a cycle: {sorted(dependencies.keys() - resolved)}")
+            resolved |= ready
+    
+    async def run(self, stages: Sequence[Stage]) -> AsyncIterator[StageResult]:
+        """Execute stages, yielding each result as soon as it is available
+        
+        The first failing stage cancels everything still running and its
+        exception is raised to the consumer.
+        """
+        self._validate(stages)
+        loop = asyncio.get_event_loop()
+        started = time.perf_counter()
+        outputs: Dict[str, asyncio.Future] = {stage.name: loop.create_future() for stage in stages}
+        finished: asyncio.Queue = asyncio.Queue()
+        
+        async def run_stage(stage: Stage):
+            try:
+                kwargs = {name: await outputs[name] for name in stage.depends_on}
+                stage_started = time.perf_counter()
+                value = stage.fn(**kwargs)
+                if inspect.isawaitable(value):
+                    value = await value
+                duration = time.perf_counter() - stage_started
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                outputs[stage.name].set_exception(e)
+                outputs[stage.name].exception()  # Consumed via the queue
+                await finished.put((stage.name, e))
+                return
+            
+            stage_duration_histogram.labels(stage=stage.name).observe(duration)
+            outputs[stage.name].set_result(value)
+            await finished.put(StageResult(
+                name=stage.name,
+                value=value,
+                duration=duration,
+                elapsed=time.perf_counter() - started
+            ))
+        
+        tasks = [loop.create_task(run_stage(stage)) for stage in stages]
+        try:
+            for _ in stages:
+                item = await finished.get()
+                if isinstance(item, tuple):
+                    name, error = item
+                    logger.error(f"Analysis stage {name} failed: {error}")
+                    raise error
+                yield item
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
\ No newline at end of file
@@ -0,0 +1,236 @@
+"""
+Term Statistics
+Per-tenant document frequencies over hashed terms, with a cached LSI model
+"""
+
+import logging
+import threading
+from typing import List, Tuple, Optional
+from collections import OrderedDict
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+
+from .incremental_state import JoblibState, SeenDigests, doc_key
+
+logger = logging.getLogger(__name__)
+
+
+class TermStatistics(JoblibState):
+    """Corpus term statistics maintained incrementally as content arrives
+    
+    Terms are hashed into ``n_features`` columns, so document frequencies
+    are one ``uint32`` array with no vocabulary to refit, and IDF weights
+    only move as the tenant's corpus grows. Term counts of the most recent
+    ``max_cached_docs`` documents are kept as the term-document matrix for
+    LSI: a truncated SVD over its TF-IDF rows, restricted to the columns
+    that occur, refitted by ``refresh_lsi`` once the corpus has grown by
+    ``refit_growth`` since the last fit. ``generation`` counts the fits.
+    
+    Documents are counted once: every content hash is recorded in ``seen``,
+    independent of the term-matrix cache, so re-crawls of documents evicted
+    from it do not inflate the frequencies.
+    """
+    
+    def __init__(
+        self,
+        n_features: int = 2 ** 18,
+        n_components: int = 64,
+        max_cached_docs: int = 20000,
+        min_lsi_documents: int = 50,
+        refit_growth: float = 0.1,
+        random_state: int = 42
+    ):
+        self.n_features = n_features
+        self.n_components = n_components
+        self.max_cached_docs = max_cached_docs
+        self.min_lsi_documents = min_lsi_documents
+        self.refit_growth = refit_growth
+        self.random_state = random_state
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            stop_words='english',
+            alternate_sign=False,
+            norm=None
+        )
+        self._analyzer = self.vectorizer.build_analyzer()
+        
+        self.document_frequency = np.zeros(n_features, dtype=np.uint32)
+        self.documents_seen = 0
+        # Every document counted, beyond the doc_terms cache
+        self.seen = SeenDigests()
+        # Content hash -> (columns, counts) of the document's terms
+        self.doc_terms: "OrderedDict[str, Tuple[np.ndarray, np.ndarray]]" = OrderedDict()
+        
+        self.lsi_columns: Optional[np.ndarray] = None  # sorted hashed columns
+        self.term_vectors: Optional[np.ndarray] = None  # unit rows, one per column
+        self.lsi_documents = 0
+        self.generation = 0
+        self._lock = threading.Lock()
+    
+    def update(self, texts: List[str]) -> int:
+        """Count documents not seen before; returns how many were new"""
+        with self._lock:
+            batch = {}
+            for text in texts:
+                key = doc_key(text)
+                if key in self.doc_terms:
+                    self.doc_terms.move_to_end(key)
+                else:
+                    batch.setdefault(key, text)
+            
+            new_texts = {key: batch[key] for key in self.seen.unseen(list(batch))}
+            if not new_texts:
+                return 0
+            self.seen.add(list(new_texts))
+            
+            counts = self.vectorizer.transform(list(new_texts.values())).tocsr()
+            counts.sum_duplicates()
+            self.document_frequency += np.bincount(
+                counts.indices, minlength=self.n_features
+            ).astype(np.uint32)
+            self.documents_seen += len(new_texts)
+            
+            for key, start, end in zip(new_texts, counts.indptr[:-1], counts.indptr[1:]):
+                self.doc_terms[key] = (
+                    counts.indices[start:end].astype(np.int32),
+                    counts.data[start:end].astype(np.float32)
+                )
+                self.doc_terms.move_to_end(key)
+            while len(self.doc_terms) > self.max_cached_docs:
+                self.doc_terms.popitem(last=False)
+            
+            return len(new_texts)
+    
+    def idf(self, columns: Optional[np.ndarray] = None) -> np.ndarray:
+        """Smoothed inverse document frequency, as in sklearn's TfidfTransformer"""
+        df = self.document_frequency if columns is None else self.document_frequency[columns]
+        return np.log((1.0 + self.documents_seen) / (1.0 + df)) + 1.0
+    
+    @property
+    def lsi_stale(self) -> bool:
+        if len(self.doc_terms) < self.min_lsi_documents:
+            return False
+        if self.term_vectors is None:
+            return True
+        return self.documents_seen > self.lsi_documents * (1 + self.refit_growth)
+    
+    def refresh_lsi(self, force: bool = False) -> bool:
+        """Refit the truncated SVD if the corpus has grown enough"""
+        if not (force or self.lsi_stale) or len(self.doc_terms) < 2:
+            return False
+        
+        with self._lock:
+            rows = list(self.doc_terms.values())
+            documents_seen = self.documents_seen
+            idf = self.idf()
+        
+        columns = np.unique(np.concatenate([indices for indices, _ in rows]))
+        indptr = np.concatenate([[0], np.cumsum([len(indices) for indices, _ in rows])])
+        matrix = sp.csr_matrix(
+            (
+                np.concatenate([counts for _, counts in rows]),
+                np.searchsorted(columns, np.concatenate([indices for indices, _ in rows])),
+                indptr
+            ),
+            shape=(len(rows), len(columns))
+        )
+        matrix = normalize(matrix.multiply(idf[columns]).tocsr())
+        
+        n_components = min(self.n_components, len(rows) - 1, len(columns) - 1)
+        if n_components < 1:
+            return False
+        svd = TruncatedSVD(n_components=n_components, random_state=self.random_state)
+        svd.fit(matrix)
+        
+        # Terms in the latent space, weighted by the singular values
+        term_vectors = (svd.components_.T * svd.singular_values_).astype(np.float32)
+        term_vectors = normalize(term_vectors)
+        
+        with self._lock:
+            self.lsi_columns, self.term_vectors = columns, term_vectors
+            self.lsi_documents = documents_seen
+            self.generation += 1
+        logger.info(f"Fitted LSI with {n_components} components over {len(rows)} documents")
+        return True
+    
+    def _columns(self, terms: List[str]) -> np.ndarray:
+        """Hashed column of each term (terms are already analysed)"""
+        if not terms:
+            return np.zeros(0, dtype=np.int64)
+        # One term per row, so each row's single column is that term's hash
+        term_matrix = self.vectorizer.transform(terms).tocsr()
+        return term_matrix.indices.astype(np.int64)
+    
+    @staticmethod
+    def _lookup(
+        lsi_columns: np.ndarray,
+        term_vectors: np.ndarray,
+        columns: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """LSI vectors of the columns the model knows, and which those are"""
+        positions = np.searchsorted(lsi_columns, columns)
+        positions = np.minimum(positions, len(lsi_columns) - 1)
+        known = lsi_columns[positions] == columns
+        return term_vectors[positions[known]], known
+    
+    def related_terms(
+        self,
+        text: str,
+        keywords: List[str],
+        top_n: int = 10,
+        max_candidates: int = 50,
+        min_similarity: float = 0.3
+    ) -> Optional[List[Tuple[str, float]]]:
+        """Terms of ``text`` most related to ``keywords`` in the LSI space
+        
+        Candidates are the document's terms with the highest TF-IDF under
+        the corpus statistics, ranked by their cosine similarity to the
+        closest keyword. Returns None while there is no LSI model or none
+        of the keywords' terms is known to it.
+        """
+        with self._lock:
+            lsi_columns, term_vectors = self.lsi_columns, self.term_vectors
+        if term_vectors is None:
+            return None
+        
+        keyword_terms = set()
+        keyword_vectors = []
+        for keyword in keywords:
+            terms = self._analyzer(keyword)
+            keyword_terms.update(terms)
+            vectors, _ = self._lookup(lsi_columns, term_vectors, self._columns(terms))
+            if len(vectors):
+                keyword_vectors.append(vectors.mean(axis=0))
+        if not keyword_vectors:
+            return None
+        keyword_vectors = normalize(np.vstack(keyword_vectors))
+        
+        term_counts = {}
+        for term in self._analyzer(text):
+            if len(term) > 3 and term.isalpha() and term not in keyword_terms:
+                term_counts[term] = term_counts.get(term, 0) + 1
+        if not term_counts:
+            return []
+        
+        terms = list(term_counts)
+        columns = self._columns(terms)
+        weights = np.array([term_counts[term] for term in terms]) * self.idf(columns)
+        order = np.argsort(-weights, kind='stable')[:max_candidates]
+        terms = [terms[i] for i in order]
+        
+        vectors, known = self._lookup(lsi_columns, term_vectors, columns[order])
+        terms = [term for term, is_known in zip(terms, known) if is_known]
+        if not terms:
+            return []
+        similarities = (vectors @ keyword_vectors.T).max(axis=1)
+        
+        related = [
+            (term, float(similarity))
+            for term, similarity in zip(terms, similarities)
+            if similarity >= min_similarity
+        ]
+        related.sort(key=lambda x: x[1], reverse=True)
+        return related[:top_n]
@@ -0,0 +1,153 @@
+"""
+Three.js Binary Export
+Typed-array buffer layout for large network visualizations
+"""
+
+import json
+import struct
+import logging
+from typing import List, Dict, Any, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+MAGIC = b"TJSB"
+FORMAT_VERSION = 1
+
+# magic, version, flags (reserved), section count, node count, edge count
+HEADER = struct.Struct("<4sBBHII")
+# name, dtype, components, reserved, byte offset, byte length
+SECTION = struct.Struct("<4sBBHII")
+ALIGNMENT = 8
+
+# Section dtypes
+FLOAT32 = 0
+UINT8 = 1
+UINT32 = 2
+STRINGS = 3  # uint32 offsets (count + 1), then UTF-8 bytes
+JSON = 4
+
+NUMPY_DTYPES = {FLOAT32: np.float32, UINT8: np.uint8, UINT32: np.uint32}
+
+MEDIA_TYPE = "application/vnd.threejs-mesh+binary"
+
+
+def _string_table(values: List[str]) -> bytes:
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+    return offsets.tobytes() + b"".join(encoded)
+
+
+def encode_threejs_buffers(
+    positions: np.ndarray,
+    colors: np.ndarray,
+    sizes: np.ndarray,
+    edges: np.ndarray,
+    edge_weights: np.ndarray,
+    labels: List[str],
+    node_ids: List[str],
+    metadata: Optional[Dict[str, Any]] = None
+) -> bytes:
+    """Pack a network into one buffer of aligned, typed sections
+    
+    Layout: a 16-byte header, a table of 16-byte section entries, then the
+    sections in this order, each starting on an 8-byte boundary so it can
+    be viewed as a typed array without copying:
+    
+    - ``POSN`` float32 x 3 (x, y, z per node)
+    - ``COLR`` uint8 x 3 (RGB per node)
+    - ``SIZE`` float32 per node
+    - ``EDGE`` uint32 x 2 (source, target node index)
+    - ``EWGT`` float32 per edge
+    - ``LABL`` / ``NIDS`` string tables of labels and node ids
+    - ``META`` UTF-8 JSON
+    
+    Geometry comes first, so a client can render from a prefix of the
+    payload (fetched with HTTP ranges) before labels arrive.
+    """
+    positions = np.asarray(positions, dtype=np.float32).reshape(len(node_ids), -1)
+    colors = np.asarray(colors, dtype=np.uint8).reshape(len(node_ids), 3)
+    edges = np.asarray(edges, dtype=np.uint32).reshape(-1, 2)
+    
+    sections = [
+        (b"POSN", FLOAT32, positions.shape[1], positions.tobytes()),
+        (b"COLR", UINT8, 3, colors.tobytes()),
+        (b"SIZE", FLOAT32, 1, np.asarray(sizes, dtype=np.float32).tobytes()),
+        (b"EDGE", UINT32, 2, edges.tobytes()),
+        (b"EWGT", FLOAT32, 1, np.asarray(edge_weights, dtype=np.float32).tobytes()),
+        (b"LABL", STRINGS, 1, _string_table(labels)),
+        (b"NIDS", STRINGS, 1, _string_table(node_ids)),
+        (b"META", JSON, 1, json.dumps(metadata or {}).encode("utf-8"))
+    ]
+    
+    offset = HEADER.size + SECTION.size * len(sections)
+    table = []
+    body = []
+    for name, dtype, components, payload in sections:
+        padding = -offset % ALIGNMENT
+        body.append(b"\0" * padding)
+        offset += padding
+        table.append(SECTION.pack(name, dtype, components, 0, offset, len(payload)))
+        body.append(payload)
+        offset += len(payload)
+    
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(sections), len(node_ids), len(edges))
+    return header + b"".join(table) + b"".join(body)
+
+
+def read_threejs_header(data: bytes) -> Dict[str, Any]:
+    """Parse the header and section table (the first 16 * (n + 1) bytes)"""
+    if len(data) < HEADER.size:
+        raise ValueError("Three.js payload is shorter than its header")
+    magic, version, _, section_count, node_count, edge_count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a Three.js binary payload")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Unsupported Three.js payload version {version}")
+    if len(data) < HEADER.size + SECTION.size * section_count:
+        raise ValueError("Three.js payload is shorter than its section table")
+    
+    sections = {}
+    for i in range(section_count):
+        name, dtype, components, _, offset, length = SECTION.unpack_from(
+            data, HEADER.size + SECTION.size * i
+        )
+        sections[name.decode("ascii")] = {
+            "dtype": dtype,
+            "components": components,
+            "offset": offset,
+            "length": length
+        }
+    return {
+        "version": version,
+        "node_count": node_count,
+        "edge_count": edge_count,
+        "sections": sections
+    }
+
+
+def decode_threejs_buffers(data: bytes) -> Dict[str, Any]:
+    """Decode every section: arrays for numeric ones, lists/dicts otherwise"""
+    header = read_threejs_header(data)
+    decoded = {}
+    for name, section in header["sections"].items():
+        payload = memoryview(data)[section["offset"]:section["offset"] + section["length"]]
+        if section["dtype"] in NUMPY_DTYPES:
+            values = np.frombuffer(payload, dtype=NUMPY_DTYPES[section["dtype"]])
+            decoded[name] = values.reshape(-1, section["components"]) if section["components"] > 1 else values
+        elif section["dtype"] == STRINGS:
+            # String tables hold one entry per node
+            count = header["node_count"]
+            offsets = np.frombuffer(payload, dtype=np.uint32, count=count + 1)
+            strings = bytes(payload[4 * (count + 1):])
+            decoded[name] = [
+                strings[start:end].decode("utf-8")
+                for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())
+            ]
+        elif section["dtype"] == JSON:
+            decoded[name] = json.loads(bytes(payload).decode("utf-8"))
+        else:
+            logger.warning(f"Skipping Three.js section {name} with unknown dtype {section['dtype']}")
+    return decoded
\ No newline at end of file
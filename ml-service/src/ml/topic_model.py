@@ -0,0 +1,172 @@
+"""
+Incremental Topic Model
+Online LDA/NMF over hashed term counts, updated as new documents arrive
+"""
+
+import logging
+import threading
+from typing import List, Dict, Any
+from collections import OrderedDict
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.decomposition import LatentDirichletAllocation, MiniBatchNMF
+
+from .incremental_state import JoblibState, SeenDigests, doc_key
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalTopicModel(JoblibState):
+    """Per-tenant topic model that learns from each new document once
+    
+    Documents are vectorised with a ``HashingVectorizer``, so there is no
+    vocabulary to refit; the model is updated with ``partial_fit`` (online
+    LDA or mini-batch NMF) on documents it has not seen before, keyed by a
+    content hash. Every hash is recorded in ``seen``, so documents are
+    learnt from once even after their doc-topic row has left the cache of
+    ``max_cached_docs`` rows; evicted rows are
+    recomputed with the current model when asked for again. Cached rows
+    are not recomputed as the topics drift, so very old rows reflect the
+    model at the time they were first seen. Topic words are
+    looked up in a table of at most one term per hashed column; the set of
+    terms already hashed into it is reset once it holds ``max_named_terms``.
+    """
+    
+    def __init__(
+        self,
+        n_topics: int = 20,
+        method: str = "lda",
+        n_features: int = 2 ** 15,
+        max_cached_docs: int = 100000,
+        max_named_terms: int = 100000,
+        random_state: int = 42
+    ):
+        if method not in ("lda", "nmf"):
+            raise ValueError(f"Unsupported incremental topic model: {method}")
+        
+        self.n_topics = n_topics
+        self.method = method
+        self.max_cached_docs = max_cached_docs
+        self.max_named_terms = max_named_terms
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            stop_words='english',
+            alternate_sign=False,
+            # LDA models raw counts; NMF works better on normalised tf
+            norm=None if method == "lda" else 'l2'
+        )
+        self._analyzer = self.vectorizer.build_analyzer()
+        
+        if method == "lda":
+            self.model = LatentDirichletAllocation(
+                n_components=n_topics,
+                learning_method='online',
+                total_samples=max_cached_docs,
+                random_state=random_state
+            )
+        else:
+            # Default init uses NNDSVDa unless the first batch is too small
+            self.model = MiniBatchNMF(
+                n_components=n_topics,
+                random_state=random_state
+            )
+        
+        # Hashed column -> a term that maps to it, for readable topic words;
+        # at most n_features entries
+        self.feature_names: Dict[int, str] = {}
+        # Terms already hashed into feature_names, so they are not hashed again
+        self._named_terms = set()
+        self.doc_topics: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        # Every document learnt from, beyond the doc_topics cache
+        self.seen = SeenDigests()
+        self.documents_seen = 0
+        self.fitted = False
+        self._lock = threading.Lock()
+    
+    def _cache_rows(self, keys: List[str], rows: np.ndarray):
+        for key, row in zip(keys, rows):
+            self.doc_topics[key] = row
+            self.doc_topics.move_to_end(key)
+        while len(self.doc_topics) > self.max_cached_docs:
+            self.doc_topics.popitem(last=False)
+    
+    def _record_feature_names(self, texts: List[str]):
+        terms = sorted({
+            term for text in texts for term in self._analyzer(text)
+            if term not in self._named_terms
+        })
+        if not terms:
+            return
+        if len(self._named_terms) + len(terms) > self.max_named_terms:
+            self._named_terms.clear()
+        self._named_terms.update(terms)
+        # One term per row, so each row's single column is that term's hash
+        term_matrix = self.vectorizer.transform(terms).tocsr()
+        for term, start, end in zip(terms, term_matrix.indptr[:-1], term_matrix.indptr[1:]):
+            if end > start:
+                self.feature_names.setdefault(int(term_matrix.indices[start]), term)
+    
+    def update(self, texts: List[str]) -> int:
+        """Fit on documents not seen before; returns how many were new"""
+        with self._lock:
+            batch = {}
+            for text in texts:
+                key = doc_key(text)
+                if key not in self.doc_topics:
+                    batch.setdefault(key, text)
+            
+            new_texts = {key: batch[key] for key in self.seen.unseen(list(batch))}
+            if not new_texts:
+                return 0
+            self.seen.add(list(new_texts))
+            
+            doc_term_matrix = self.vectorizer.transform(list(new_texts.values()))
+            self._record_feature_names(list(new_texts.values()))
+            self.model.partial_fit(doc_term_matrix)
+            self.fitted = True
+            self.documents_seen += len(new_texts)
+            
+            self._cache_rows(list(new_texts), self.model.transform(doc_term_matrix))
+            
+            return len(new_texts)
+    
+    def doc_topic_matrix(self, texts: List[str]) -> np.ndarray:
+        """Topic distribution per text, from the cache where possible"""
+        self.update(texts)
+        if not texts:
+            return np.zeros((0, self.n_topics))
+        
+        with self._lock:
+            rows = [self.doc_topics.get(doc_key(text)) for text in texts]
+            for text, row in zip(texts, rows):
+                if row is not None:
+                    self.doc_topics.move_to_end(doc_key(text))
+            missing = [i for i, row in enumerate(rows) if row is None]
+            if missing:
+                # Documents evicted from the cache, or more texts than it holds
+                recomputed = self.model.transform(
+                    self.vectorizer.transform([texts[i] for i in missing])
+                )
+                for i, row in zip(missing, recomputed):
+                    rows[i] = row
+                self._cache_rows([doc_key(texts[i]) for i in missing], recomputed)
+        return np.vstack(rows)
+    
+    def get_topics(self, top_n: int = 10) -> Dict[int, Dict[str, Any]]:
+        """Top (named) terms and weights per topic"""
+        topics = {}
+        if not self.fitted:
+            return topics
+        
+        named = np.fromiter(self.feature_names, dtype=np.int64)
+        for topic_idx, topic in enumerate(self.model.components_):
+            top_indices = named[np.argsort(topic[named])[::-1][:top_n]]
+            topics[topic_idx] = {
+                "words": [self.feature_names[i] for i in top_indices],
+                "weights": topic[top_indices].tolist()
+            }
+        return topics
+    
+    def __setstate__(self, state):
+        state.setdefault("max_named_terms", 100000)
+        super().__setstate__(state)
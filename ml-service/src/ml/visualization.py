@@ -10,10 +10,15 @@ from plotly.subplots import make_subplots
 import networkx as nx
 import json
 import logging
+import threading
 from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
+from collections import OrderedDict
 import colorsys
 
+from .force_layout import barnes_hut_layout
+from .threejs_binary import encode_threejs_buffers
+
 logger = logging.getLogger(__name__)
 
 
@@ -27,32 +32,62 @@ class VisualizationConfig:
     show_labels: bool = True
     dimensions: int = 3  # 2D or 3D
     export_format: str = "html"  # html, json, png
+    layout_iterations: int = 50
+    max_render_nodes: int = 2000  # Level of detail: larger graphs are decimated (0 disables)
+    threejs_format: str = "json"  # json, binary, both
 
 
 class VisualizationEngine:
     """Engine for creating semantic network visualizations"""
     
-    def __init__(self):
+    def __init__(self, max_cached_layouts: int = 64):
         self.color_palettes = {
             "default": px.colors.qualitative.Plotly,
             "semantic": px.colors.sequential.Viridis,
             "diverging": px.colors.diverging.RdBu
         }
+        
+        # Force layouts by key (tenant or mesh), reused and warm-started
+        self.max_cached_layouts = max_cached_layouts
+        self.layout_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._layout_lock = threading.Lock()
     
     def generate_3d_network(
         self,
         content_mesh,
-        config: Optional[VisualizationConfig] = None
+        config: Optional[VisualizationConfig] = None,
+        layout_key: Optional[str] = None
     ) -> Dict[str, Any]:
-        """Generate 3D network visualization data"""
+        """Generate 3D network visualization data
+        
+        Force layouts are cached under ``layout_key`` (default: the mesh
+        itself). An unchanged mesh reuses its positions; a changed one is
+        warm-started from them and only re-laid out around what changed.
+        Three.js data is returned as JSON (``threejs_data``) and/or packed
+        typed-array buffers (``threejs_binary``) per ``threejs_format``.
+        """
         if config is None:
             config = VisualizationConfig()
+        if config.threejs_format not in ("json", "binary", "both"):
+            raise ValueError(f"Unsupported Three.js format: {config.threejs_format}")
         
         # Get graph from content mesh
         graph = content_mesh.graph
+        level_of_detail = None
+        if config.max_render_nodes and graph.number_of_nodes() > config.max_render_nodes:
+            graph, level_of_detail = self._decimate_graph(graph, config.max_render_nodes)
         
         # Calculate layout
-        pos = self._calculate_layout(graph, config)
+        pos = self._calculate_layout(
+            graph,
+            config,
+            layout_key=layout_key or getattr(content_mesh, "mesh_id", None),
+            version=(
+                getattr(content_mesh, "mesh_id", None),
+                getattr(content_mesh, "version", None),
+                config.max_render_nodes
+            )
+        )
         
         # Prepare node data
         node_data = self._prepare_node_data(graph, pos, content_mesh, config)
@@ -63,32 +98,65 @@ class VisualizationEngine:
         # Create plotly figure
         fig = self._create_3d_figure(node_data, edge_data, config)
         
-        # Also prepare Three.js compatible data
-        threejs_data = self._prepare_threejs_data(node_data, edge_data, graph)
-        
-        return {
+        result = {
             "plotly_figure": fig,
-            "threejs_data": threejs_data,
             "layout_positions": pos
         }
+        
+        # Also prepare Three.js compatible data
+        if config.threejs_format in ("json", "both"):
+            threejs_data = self._prepare_threejs_data(node_data, edge_data, graph)
+            if level_of_detail:
+                threejs_data["metadata"].update(level_of_detail)
+            result["threejs_data"] = threejs_data
+        if config.threejs_format in ("binary", "both"):
+            result["threejs_binary"] = self._prepare_threejs_binary(node_data, graph, level_of_detail)
+        
+        return result
+    
+    def _decimate_graph(
+        self,
+        graph: nx.Graph,
+        max_nodes: int
+    ) -> Tuple[nx.Graph, Dict[str, Any]]:
+        """Keep the most central nodes, with at least one per community"""
+        if any('pagerank' in attrs for _, attrs in graph.nodes(data=True)):
+            scores = {node: attrs.get('pagerank', 0.0) for node, attrs in graph.nodes(data=True)}
+        else:
+            scores = dict(graph.degree(weight='weight'))
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        
+        keep = {}
+        for node in ranked:
+            keep.setdefault(graph.nodes[node].get('community', 0), node)
+        keep = list(keep.values())[:max_nodes]
+        kept = set(keep)
+        for node in ranked:
+            if len(keep) >= max_nodes:
+                break
+            if node not in kept:
+                keep.append(node)
+                kept.add(node)
+        
+        subgraph = graph.subgraph(keep)
+        return subgraph, {
+            "decimated": True,
+            "total_nodes": graph.number_of_nodes(),
+            "total_edges": graph.number_of_edges(),
+            "rendered_nodes": subgraph.number_of_nodes(),
+            "rendered_edges": subgraph.number_of_edges()
+        }
     
     def _calculate_layout(
         self,
         graph: nx.Graph,
-        config: VisualizationConfig
+        config: VisualizationConfig,
+        layout_key: Optional[str] = None,
+        version: Any = None
     ) -> Dict[str, np.ndarray]:
         """Calculate graph layout positions"""
         if config.layout_algorithm == "force":
-            if config.dimensions == 3:
-                # Use spring layout and add third dimension
-                pos_2d = nx.spring_layout(graph, k=1, iterations=50, weight='weight')
-                pos = {}
-                for node, (x, y) in pos_2d.items():
-                    z = np.random.uniform(-0.5, 0.5)
-                    pos[node] = np.array([x, y, z])
-            else:
-                pos = nx.spring_layout(graph, k=1, iterations=50, weight='weight')
-                pos = {node: np.array([x, y]) for node, (x, y) in pos.items()}
+            pos = self._force_layout(graph, config, layout_key, version)
         
         elif config.layout_algorithm == "kamada_kawai":
             pos = nx.kamada_kawai_layout(graph, weight='weight')
@@ -108,6 +176,123 @@ class VisualizationEngine:
         
         return pos
     
+    def _force_layout(
+        self,
+        graph: nx.Graph,
+        config: VisualizationConfig,
+        layout_key: Optional[str],
+        version: Any
+    ) -> Dict[str, np.ndarray]:
+        """Barnes-Hut force layout, reusing or warm-starting cached positions"""
+        nodes = list(graph.nodes())
+        neighbours = {node: frozenset(graph.neighbors(node)) for node in nodes}
+        
+        cached = None
+        if layout_key is not None:
+            with self._layout_lock:
+                cached = self.layout_cache.get(layout_key)
+                if cached is not None:
+                    self.layout_cache.move_to_end(layout_key)
+            if cached is not None and cached["dimensions"] != config.dimensions:
+                cached = None
+            if cached is not None and version is not None and cached["version"] == version:
+                return {node: position.copy() for node, position in cached["positions"].items()}
+        
+        index = {node: i for i, node in enumerate(nodes)}
+        edges = np.array(
+            [(index[u], index[v]) for u, v in graph.edges()], dtype=np.int64
+        ).reshape(-1, 2)
+        weights = np.array(
+            [weight for _, _, weight in graph.edges(data='weight', default=1.0)], dtype=np.float64
+        )
+        
+        changed = set(nodes)
+        if cached is not None:
+            changed = {
+                node for node in nodes
+                if node not in cached["positions"] or cached["neighbours"].get(node) != neighbours[node]
+            }
+        
+        if cached is not None and not changed:
+            positions = np.array([cached["positions"][node] for node in nodes])
+        elif cached is not None and len(changed) <= len(nodes) // 2:
+            positions, mobility = self._warm_start(graph, nodes, changed, cached["positions"], config)
+            positions = barnes_hut_layout(
+                len(nodes),
+                edges,
+                weights,
+                dimensions=config.dimensions,
+                iterations=max(10, config.layout_iterations // 3),
+                initial_positions=positions,
+                mobility=mobility,
+                temperature=0.02
+            )
+        else:
+            positions = barnes_hut_layout(
+                len(nodes),
+                edges,
+                weights,
+                dimensions=config.dimensions,
+                iterations=config.layout_iterations
+            )
+        
+        pos = {node: positions[i] for i, node in enumerate(nodes)}
+        if layout_key is not None:
+            with self._layout_lock:
+                self.layout_cache[layout_key] = {
+                    "version": version,
+                    "dimensions": config.dimensions,
+                    "positions": {node: position.copy() for node, position in pos.items()},
+                    "neighbours": neighbours
+                }
+                self.layout_cache.move_to_end(layout_key)
+                while len(self.layout_cache) > self.max_cached_layouts:
+                    self.layout_cache.popitem(last=False)
+        return pos
+    
+    def _warm_start(
+        self,
+        graph: nx.Graph,
+        nodes: List[str],
+        changed: set,
+        cached_positions: Dict[str, np.ndarray],
+        config: VisualizationConfig,
+        hops: int = 2
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Initial positions and per-node mobility for a local re-layout
+        
+        New nodes start at the centroid of their already placed neighbours.
+        Changed nodes and their ``hops``-neighbourhood move freely; the rest
+        of the layout is nearly pinned.
+        """
+        rng = np.random.default_rng()
+        positions = {node: cached_positions[node] for node in nodes if node in cached_positions}
+        jitter = 0.05 * len(nodes) ** (-1.0 / config.dimensions)
+        
+        pending = [node for node in nodes if node not in positions]
+        while pending:
+            remaining = []
+            for node in pending:
+                placed = [positions[other] for other in graph.neighbors(node) if other in positions]
+                if placed:
+                    positions[node] = np.mean(placed, axis=0) + rng.normal(0, jitter, config.dimensions)
+                else:
+                    remaining.append(node)
+            if len(remaining) == len(pending):
+                for node in remaining:
+                    positions[node] = rng.uniform(-1, 1, config.dimensions)
+                break
+            pending = remaining
+        
+        mobile = set(changed)
+        frontier = set(changed)
+        for _ in range(hops):
+            frontier = {other for node in frontier for other in graph.neighbors(node)} - mobile
+            mobile |= frontier
+        
+        mobility = np.array([1.0 if node in mobile else 0.05 for node in nodes])
+        return np.array([positions[node] for node in nodes]), mobility
+    
     def _prepare_node_data(
         self,
         graph: nx.Graph,
@@ -367,6 +552,55 @@ class VisualizationEngine:
             }
         }
     
+    def _prepare_threejs_binary(
+        self,
+        node_data: Dict[str, Any],
+        graph: nx.Graph,
+        level_of_detail: Optional[Dict[str, Any]] = None
+    ) -> bytes:
+        """Pack node and edge data into typed-array buffers for Three.js"""
+        nodes = node_data["nodes"]
+        index = {node: i for i, node in enumerate(nodes)}
+        z = node_data["z"] if node_data["z"] else np.zeros(len(nodes))
+        positions = np.column_stack([node_data["x"], node_data["y"], z]).reshape(len(nodes), 3)
+        
+        edges = np.array(
+            [(index[u], index[v]) for u, v in graph.edges()], dtype=np.uint32
+        ).reshape(-1, 2)
+        edge_weights = np.array(
+            [weight for _, _, weight in graph.edges(data='weight', default=1.0)], dtype=np.float32
+        )
+        
+        metadata = {
+            "node_count": len(nodes),
+            "edge_count": len(edges),
+            "communities": len(set(node_data["colors"]))
+        }
+        if level_of_detail:
+            metadata.update(level_of_detail)
+        
+        return encode_threejs_buffers(
+            positions=positions,
+            colors=self._color_index_to_rgb(node_data["colors"]),
+            sizes=np.asarray(node_data["sizes"], dtype=np.float32),
+            edges=edges,
+            edge_weights=edge_weights,
+            labels=[str(graph.nodes[node].get('title', node)) for node in nodes],
+            node_ids=[str(node) for node in nodes],
+            metadata=metadata
+        )
+    
+    @staticmethod
+    def _color_index_to_rgb(colors: List[int]) -> np.ndarray:
+        """Distinct RGB colours for colour indices, spread around the hue wheel"""
+        unique = sorted(set(colors))
+        palette = {}
+        for i, color in enumerate(unique):
+            # Golden-ratio hue steps keep neighbouring indices distinguishable
+            rgb = colorsys.hsv_to_rgb((i * 0.618033988749895) % 1.0, 0.65, 0.95)
+            palette[color] = [int(round(channel * 255)) for channel in rgb]
+        return np.array([palette[color] for color in colors], dtype=np.uint8).reshape(-1, 3)
+    
     def generate_gap_visualization(
         self,
         gaps: List[Any],
@@ -536,4 +770,11 @@ class VisualizationEngine:
         else:
             raise ValueError(f"Unsupported format: {format}")
         
+        return filename
+    
+    def export_threejs_binary(self, threejs_binary: bytes, filename: str) -> str:
+        """Write a binary Three.js payload (see ``threejs_binary``) to file"""
+        with open(filename, "wb") as f:
+            f.write(threejs_binary)
+        
         return filename
\ No newline at end of file
@@ -12,11 +12,15 @@ from src.ml import (
     SemanticAnalysisRequest,
     ModelManager,
     EmbeddingPipeline,
+    EmbeddingConfig,
     SimilarityEngine,
+    SimilarityConfig,
     ContentMesh,
     GapAnalysisEngine,
+    GapAnalysisConfig,
     VisualizationEngine,
-    OptimizationEngine
+    OptimizationEngine,
+    TermStatistics
 )
 
 
@@ -117,7 +121,8 @@ class TestSemanticSaturationController:
             with patch.object(controller, '_generate_content_embeddings', new_callable=AsyncMock) as mock_embeddings:
                 mock_embeddings.return_value = np.random.rand(3, 384)  # 3 items, 384 dimensions
                 
-                with patch.object(controller, '_build_content_mesh', new_callable=AsyncMock) as mock_mesh:
+                with patch.object(controller, '_build_content_mesh', new_callable=AsyncMock), \
+                        patch.object(controller, '_summarize_content_mesh') as mock_mesh:
                     mock_mesh.return_value = {
                         "nodes": 3,
                         "edges": 2,
@@ -166,6 +171,144 @@ class TestSemanticSaturationController:
                                 assert "network_3d" in result.visualizations
                                 assert result.processing_time > 0
     
+    @pytest.mark.asyncio
+    async def test_get_analysis_result_embeddings(self, mock_redis, mock_mongodb):
+        """Test requested embeddings come from MongoDB, not the cached summary"""
+        from src.ml import EmbeddingCodec, ProductQuantizer
+        import json
+        embeddings = np.random.default_rng(0).normal(size=(3, 16)).astype(np.float32)
+        mock_redis.get = AsyncMock(return_value=json.dumps({"request_id": "sem_1"}))
+        mock_mongodb.semantic_analysis.find_one = AsyncMock(return_value={
+            "_id": "sem_1",
+            "embeddings": EmbeddingCodec("int8").encode(embeddings)
+        })
+        controller = SemanticSaturationController(redis_client=mock_redis, mongodb_client=mock_mongodb)
+        
+        summary = await controller.get_analysis_result("sem_1")
+        assert summary == {"request_id": "sem_1"}
+        
+        result = await controller.get_analysis_result("sem_1", include_embeddings=True)
+        assert np.allclose(result["embeddings"], embeddings, atol=1e-1)
+        assert result["embedding_info"]["count"] == 3
+        assert mock_redis.get.await_count == 1
+        
+        # Undecodable embeddings are an error, not a missing result
+        quantizer = ProductQuantizer(n_subvectors=4, n_centroids=2).fit(embeddings)
+        mock_mongodb.semantic_analysis.find_one.return_value = {
+            "_id": "sem_1",
+            "embeddings": EmbeddingCodec("pq", quantizer).encode(embeddings)
+        }
+        with pytest.raises(ValueError):
+            await controller.get_analysis_result("sem_1", include_embeddings=True)
+    
+    @pytest.mark.asyncio
+    async def test_analyze_content_stream(self, sample_analysis_request):
+        """Test independent stages stream before the mesh finishes"""
+        controller = SemanticSaturationController()
+        
+        async def slow_mesh(items, embeddings, tenant_id):
+            await asyncio.sleep(0.2)
+            return Mock(spec=ContentMesh)
+        
+        with patch.object(controller, 'initialize', new_callable=AsyncMock), \
+                patch.object(controller, '_generate_content_embeddings', new_callable=AsyncMock,
+                             return_value=np.random.rand(3, 384)), \
+                patch.object(controller, '_build_content_mesh', side_effect=slow_mesh), \
+                patch.object(controller, '_summarize_content_mesh', return_value={
+                    "nodes": 3, "edges": 2, "communities": 1, "density": 0.667, "gaps": []
+                }), \
+                patch.object(controller, '_analyze_gaps', new_callable=AsyncMock, return_value=[]), \
+                patch.object(controller, '_generate_optimizations', new_callable=AsyncMock, return_value=[]), \
+                patch.object(controller, '_create_visualizations', new_callable=AsyncMock, return_value={}):
+            events = [event async for event in controller.analyze_content_stream(sample_analysis_request)]
+        
+        stages = [event["stage"] for event in events if event["event"] == "stage"]
+        assert sorted(stages) == sorted([
+            "embeddings", "content_mesh", "semantic_gaps",
+            "optimization_suggestions", "visualizations", "metrics"
+        ])
+        assert stages.index("semantic_gaps") < stages.index("content_mesh")
+        assert stages.index("optimization_suggestions") < stages.index("content_mesh")
+        assert events[-1]["event"] == "complete"
+        assert events[0]["elapsed"] < 0.2
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_render_own_mesh(self, sample_analysis_request):
+        """Test concurrent requests visualize their own tenant's mesh"""
+        from dataclasses import replace
+        from src.ml.content_mesh import ContentNode
+        controller = SemanticSaturationController()
+        controller.visualization_engine = VisualizationEngine()
+        controller.similarity_engine = Mock(spec=SimilarityEngine)
+        controller.similarity_engine.tenant_index_name.side_effect = SimilarityEngine.tenant_index_name
+        controller.similarity_engine.reduce_dimensions.return_value = np.random.rand(3, 3)
+        
+        async def build_mesh(items, embeddings, tenant_id):
+            mesh = ContentMesh(Mock(spec=SimilarityEngine))
+            for i in range(3):
+                mesh.add_node(ContentNode(
+                    id=f"{tenant_id}_{i}", title=f"{tenant_id} {i}", content="",
+                    embedding=np.random.rand(16), metadata={}
+                ))
+            # The first tenant's mesh is built last
+            await asyncio.sleep(0.1 if tenant_id == "tenant-a" else 0)
+            return mesh
+        
+        tenants = ["tenant-a", "tenant-b"]
+        with patch.object(controller, 'initialize', new_callable=AsyncMock), \
+                patch.object(controller, '_generate_content_embeddings', new_callable=AsyncMock,
+                             return_value=np.random.rand(3, 16)), \
+                patch.object(controller, '_build_content_mesh', side_effect=build_mesh), \
+                patch.object(controller, '_summarize_content_mesh', return_value={
+                    "nodes": 3, "edges": 0, "communities": 0, "density": 0.0, "gaps": []
+                }), \
+                patch.object(controller, '_analyze_gaps', new_callable=AsyncMock, return_value=[]), \
+                patch.object(controller, '_generate_optimizations', new_callable=AsyncMock, return_value=[]):
+            results = await asyncio.gather(*[
+                controller.analyze_content(replace(sample_analysis_request, tenant_id=tenant))
+                for tenant in tenants
+            ])
+        
+        for tenant, result in zip(tenants, results):
+            nodes = result.visualizations["network_3d"]["threejs_data"]["nodes"]
+            assert {node["id"] for node in nodes} == {f"{tenant}_{i}" for i in range(3)}
+        assert not hasattr(controller, "content_mesh")
+    
+    @pytest.mark.asyncio
+    async def test_incremental_item_cache(self, sample_content_items):
+        """Test only changed items are re-optimized on a repeat request"""
+        from src.ml import OptimizationSuggestion
+        from src.ml.item_cache import ItemResultCache
+        controller = SemanticSaturationController()
+        controller.item_cache = ItemResultCache()
+        controller.optimization_engine = Mock()
+        controller.optimization_engine.generate_optimizations = AsyncMock(return_value=[
+            OptimizationSuggestion(
+                suggestion_id="read_1", category="readability", priority="high",
+                description="Simplify", implementation="Shorter sentences",
+                expected_impact={"readability": 0.3}, confidence=0.9, evidence={}
+            )
+        ])
+        controller.optimization_engine.update_term_statistics = AsyncMock(return_value=0)
+        controller.optimization_engine.get_term_statistics = Mock(return_value=Mock(generation=0))
+        
+        first = await controller._generate_optimizations(sample_content_items, ["ml"], None)
+        assert controller.optimization_engine.generate_optimizations.await_count == 3
+        
+        edited = [dict(item) for item in sample_content_items]
+        edited[1]["content"] += " Updated paragraph."
+        cache_stats = {}
+        second = await controller._generate_optimizations(edited, ["ml"], None, cache_stats)
+        
+        assert controller.optimization_engine.generate_optimizations.await_count == 4
+        assert second == first
+        assert cache_stats["optimizations"] == {"requested": 3, "cache_hits": 2}
+        
+        cache_stats["embeddings"] = {"requested": 3, "cache_hits": 3}
+        metrics = controller._calculate_metrics({"nodes": 3, "gaps": []}, [], second, cache_stats)
+        assert metrics["optimizations_cache_hit_ratio"] == pytest.approx(2 / 3)
+        assert metrics["item_reuse_ratio"] == pytest.approx(5 / 6)
+    
     @pytest.mark.asyncio
     async def test_calculate_health_score(self, mock_redis, mock_mongodb):
         """Test semantic health score calculation"""
@@ -215,6 +358,69 @@ class TestEmbeddingPipeline:
         assert len(embeddings) == 3
         assert all(isinstance(emb, np.ndarray) for emb in embeddings)
     
+    @pytest.mark.asyncio
+    async def test_batched_embedding_cache(self):
+        """Test duplicate texts are embedded once and cached in one round trip"""
+        import torch
+        mock_model_manager = Mock(spec=ModelManager)
+        mock_model_manager.get_embeddings_batch = AsyncMock(return_value=torch.rand(2, 384))
+        
+        redis = Mock()
+        redis.mget = AsyncMock(side_effect=lambda keys: [None] * len(keys))
+        pipe = Mock()
+        pipe.execute = AsyncMock()
+        redis.pipeline = Mock(return_value=pipe)
+        
+        pipeline = EmbeddingPipeline(mock_model_manager, redis)
+        texts = ["Text A", "Text B"] * 250
+        embeddings = await pipeline.generate_embeddings(texts)
+        
+        assert len(embeddings) == 500
+        assert redis.mget.await_count == 1
+        assert len(redis.mget.await_args.args[0]) == 2
+        assert pipe.set.call_count == 2
+        
+        # Preprocessing languages are cached (and coalesced) separately
+        english = pipeline._get_cache_key("Text A", EmbeddingConfig(language="en"))
+        assert english != pipeline._get_cache_key("Text A", EmbeddingConfig(language="multi"))
+        assert mock_model_manager.get_embeddings_batch.await_count == 1
+        
+        # Second call is served from the in-process tier
+        await pipeline.generate_embeddings(texts)
+        assert redis.mget.await_count == 1
+        assert mock_model_manager.get_embeddings_batch.await_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_cancelled_embedding_releases_inflight(self):
+        """Test waiters on a cancelled embedding call embed the text themselves"""
+        started = asyncio.Event()
+        calls = []
+        
+        async def first_call_hangs(texts, **kwargs):
+            calls.append(texts)
+            if len(calls) == 1:
+                started.set()
+                await asyncio.sleep(3600)
+            embeddings = Mock()
+            embeddings.cpu.return_value.numpy.return_value = np.ones((len(texts), 4))
+            return embeddings
+        
+        mock_model_manager = Mock(spec=ModelManager)
+        mock_model_manager.get_embeddings_batch = AsyncMock(side_effect=first_call_hangs)
+        pipeline = EmbeddingPipeline(mock_model_manager)
+        
+        owner = asyncio.ensure_future(pipeline.generate_embeddings(["Text A"]))
+        await started.wait()
+        waiter = asyncio.ensure_future(pipeline.generate_embeddings(["Text A"]))
+        await asyncio.sleep(0)
+        owner.cancel()
+        
+        embeddings = await asyncio.wait_for(waiter, timeout=1)
+        assert embeddings[0].shape == (4,)
+        assert len(calls) == 2
+        assert owner.cancelled()
+        assert pipeline._inflight == {}
+    
     def test_chunk_text(self):
         """Test text chunking"""
         mock_model_manager = Mock()
@@ -226,6 +432,259 @@ class TestEmbeddingPipeline:
         assert len(chunks) > 1
         assert all(hasattr(chunk, 'text') for chunk in chunks)
         assert all(hasattr(chunk, 'start_index') for chunk in chunks)
+    
+    def test_batched_preprocessing(self):
+        """Test batched spaCy preprocessing matches per-text preprocessing"""
+        import spacy
+        pipeline = EmbeddingPipeline(Mock())
+        pipeline.spacy_models["en"] = spacy.blank("en")
+        
+        texts = [f"The quick, brown fox #{i} jumps over   the lazy dog!" for i in range(50)]
+        processed = pipeline.preprocess_texts(texts, batch_size=16)
+        
+        assert processed == [pipeline.preprocess_text(text) for text in texts]
+        assert processed[0] == "quick brown fox 0 jumps lazy dog"
+
+    def test_chunk_offsets_with_repeated_passages(self):
+        """Test chunk offsets are exact even when passages repeat"""
+        from src.ml.embedding_pipeline import EmbeddingConfig
+        pipeline = EmbeddingPipeline(Mock())
+        
+        text = "\n\n".join(["The same paragraph appears again. " * 10] * 20)
+        config = EmbeddingConfig(chunk_size=64, chunk_overlap=8)
+        chunks = list(pipeline.iter_chunks(text, config))
+        
+        assert len(chunks) > 1
+        assert all(text[c.start_index:c.end_index] == c.text for c in chunks)
+        assert all(c.metadata["token_count"] <= 64 for c in chunks)
+        starts = [c.start_index for c in chunks]
+        assert starts == sorted(set(starts))
+        assert chunks[-1].end_index == len(text.rstrip())
+    
+    @pytest.mark.asyncio
+    async def test_near_duplicate_chunks_embedded_once(self):
+        """Test near-duplicate chunks across documents share one embedding"""
+        import torch
+        mock_model_manager = Mock(spec=ModelManager)
+        mock_model_manager.get_embeddings_batch = AsyncMock(
+            side_effect=lambda texts, **kwargs: torch.rand(len(texts), 384)
+        )
+        pipeline = EmbeddingPipeline(mock_model_manager)
+        
+        footer = (
+            "Copyright {year} Example Corp. All rights reserved. Use of this site "
+            "constitutes acceptance of our user agreement and privacy policy. Page {page}."
+        )
+        first, chunks = await pipeline.generate_document_embedding(footer.format(year=2023, page=1))
+        second, near_chunks = await pipeline.generate_document_embedding(footer.format(year=2024, page=7))
+        
+        # The second footer is served by the first one's (cached, float16) embedding
+        assert mock_model_manager.get_embeddings_batch.await_count == 1
+        assert np.allclose(first, second, atol=1e-3)
+        assert near_chunks[0].metadata["near_duplicate"]
+        assert near_chunks[0].metadata["canonical"] == chunks[0].metadata["canonical"]
+        assert near_chunks[0].text.endswith("Page 7.")
+        
+        await pipeline.generate_document_embedding(
+            "An unrelated article about container orchestration and service meshes."
+        )
+        assert mock_model_manager.get_embeddings_batch.await_count == 2
+        assert pipeline.get_chunk_index("default").near_duplicates == 1
+        
+        # Other tenants never reuse this tenant's canonical chunks
+        _, other_chunks = await pipeline.generate_document_embedding(
+            footer.format(year=2024, page=7), tenant_id="other"
+        )
+        assert not other_chunks[0].metadata["near_duplicate"]
+
+
+class TestEmbeddingCodec:
+    """Test compact embedding storage formats"""
+    
+    @pytest.mark.parametrize("codec,tolerance", [("float32", 0), ("float16", 1e-3), ("int8", 1e-2), ("pq", None)])
+    def test_round_trip(self, codec, tolerance):
+        """Test every codec decodes from its own header"""
+        from src.ml import EmbeddingCodec, ProductQuantizer, decode_embeddings
+        rng = np.random.default_rng(0)
+        embeddings = rng.normal(size=(64, 32)).astype(np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        
+        quantizer = ProductQuantizer(n_subvectors=8, n_centroids=16).fit(embeddings) if codec == "pq" else None
+        data = EmbeddingCodec(codec, quantizer).encode(embeddings)
+        decoded = decode_embeddings(data, quantizer)
+        
+        assert decoded.shape == embeddings.shape
+        if codec == "pq":
+            assert len(data) == 16 + 64 * 8
+            assert np.all(np.sum(decoded * embeddings, axis=1) > 0.5)
+            with pytest.raises(ValueError):
+                decode_embeddings(data)
+        else:
+            assert np.max(np.abs(decoded - embeddings)) <= tolerance
+        if codec == "int8":
+            assert len(data) == 16 + 64 * (4 + 32)
+    
+    def test_codec_from_env(self, tmp_path, monkeypatch):
+        """Test the pq codec loads its quantizer from the environment"""
+        from src.ml import EmbeddingCodec, ProductQuantizer
+        embeddings = np.random.default_rng(0).normal(size=(64, 32)).astype(np.float32)
+        
+        monkeypatch.setenv("TEST_CODEC", "pq")
+        with pytest.raises(ValueError, match="TEST_PQ_PATH"):
+            EmbeddingCodec.from_env("TEST_CODEC", "float16", "TEST_PQ_PATH")
+        
+        quantizer = ProductQuantizer(n_subvectors=8, n_centroids=16).fit(embeddings)
+        quantizer.save(tmp_path / "pq.npy")
+        monkeypatch.setenv("TEST_PQ_PATH", str(tmp_path / "pq.npy"))
+        codec = EmbeddingCodec.from_env("TEST_CODEC", "float16", "TEST_PQ_PATH")
+        assert codec.product_quantizer.fingerprint == quantizer.fingerprint
+        assert codec.decode(codec.encode(embeddings)).shape == embeddings.shape
+
+
+class TestEmbeddingScheduler:
+    """Test cross-request embedding micro-batching"""
+    
+    @pytest.mark.asyncio
+    async def test_coalesces_concurrent_requests(self):
+        """Test concurrent small requests share model calls"""
+        from src.ml.embedding_scheduler import EmbeddingScheduler, SchedulerConfig
+        batches = []
+        
+        def encode(model_key, texts):
+            batches.append(len(texts))
+            return np.array([[len(text)] for text in texts])
+        
+        scheduler = EmbeddingScheduler(encode, SchedulerConfig(max_batch_size=32, max_wait_ms=5))
+        requests = [[f"request {i} text {j}" for j in range(2)] for i in range(50)]
+        results = await asyncio.gather(*[scheduler.encode("embeddings", texts) for texts in requests])
+        
+        for texts, rows in zip(requests, results):
+            assert [row[0] for row in rows] == [len(text) for text in texts]
+        assert sum(batches) == 100
+        assert len(batches) < 50
+        assert scheduler.get_stats()["avg_batch_size"] > 2
+        scheduler.shutdown()
+
+
+class TestModelManager:
+    """Test model loading backends"""
+    
+    @pytest.mark.parametrize("accepted,expected_backend", [(True, "onnx"), (False, "torch")])
+    def test_onnx_backend_drift_gate(self, tmp_path, accepted, expected_backend):
+        """Test ONNX exports are only used when they pass the drift check"""
+        torch_model = Mock()
+        onnx_model = Mock(meta={"accepted": accepted})
+        onnx_cls = Mock()
+        onnx_cls.is_accepted.return_value = None
+        onnx_cls.export.return_value = onnx_model
+        
+        manager = ModelManager(model_cache_dir=str(tmp_path), inference_backend="onnx")
+        manager.device = "cpu"
+        model = manager._load_with_backend("embeddings", lambda: torch_model, onnx_cls)
+        
+        assert model is (onnx_model if accepted else torch_model)
+        assert manager.model_backends["embeddings"] == expected_backend
+        onnx_cls.export.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_lazy_loading_with_memory_budget(self, tmp_path):
+        """Test models load once on first use and idle ones are evicted"""
+        manager = ModelManager(model_cache_dir=str(tmp_path), memory_budget_mb=150)
+        loaders = {key: Mock(return_value=Mock(name=key)) for key in manager._model_loaders}
+        manager._model_loaders = loaders
+        
+        with patch.object(ModelManager, "_estimate_model_bytes", return_value=100 * 2**20):
+            await manager.initialize_models(preload=[])
+            assert manager.models == {}
+            
+            # Concurrent first calls share a single load
+            results = await asyncio.gather(*[manager.get_model("sentiment") for _ in range(5)])
+            assert all(model is results[0] for model in results)
+            loaders["sentiment"].assert_called_once()
+            
+            # A model used moments ago is not idle, so the budget is exceeded
+            await manager.get_model("summarizer")
+            assert "sentiment" in manager.models
+            
+            # Once idle long enough it is evicted by the next load
+            manager.last_used["sentiment"] -= manager.idle_unload_seconds
+            await manager.get_model("bert")
+            assert "summarizer" in manager.models
+        
+        status = manager.get_model_status()
+        assert status["bert"]["state"] == "loaded"
+        assert status["sentiment"]["state"] == "unloaded"
+        assert "sentiment" not in manager.models
+        
+        with pytest.raises(ValueError):
+            await manager.get_model("unknown")
+        manager.cleanup()
+
+
+class TestGapAnalysisEngine:
+    """Test gap analysis topic modelling"""
+    
+    @pytest.mark.asyncio
+    async def test_incremental_topic_model_reuse(self, tmp_path, sample_content_items):
+        """Test tenant topic models only learn from unseen documents"""
+        engine = GapAnalysisEngine(Mock(), Mock(), topic_model_dir=str(tmp_path))
+        config = GapAnalysisConfig(n_topics=2, topic_model="lda")
+        texts = [item["content"] for item in sample_content_items]
+        
+        topics, model = await engine._perform_topic_modeling(texts[:2], config, "tenant-a")
+        assert model.documents_seen == 2
+        assert all(len(topic["words"]) > 0 for topic in topics.values())
+        
+        assert await engine.update_topic_model("tenant-a", texts, config) == 1
+        topics, reused = await engine._perform_topic_modeling(texts, config, "tenant-a")
+        assert reused is model
+        assert model.documents_seen == 3
+        assert sum(topic["size"] for topic in topics.values()) == 3
+        
+        # Another tenant gets its own model; models are saved in batches
+        _, other = await engine._perform_topic_modeling(texts, config, "tenant-b")
+        assert other is not model
+        assert not list(tmp_path.glob("topics_*"))
+        engine.flush_topic_models()
+        assert len(list(tmp_path.glob("topics_*.joblib"))) == 2
+        assert not list(tmp_path.glob("*.tmp"))
+    
+    def test_topic_model_learns_evicted_documents_once(self, sample_content_items):
+        """Test documents evicted from the doc-topic cache are not refitted"""
+        from src.ml.topic_model import IncrementalTopicModel
+        from src.ml.incremental_state import doc_key
+        model = IncrementalTopicModel(n_topics=2, max_cached_docs=2)
+        texts = [item["content"] for item in sample_content_items]
+        
+        assert model.update(texts) == 3
+        assert doc_key(texts[0]) not in model.doc_topics
+        assert model.update(texts) == 0
+        assert model.documents_seen == 3
+        
+        # Evicted rows are recomputed on demand and cached again
+        assert model.doc_topic_matrix(texts[:1]).shape == (1, 2)
+        assert doc_key(texts[0]) in model.doc_topics
+        assert model.documents_seen == 3
+    
+    @pytest.mark.asyncio
+    async def test_bertopic_uses_model_manager_embeddings(self, sample_content_items):
+        """Test BERTopic is fitted on embeddings from the model manager"""
+        embeddings = np.random.rand(3, 8)
+        batch = Mock()
+        batch.cpu.return_value.numpy.return_value = embeddings
+        model_manager = Mock(spec=ModelManager)
+        model_manager.get_embeddings_batch = AsyncMock(return_value=batch)
+        engine = GapAnalysisEngine(model_manager, Mock())
+        texts = [item["content"] for item in sample_content_items]
+        
+        with patch("src.ml.gap_analysis.BERTopic") as bertopic:
+            bertopic.return_value.fit_transform.return_value = ([0, 0, 0], None)
+            bertopic.return_value.get_topic_info.return_value.iterrows.return_value = []
+            await engine._perform_topic_modeling(texts, GapAnalysisConfig(topic_model="bertopic"))
+        
+        model_manager.get_embeddings_batch.assert_awaited_once_with(texts)
+        assert "embedding_model" not in bertopic.call_args.kwargs
+        assert bertopic.return_value.fit_transform.call_args.args[1] is embeddings
 
 
 class TestSimilarityEngine:
@@ -259,6 +718,317 @@ class TestSimilarityEngine:
         
         assert len(results) <= 5
         assert all(hasattr(r, 'index') and hasattr(r, 'score') for r in results)
+    
+    @pytest.mark.asyncio
+    async def test_incremental_ivf_index(self):
+        """Test adding to and removing from an IVF index"""
+        engine = SimilarityEngine()
+        config = SimilarityConfig(index_type="ivf_flat", nlist=4, nprobe=4)
+        
+        embeddings = np.random.rand(200, 32).astype(np.float32)
+        await engine.build_index(embeddings, "ivf_index", config)
+        
+        new_ids = await engine.add_vectors(np.random.rand(20, 32), "ivf_index")
+        assert list(new_ids) == list(range(200, 220))
+        
+        removed = await engine.remove_ids(new_ids[:5], "ivf_index")
+        assert removed == 5
+        assert engine.indices["ivf_index"]["size"] == 215
+        
+        await engine.set_search_params("ivf_index", nprobe=2)
+        assert engine.indices["ivf_index"]["index"].nprobe == 2
+        
+        results = await engine.search(embeddings[0], "ivf_index", k=5)
+        assert results[0].index == 0
+        
+        # An IVF index built empty is sized from its first batch
+        await engine.build_index(np.empty((0, 32)), "empty_ivf", SimilarityConfig(index_type="ivf_flat"))
+        await engine.add_vectors(embeddings, "empty_ivf")
+        assert engine.indices["empty_ivf"]["index"].nlist == 200 // 39
+        results = await engine.search(embeddings[0], "empty_ivf", k=5)
+        assert results[0].index == 0
+        
+        # A small first batch is outgrown: the index is retrained with more
+        # centroids and keeps its earlier vectors
+        config = SimilarityConfig(index_type="ivf_flat", nlist=16, nprobe=16)
+        await engine.build_index(np.empty((0, 32)), "small_ivf", config)
+        await engine.add_vectors(embeddings[:40], "small_ivf")
+        assert engine.indices["small_ivf"]["index"].nlist == 1
+        await engine.add_vectors(np.random.rand(400, 32), "small_ivf")
+        assert engine.indices["small_ivf"]["index"].nlist == 440 // 39
+        assert engine.indices["small_ivf"]["index"].ntotal == 440
+        results = await engine.search(embeddings[3], "small_ivf", k=1)
+        assert results[0].index == 3
+    
+    @pytest.mark.asyncio
+    async def test_hnsw_tombstones(self):
+        """Test re-adding removed ids and compacting tombstones in an HNSW index"""
+        engine = SimilarityEngine()
+        config = SimilarityConfig(index_type="hnsw")
+        
+        embeddings = np.random.rand(100, 32).astype(np.float32)
+        await engine.build_index(embeddings, "hnsw_index", config)
+        
+        await engine.remove_ids(np.arange(5), "hnsw_index")
+        assert engine.indices["hnsw_index"]["deleted_ids"] == set(range(5))
+        
+        # Re-added ids replace their tombstoned vectors
+        replacement = np.random.rand(1, 32).astype(np.float32)
+        await engine.add_vectors(replacement, "hnsw_index", ids=np.array([0]))
+        assert not engine.indices["hnsw_index"]["deleted_ids"]
+        assert engine.indices["hnsw_index"]["index"].ntotal == 96
+        results = await engine.search(replacement[0], "hnsw_index", k=1)
+        assert results[0].index == 0
+        assert results[0].score == pytest.approx(1.0, abs=1e-4)
+        
+        # Tombstones past the threshold trigger a rebuild
+        await engine.remove_ids(np.arange(10, 40), "hnsw_index")
+        assert not engine.indices["hnsw_index"]["deleted_ids"]
+        assert engine.indices["hnsw_index"]["index"].ntotal == 66
+        assert engine.indices["hnsw_index"]["size"] == 66
+    
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("index_type", ["hnsw", "ivf_flat"])
+    async def test_concurrent_add_and_remove(self, index_type):
+        """Test concurrent updates never bring removed ids back"""
+        engine = SimilarityEngine()
+        config = SimilarityConfig(index_type=index_type, nlist=4, nprobe=4)
+        rng = np.random.default_rng(0)
+        
+        embeddings = rng.random((200, 32), dtype=np.float32)
+        await engine.build_index(embeddings, "index", config)
+        
+        # Enough removals to trigger HNSW compaction while adds are queued
+        removed = np.arange(0, 120, 2)
+        await asyncio.gather(*[
+            op
+            for batch in range(6)
+            for op in (
+                engine.add_vectors(
+                    rng.random((10, 32), dtype=np.float32),
+                    "index",
+                    ids=np.arange(1000 + 10 * batch, 1010 + 10 * batch)
+                ),
+                engine.remove_ids(removed[10 * batch:10 * batch + 10], "index")
+            )
+        ])
+        
+        assert engine.indices["index"]["size"] == 200
+        results = await engine.batch_search(embeddings[removed], "index", k=20)
+        assert not {r.index for row in results for r in row} & set(removed.tolist())
+    
+    @pytest.mark.asyncio
+    async def test_batch_search(self):
+        """Test matrix batch search matches single-query search"""
+        engine = SimilarityEngine()
+        
+        embeddings = np.random.rand(50, 64).astype(np.float32)
+        await engine.build_index(embeddings, "test_index")
+        
+        batch_results = await engine.batch_search(embeddings[:10], "test_index", k=3)
+        single_results = await engine.search(embeddings[4], "test_index", k=3)
+        
+        assert len(batch_results) == 10
+        assert [r.index for r in batch_results[4]] == [r.index for r in single_results]
+        assert all(results[0].index == i for i, results in enumerate(batch_results))
+    
+    @pytest.mark.asyncio
+    async def test_save_and_load_index(self, tmp_path):
+        """Test persisting an index and warm-starting from disk"""
+        engine = SimilarityEngine(index_dir=str(tmp_path))
+        
+        embeddings = np.random.rand(20, 64).astype(np.float32)
+        metadata = [
+            {"text": f"doc {i}", "position": i, "score": i if i % 2 else i + 0.5}
+            for i in range(20)
+        ]
+        metadata[0]["text"] = "é" * 10000
+        await engine.build_index(embeddings, "test_index", metadata=metadata)
+        # Concurrent saves are serialised and publish whole manifests
+        await asyncio.gather(*[engine.save_index("test_index") for _ in range(3)])
+        assert not list(tmp_path.glob("test_index/*.tmp"))
+        
+        restored = SimilarityEngine(index_dir=str(tmp_path))
+        assert await restored.load_saved_indices() == ["test_index"]
+        
+        results = await restored.search(embeddings[3], "test_index", k=1)
+        assert results[0].index == 3
+        assert results[0].metadata == {"text": "doc 3", "position": 3, "score": 3}
+        assert isinstance(results[0].metadata["score"], int)
+        
+        # Strings are stored as UTF-8 with offsets, not padded to the longest
+        stored = restored.metadata_store["test_index"]
+        assert stored[0]["text"] == "é" * 10000 and stored[2]["score"] == 2.5
+        assert stored.nbytes < 25000
+        
+        # Flat indices are read into memory and stay modifiable; only IVF
+        # indices are memory-mapped read-only
+        assert (await restored.add_vectors(embeddings[:1], "test_index")).tolist() == [20]
+        
+        ivf_embeddings = np.random.rand(200, 64).astype(np.float32)
+        await engine.build_index(ivf_embeddings, "ivf_index", SimilarityConfig(index_type="ivf_flat", nlist=4))
+        await engine.save_index("ivf_index")
+        await restored.load_index("ivf_index")
+        with pytest.raises(ValueError):
+            await restored.add_vectors(ivf_embeddings[:1], "ivf_index")
+        
+        # Shutdown saves only the indices changed since their last save
+        await engine.build_index(embeddings, "unsaved")
+        assert await engine.save_dirty_indices() == ["unsaved"]
+        assert await engine.save_dirty_indices() == []
+        assert "unsaved" in engine.index_store.list_indices()
+    
+    @pytest.mark.asyncio
+    async def test_scalable_clustering(self):
+        """Test large inputs switch to mini-batch k-means with sampled k estimation"""
+        engine = SimilarityEngine()
+        rng = np.random.default_rng(0)
+        centers = rng.normal(size=(4, 32)) * 5
+        embeddings = (np.repeat(centers, 500, axis=0) + rng.normal(size=(2000, 32))).astype(np.float32)
+        
+        config = SimilarityConfig(
+            metric="euclidean",
+            scalable_clustering_threshold=1000,
+            cluster_sample_size=600,
+            silhouette_sample_size=300
+        )
+        labels, info = await engine.cluster_embeddings(embeddings, config=config)
+        
+        assert info["algorithm"] == "minibatch_kmeans"
+        assert info["n_clusters"] == 4
+        assert info["estimation_sample_size"] == 600
+        assert info["silhouette_sample_size"] == 300
+        assert len(set(labels[:500])) == 1 and len(set(labels)) == 4
+    
+    @pytest.mark.asyncio
+    async def test_sharded_search(self, tmp_path):
+        """Test sharded search matches single-process search and survives restarts"""
+        rng = np.random.default_rng(0)
+        embeddings = rng.normal(size=(600, 32)).astype(np.float32)
+        queries = rng.normal(size=(20, 32)).astype(np.float32)
+        metadata = [{"position": i} for i in range(600)]
+        config = SimilarityConfig(shard_partition_size=200)
+        
+        local = SimilarityEngine(index_dir=str(tmp_path / "local"))
+        await local.build_index(embeddings, "big", config, metadata=metadata)
+        expected = await local.batch_search(queries, "big", k=5)
+        
+        sharded = SimilarityEngine(index_dir=str(tmp_path / "sharded"), n_shards=2)
+        try:
+            await sharded.build_index(embeddings, "big", config, metadata=metadata)
+            await sharded.build_index(embeddings[:50], "tenant")
+            assert sharded.shards.indices["big"]["partitions"] == 2
+            assert sharded.shards.indices["tenant"]["partitions"] == 1
+            
+            results = await sharded.batch_search(queries, "big", k=5)
+            assert [[r.index for r in row] for row in results] == [[r.index for r in row] for row in expected]
+            assert results[0][0].metadata == {"position": results[0][0].index}
+            
+            ids = await sharded.add_vectors(embeddings[:3], "big")
+            assert ids.tolist() == [600, 601, 602]
+            assert await sharded.remove_ids(np.array([0, 601]), "big") == 2
+            assert 601 not in {r.index for r in await sharded.search(embeddings[1], "big", k=5)}
+            assert {r.index for r in await sharded.search(embeddings[2], "big", k=2)} == {2, 602}
+            
+            await sharded.set_search_params("big", nprobe=4)
+            assert sharded.shards.indices["big"]["config"].nprobe == 4
+            
+            await sharded.save_index("big")
+        finally:
+            sharded.cleanup()
+        
+        # Partitions are reloaded (memory-mapped) onto a different shard count
+        restored = SimilarityEngine(index_dir=str(tmp_path / "sharded"), n_shards=3)
+        try:
+            assert await restored.load_saved_indices() == ["big"]
+            assert restored.shards.indices["big"]["size"] == 601
+            results = await restored.search(embeddings[5], "big", k=1)
+            assert results[0].index == 5
+        finally:
+            restored.cleanup()
+    
+    @pytest.mark.asyncio
+    async def test_tenant_memory_quotas(self, tmp_path):
+        """Test cold indices are spilled over quota and reloaded on demand"""
+        rng = np.random.default_rng(0)
+        embeddings = rng.normal(size=(500, 32)).astype(np.float32)
+        metadata = [{"position": i} for i in range(500)]
+        
+        # 500 x 32 floats in a flat index plus 500 metadata records is
+        # estimated at 68000 + 128000 bytes (80000 once reloaded, as the
+        # metadata then comes back in columns)
+        engine = SimilarityEngine(
+            index_dir=str(tmp_path),
+            tenant_quota_bytes=250000,
+            global_quota_bytes=260000
+        )
+        first = engine.tenant_index_name("acme", "first")
+        second = engine.tenant_index_name("acme", "second")
+        other = engine.tenant_index_name("other tenant", "mesh")
+        assert first == "acme:first" and engine.index_tenant(other).startswith("t-")
+        
+        await engine.build_index(embeddings, first, metadata=metadata)
+        expected = await engine.search(embeddings[7], first, k=3)
+        await engine.build_index(embeddings, second, metadata=metadata)
+        
+        # Over the tenant quota: the least recently used index is spilled
+        assert first in engine.evicted and engine.has_index(first)
+        assert engine.resident_bytes_by_tenant() == {"acme": 196000}
+        
+        # Searching reloads it and spills the other one instead
+        results = await engine.search(embeddings[7], first, k=3)
+        assert [(r.index, r.metadata) for r in results] == [(r.index, r.metadata) for r in expected]
+        assert list(engine.indices) == [first] and second in engine.evicted
+        
+        # The global quota evicts across tenants
+        await engine.add_vectors(embeddings[:10], first)
+        await engine.build_index(embeddings, other, metadata=metadata)
+        assert set(engine.indices) == {other} and engine.has_index(second)
+        
+        usage = await engine.update_memory_metrics()
+        assert usage == {engine.index_tenant(other): 196000}
+        
+        # Unsaved additions were persisted when the index was spilled
+        results = await engine.search(embeddings[3], first, k=2)
+        assert {r.index for r in results} == {3, 503}
+    
+    def test_fitted_reducer_projection_and_drift(self, tmp_path):
+        """Test reducers are fitted once, persisted, and refreshed on drift"""
+        rng = np.random.default_rng(0)
+        basis = np.linalg.qr(rng.normal(size=(64, 16)))[0]
+        
+        def sample(columns, n):
+            return rng.normal(size=(n, 8)) @ basis[:, columns].T + rng.normal(0, 0.01, size=(n, 64))
+        
+        engine = SimilarityEngine(index_dir=str(tmp_path))
+        fitted = engine.reduce_dimensions(sample(slice(0, 8), 300), index_name="test_index")
+        reducer = engine.get_reducer("test_index")
+        assert fitted.shape == (300, 3) and reducer.generation == 1
+        
+        # Same distribution: projected with the existing fit
+        engine.reduce_dimensions(sample(slice(0, 8), 200), index_name="test_index")
+        assert reducer.generation == 1 and not reducer.needs_refresh
+        
+        # New directions are not explained by the fit and trigger a refresh
+        drifted = sample(slice(8, 16), 200)
+        engine.reduce_dimensions(drifted, index_name="test_index")
+        engine.executor.shutdown(wait=True)  # Wait for the background refit
+        assert reducer.generation == 2
+        assert reducer.drift < reducer.drift_threshold
+        
+        restored = SimilarityEngine(index_dir=str(tmp_path))
+        assert restored.get_reducer("test_index").generation == 2
+        assert np.allclose(
+            restored.reduce_dimensions(drifted[:5], index_name="test_index"),
+            reducer.transform(drifted[:5], observe=False),
+            atol=1e-4
+        )
+        
+        # A 2D reducer on the same index is saved alongside the 3D one
+        restored.reduce_dimensions(drifted, n_components=2, index_name="test_index")
+        reloaded = SimilarityEngine(index_dir=str(tmp_path))
+        assert reloaded.get_reducer("test_index").generation == 2
+        assert reloaded.get_reducer("test_index", n_components=2).generation == 1
 
 
 class TestContentMesh:
@@ -303,6 +1073,216 @@ class TestContentMesh:
         gaps = mesh.find_content_gaps()
         
         assert isinstance(gaps, list)
+    
+    @pytest.mark.asyncio
+    async def test_blocked_similarity_edges(self):
+        """Test tiled kNN edges match a brute-force similarity scan"""
+        similarity_engine = Mock(spec=SimilarityEngine)
+        mesh = ContentMesh(similarity_engine)
+        
+        from src.ml.content_mesh import ContentNode, MeshConfig
+        rng = np.random.default_rng(0)
+        centers = rng.random((4, 16))
+        embeddings = centers[rng.integers(0, 4, 40)] + 0.2 * rng.random((40, 16))
+        nodes = [
+            ContentNode(id=str(i), title="", content="", embedding=emb, metadata={})
+            for i, emb in enumerate(embeddings)
+        ]
+        for node in nodes:
+            mesh.add_node(node)
+        
+        config = MeshConfig(similarity_threshold=0.9, max_edges_per_node=3, knn_chunk_size=7)
+        await mesh._create_similarity_edges(nodes, config)
+        
+        normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        similarities = normalized @ normalized.T
+        np.fill_diagonal(similarities, -np.inf)
+        expected = set()
+        for i in range(len(nodes)):
+            candidates = np.where(similarities[i] >= 0.9)[0]
+            for j in candidates[np.argsort(-similarities[i, candidates])][:3]:
+                expected.add(frozenset((str(i), str(j))))
+        
+        assert {frozenset(edge) for edge in mesh.graph.edges()} == expected
+    
+    @pytest.mark.asyncio
+    async def test_incremental_updates(self, tmp_path):
+        """Test upserting and removing nodes without a full rebuild"""
+        mesh = ContentMesh(SimilarityEngine(index_dir=str(tmp_path)))
+        
+        from src.ml.content_mesh import ContentNode, MeshConfig
+        rng = np.random.default_rng(1)
+        centers = rng.random((3, 16))
+        embeddings = centers[rng.integers(0, 3, 30)] + 0.1 * rng.random((30, 16))
+        nodes = [
+            ContentNode(id=str(i), title="", content="", embedding=emb, metadata={})
+            for i, emb in enumerate(embeddings)
+        ]
+        
+        config = MeshConfig(similarity_threshold=0.9, min_community_size=2)
+        await mesh.build_mesh(nodes[:25], config)
+        await mesh.upsert_nodes(nodes[25:])
+        
+        assert mesh.graph.number_of_nodes() == 30
+        assert mesh.graph.degree("27") > 0
+        assert "pagerank" in mesh.graph.nodes["27"]
+        assert "27" in mesh.partition
+        
+        await mesh.remove_nodes(["0", "1"])
+        
+        assert not mesh.graph.has_node("0")
+        assert "0" not in mesh.partition
+        assert mesh.similarity_engine.indices["content_mesh"]["size"] == 28
+        
+        # Upserts search the mesh index with the index backend, and link
+        # existing nodes whose top-k the new nodes enter
+        index_config = MeshConfig(
+            similarity_threshold=0.9, max_edges_per_node=3, knn_backend="index",
+            use_community_detection=False, use_pagerank=False
+        )
+        incremental = ContentMesh(SimilarityEngine(index_dir=str(tmp_path / "incremental")))
+        await incremental.build_mesh(nodes[:25], index_config)
+        with patch.object(
+            incremental, "_blocked_knn", side_effect=AssertionError("blocked kNN used")
+        ):
+            await incremental.upsert_nodes(nodes[25:])
+        full = ContentMesh(SimilarityEngine(index_dir=str(tmp_path / "full")))
+        await full.build_mesh(nodes, index_config)
+        
+        new_ids = {node.id for node in nodes[25:]}
+        def new_edges(graph):
+            return {frozenset(edge) for edge in graph.edges() if new_ids & set(edge)}
+        assert new_edges(full.graph) <= new_edges(incremental.graph)
+
+    @pytest.mark.asyncio
+    async def test_sparse_graph_backend(self, tmp_path):
+        """Test CSR analytics match the NetworkX backend"""
+        from src.ml.content_mesh import ContentNode, MeshConfig
+        rng = np.random.default_rng(2)
+        centers = rng.random((4, 16))
+        embeddings = centers[rng.integers(0, 4, 60)] + 0.2 * rng.random((60, 16))
+        nodes = [
+            ContentNode(id=str(i), title="", content="", embedding=emb, metadata={})
+            for i, emb in enumerate(embeddings)
+        ]
+        
+        dense = ContentMesh(SimilarityEngine(index_dir=str(tmp_path / "dense")))
+        await dense.build_mesh(nodes, MeshConfig(similarity_threshold=0.95))
+        sparse = ContentMesh(SimilarityEngine(index_dir=str(tmp_path / "sparse")))
+        await sparse.build_mesh(nodes, MeshConfig(similarity_threshold=0.95, graph_backend="sparse"))
+        
+        # No NetworkX graph until something asks for one
+        assert sparse._graph is None
+        
+        dense_stats = dense.get_mesh_statistics()
+        sparse_stats = sparse.get_mesh_statistics()
+        for key in ["num_nodes", "num_edges", "density", "avg_degree", "connected_components"]:
+            assert sparse_stats[key] == pytest.approx(dense_stats[key])
+        
+        pagerank = sparse.sparse_graph.node_values["pagerank"]
+        expected = [dense.graph.nodes[str(i)]["pagerank"] for i in range(60)]
+        assert np.allclose(pagerank, expected, atol=1e-6)
+        
+        assert sparse.graph.number_of_edges() == dense.graph.number_of_edges()
+
+
+class TestVisualizationEngine:
+    """Test visualization engine"""
+    
+    def test_force_layout_cache_and_level_of_detail(self):
+        """Test cached Barnes-Hut layouts are reused, refined locally and decimated"""
+        from src.ml.content_mesh import ContentNode, ContentEdge
+        from src.ml.visualization import VisualizationConfig
+        
+        mesh = ContentMesh(Mock(spec=SimilarityEngine))
+        for i in range(60):
+            mesh.add_node(ContentNode(
+                id=f"node_{i}",
+                title=f"Node {i}",
+                content=f"Content {i}",
+                embedding=np.random.rand(16),
+                metadata={}
+            ))
+        for i in range(60):
+            # Two rings of 30 nodes
+            ring, position = divmod(i, 30)
+            neighbour = ring * 30 + (position + 1) % 30
+            mesh.add_edge(ContentEdge(source=f"node_{i}", target=f"node_{neighbour}", weight=1.0))
+        
+        engine = VisualizationEngine()
+        config = VisualizationConfig(dimensions=3)
+        first = engine.generate_3d_network(mesh, config)["layout_positions"]
+        assert all(p.shape == (3,) and np.all(np.abs(p) <= 1.0 + 1e-9) for p in first.values())
+        
+        # Unchanged mesh: positions come straight from the cache
+        again = engine.generate_3d_network(mesh, config)["layout_positions"]
+        assert all(np.array_equal(first[node], again[node]) for node in first)
+        
+        # A new node on the first ring only re-lays out its neighbourhood
+        mesh.add_node(ContentNode(
+            id="node_new", title="New", content="New", embedding=np.random.rand(16), metadata={}
+        ))
+        mesh.add_edge(ContentEdge(source="node_new", target="node_0", weight=1.0))
+        updated = engine.generate_3d_network(mesh, config)["layout_positions"]
+        assert "node_new" in updated
+        far = [f"node_{i}" for i in range(30, 60)]
+        drift = np.mean([np.linalg.norm(updated[n] - first[n]) for n in far])
+        assert drift < 0.1
+        
+        # Level of detail keeps the most connected nodes and reports totals
+        decimated = engine.generate_3d_network(
+            mesh, VisualizationConfig(dimensions=3, max_render_nodes=20)
+        )
+        metadata = decimated["threejs_data"]["metadata"]
+        assert len(decimated["layout_positions"]) == 20
+        assert metadata["decimated"] and metadata["total_nodes"] == 61
+    
+    def test_force_layout_single_node_keeps_position(self):
+        """Test a warm-started single node is not moved to the origin"""
+        from src.ml.force_layout import barnes_hut_layout
+        
+        cached = np.array([[0.4, -0.2, 0.7]])
+        positions = barnes_hut_layout(1, np.zeros((0, 2)), initial_positions=cached)
+        assert np.array_equal(positions, cached)
+        assert np.array_equal(barnes_hut_layout(1, np.zeros((0, 2))), np.zeros((1, 3)))
+    
+    def test_threejs_binary_export(self):
+        """Test the binary Three.js payload round-trips with aligned sections"""
+        from src.ml.content_mesh import ContentNode, ContentEdge
+        from src.ml.visualization import VisualizationConfig
+        from src.ml.threejs_binary import read_threejs_header, decode_threejs_buffers
+        
+        mesh = ContentMesh(Mock(spec=SimilarityEngine))
+        for i in range(5):
+            mesh.add_node(ContentNode(
+                id=f"node_{i}",
+                title=f"Nöde {i}",
+                content=f"Content {i}",
+                embedding=np.random.rand(16),
+                metadata={}
+            ))
+        for i in range(4):
+            mesh.add_edge(ContentEdge(source=f"node_{i}", target=f"node_{i + 1}", weight=0.5))
+        
+        network = VisualizationEngine().generate_3d_network(
+            mesh, VisualizationConfig(threejs_format="binary", node_size_metric="degree")
+        )
+        assert "threejs_data" not in network
+        payload = network["threejs_binary"]
+        
+        header = read_threejs_header(payload)
+        assert header["node_count"] == 5 and header["edge_count"] == 4
+        assert all(section["offset"] % 8 == 0 for section in header["sections"].values())
+        
+        decoded = decode_threejs_buffers(payload)
+        positions = network["layout_positions"]
+        assert decoded["NIDS"] == [f"node_{i}" for i in range(5)]
+        assert decoded["LABL"][0] == "Nöde 0"
+        assert np.allclose(decoded["POSN"], [positions[n] for n in decoded["NIDS"]], atol=1e-6)
+        assert decoded["COLR"].shape == (5, 3) and decoded["COLR"].dtype == np.uint8
+        assert decoded["EDGE"].tolist() == [[0, 1], [1, 2], [2, 3], [3, 4]]
+        assert np.allclose(decoded["EWGT"], 0.5)
+        assert decoded["META"]["node_count"] == 5
 
 
 class TestOptimizationEngine:
@@ -323,6 +1303,100 @@ class TestOptimizationEngine:
         
         assert len(suggestions) > 0
         assert any(s.category == "readability" for s in suggestions)
+    
+    @pytest.mark.asyncio
+    async def test_shared_analysis_context(self):
+        """Test that analyzers share one parse of the content"""
+        from src.ml import analysis_context
+        
+        async def embed(texts):
+            rng = np.random.default_rng(len(texts))
+            vectors = rng.normal(size=(len(texts), 16))
+            return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        
+        mock_model_manager = Mock()
+        mock_model_manager.get_embeddings_batch = AsyncMock(side_effect=embed)
+        mock_model_manager.analyze_sentiment = Mock(return_value={"positive": 0.2})
+        engine = OptimizationEngine(mock_model_manager, Mock(), Mock(), max_workers=3)
+        
+        content = "\n\n".join(
+            f"Semantic search ranks documents by meaning. Paragraph {i} explains retrieval "
+            f"quality, embeddings and ranking in more detail than the previous one."
+            for i in range(6)
+        )
+        
+        with patch.object(analysis_context, "sent_tokenize", wraps=analysis_context.sent_tokenize) as spy, \
+                patch.object(analysis_context, "flesch_kincaid_grade", return_value=12.0), \
+                patch.object(analysis_context, "flesch_reading_ease", return_value=40.0):
+            suggestions = await engine.generate_optimizations(
+                content, {}, ["semantic search"], competitive_content=["Another article about search."]
+            )
+        
+        # Sentences are split once for readability, keywords and competition
+        assert [call.args[0] for call in spy.call_args_list].count(content) == 1
+        categories = {s.category for s in suggestions}
+        assert {"readability", "structure", "engagement"} <= categories
+        
+        # Paragraphs and the document were each embedded once
+        embedded = [call.args[0] for call in mock_model_manager.get_embeddings_batch.call_args_list]
+        assert embedded.count([content]) == 1
+        assert sum(1 for texts in embedded if len(texts) == 6) == 1
+    
+    @pytest.mark.asyncio
+    async def test_term_statistics_lsi_keywords(self, tmp_path):
+        """Test per-tenant term statistics and LSI keyword lookup"""
+        topics = {
+            "search": "ranking retrieval index query relevance crawler snippet",
+            "cooking": "recipe oven flour butter baking dough sugar"
+        }
+        rng = np.random.default_rng(0)
+        corpus = [
+            " ".join(rng.choice(topics[topic].split(), 30)) + f" article {i}"
+            for i, topic in enumerate(list(topics) * 40)
+        ]
+        
+        mock_model_manager = Mock()
+        mock_model_manager.get_embeddings_batch = AsyncMock()
+        engine = OptimizationEngine(mock_model_manager, Mock(), Mock(), term_stats_dir=str(tmp_path))
+        
+        assert await engine.update_term_statistics("tenant-a", corpus) == 80
+        assert await engine.update_term_statistics("tenant-a", corpus[:10]) == 0
+        term_stats = engine.get_term_statistics("tenant-a")
+        assert term_stats.documents_seen == 80
+        assert term_stats.generation == 1
+        assert engine.get_term_statistics("tenant-b").documents_seen == 0
+        
+        # Related terms come from the corpus LSI model, without embeddings
+        keywords = await engine._generate_lsi_keywords(corpus[0], ["search ranking"], term_stats)
+        assert keywords
+        assert set(keywords) <= set(topics["search"].split()) | {"article"}
+        mock_model_manager.get_embeddings_batch.assert_not_called()
+        
+        # Statistics persist per tenant
+        engine.flush_term_statistics()
+        reloaded = OptimizationEngine(mock_model_manager, Mock(), Mock(), term_stats_dir=str(tmp_path))
+        assert reloaded.get_term_statistics("tenant-a").documents_seen == 80
+    
+    def test_term_statistics_count_evicted_documents_once(self):
+        """Test documents evicted from the term cache are not counted again"""
+        from src.ml.incremental_state import doc_key
+        term_stats = TermStatistics(n_features=2 ** 10, max_cached_docs=5)
+        corpus = [f"crawler snippet {i} relevance ranking" for i in range(10)]
+        
+        assert term_stats.update(corpus) == 10
+        assert len(term_stats.doc_terms) == 5
+        document_frequency = term_stats.document_frequency.copy()
+        
+        # Re-crawled documents count neither if evicted nor if still cached
+        assert term_stats.update(corpus[:3] + corpus[8:]) == 0
+        assert term_stats.documents_seen == 10
+        assert np.array_equal(term_stats.document_frequency, document_frequency)
+        
+        # Cache hits are moved to the end, so they outlive older entries
+        term_stats.update(corpus[5:6])
+        assert term_stats.update(["a new crawler page"]) == 1
+        assert doc_key(corpus[5]) in term_stats.doc_terms
+        assert doc_key(corpus[6]) not in term_stats.doc_terms
 
 
 if __name__ == "__main__":